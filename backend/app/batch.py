@@ -0,0 +1,271 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, TextIO
+
+from pydantic import ValidationError
+
+from .models.batch_entry import BatchEntry
+from .models.batch_result import BatchResult
+from .service import DeploymentService
+from .utils.build_template import get_environment
+from .utils.make_directory import (
+    claim_workspace,
+    make_directory,
+    release_workspace,
+    remove_workspace,
+)
+from .utils.preflight import PreflightError
+
+
+def parse_entry(line: str, defaults: dict) -> BatchEntry:
+    """
+    Validate one input line as a bare payload or a BatchEntry object.
+
+    Raises:
+        ValueError: For malformed JSON or an invalid payload
+    """
+    data = json.loads(line)
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    if "payload" not in data:
+        data = {"payload": data}
+    entry = BatchEntry.model_validate(data)
+    for field, value in defaults.items():
+        if getattr(entry, field) is None:
+            setattr(entry, field, value)
+    if entry.private_key_path is None:
+        raise ValueError("No private key: set private_key_path or --private-key")
+    entry.public_key_path = entry.public_key_path or entry.private_key_path
+    return entry
+
+
+def describe_error(error: Exception) -> str:
+    if isinstance(error, PreflightError):
+        return "; ".join(error.problems)
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}"
+            for e in error.errors(include_url=False)
+        )
+    return str(error)
+
+
+def _init_render_worker():
+    # Keep service output off stdout, which may carry the result lines
+    sys.stdout = sys.stderr
+    get_environment()
+
+
+def render_entry(
+    line_number: int, entry: BatchEntry, deploy: bool = False
+) -> BatchResult:
+    """
+    Render an entry's workspace; runs in a render worker process.
+
+    With deploy, the workspace stays claimed by the worker until deploy_entry
+    claims it, so the reaper cannot remove it while it waits for a deployer.
+    """
+    started = time.monotonic()
+    directory = make_directory(entry.id)
+    try:
+        service = DeploymentService(directory)
+        main_tf, provider_tf = service.set_payload(
+            entry.payload,
+            entry.private_key_path,
+            entry.public_key_path,
+            provider=entry.provider,
+        )
+        service.preflight()
+        service.write_workspace(
+            {"main.tf": main_tf, "provider.tf": provider_tf}, entry.private_key_path
+        )
+    except Exception as e:
+        remove_workspace(directory)
+        return BatchResult(
+            line=line_number,
+            id=entry.id,
+            instance_name=entry.payload.instance_name,
+            status="invalid" if isinstance(e, PreflightError) else "failed",
+            error=describe_error(e),
+        )
+    if not deploy:
+        # Kept for the caller; the workspace reaper removes it after its TTL
+        release_workspace(directory)
+    return BatchResult(
+        line=line_number,
+        id=entry.id,
+        instance_name=entry.payload.instance_name,
+        status="rendered",
+        directory=directory,
+        seconds=time.monotonic() - started,
+    )
+
+
+def deploy_entry(entry: BatchEntry, rendered: BatchResult) -> BatchResult:
+    """Deploy a rendered workspace and remove it afterwards."""
+    started = time.monotonic()
+    claim_workspace(rendered.directory, entry.id)
+    service = DeploymentService(rendered.directory)
+    service.payload = entry.payload
+    try:
+        result = service.deploy(force=entry.force)
+    except Exception as e:
+        return rendered.model_copy(
+            update={"status": "failed", "error": str(e), "directory": None}
+        )
+    finally:
+        # Released first, so the reaper can take whatever removing leaves behind
+        release_workspace(rendered.directory)
+        service.cleanup()
+    return rendered.model_copy(
+        update={
+            "status": "deployed",
+            "result": result,
+            "directory": None,
+            "seconds": rendered.seconds + time.monotonic() - started,
+        }
+    )
+
+
+def run_batch(
+    lines: Iterable[str],
+    output: TextIO,
+    private_key_path: Path = None,
+    public_key_path: Path = None,
+    provider: str = "oracle",
+    workers: int = None,
+    deploy: bool = False,
+    max_concurrency: int = 4,
+    max_in_flight: int = None,
+) -> Counter:
+    """
+    Render (and optionally deploy) every payload in a JSON-lines stream.
+
+    Lines are validated as they are read; bad lines get an "invalid" result
+    and the batch goes on. Valid entries are rendered on a process pool whose
+    workers load the templates once, then deployed on max_concurrency
+    threads. One result line is written per input line as soon as it
+    finishes, so results are not in input order. At most max_in_flight lines
+    are between reading and their result line, which keeps memory flat for
+    any input size.
+
+    Args:
+        lines (Iterable[str]): JSON lines, each a payload or a BatchEntry object
+        output (TextIO): Receives one BatchResult JSON line per input line
+        private_key_path (Optional[Path]): Default private key for all entries
+        public_key_path (Optional[Path]): Default public key for all entries
+        provider (str): Default provider template
+        workers (Optional[int]): Render processes (default: CPU count)
+        deploy (bool): Deploy rendered workspaces instead of keeping them
+        max_concurrency (int): Deployments running at once
+        max_in_flight (Optional[int]): Lines being processed at once
+
+    Returns:
+        Counter: Number of lines per result status
+    """
+    workers = workers or os.cpu_count()
+    max_in_flight = max_in_flight or 4 * workers + max_concurrency
+    defaults = {
+        "provider": provider,
+        "private_key_path": private_key_path,
+        "public_key_path": public_key_path,
+    }
+    slots = threading.BoundedSemaphore(max_in_flight)
+    write_lock = threading.Lock()
+    counts = Counter()
+
+    def finish(result: BatchResult):
+        with write_lock:
+            output.write(result.model_dump_json(exclude_none=True) + "\n")
+            output.flush()
+            counts[result.status] += 1
+        slots.release()
+
+    def rendered(line_number: int, entry: BatchEntry, future: Future):
+        try:
+            result = future.result()
+            if deploy and result.status == "rendered":
+                deployer.submit(deploy_entry, entry, result).add_done_callback(
+                    lambda deployed: finish(deployed.result())
+                )
+                return
+        except Exception as e:
+            # A crashed render worker fails its line instead of stalling the batch
+            result = BatchResult(line=line_number, status="failed", error=str(e))
+        finish(result)
+
+    with ProcessPoolExecutor(
+        workers, initializer=_init_render_worker
+    ) as renderer, ThreadPoolExecutor(max_concurrency) as deployer:
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            slots.acquire()
+            try:
+                entry = parse_entry(line, defaults)
+            except ValueError as e:
+                finish(
+                    BatchResult(
+                        line=line_number, status="invalid", error=describe_error(e)
+                    )
+                )
+                continue
+            renderer.submit(render_entry, line_number, entry, deploy).add_done_callback(
+                lambda future, n=line_number, e=entry: rendered(n, e, future)
+            )
+        # Wait for every line's result before the pools shut down
+        for _ in range(max_in_flight):
+            slots.acquire()
+    return counts
+
+
+# cd backend && python -m app.batch payloads.jsonl --private-key key.pem --deploy
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Render and deploy payloads from a JSON-lines file"
+    )
+    parser.add_argument("input", help="JSON-lines file, or - for stdin")
+    parser.add_argument(
+        "--output", "-o", default="-", help="Result file (default: stdout)"
+    )
+    parser.add_argument("--private-key", type=Path)
+    parser.add_argument("--public-key", type=Path)
+    parser.add_argument("--provider", default="oracle")
+    parser.add_argument("--workers", type=int, help="Render processes")
+    parser.add_argument("--deploy", action="store_true")
+    parser.add_argument("--max-concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        source = (
+            sys.stdin if args.input == "-" else stack.enter_context(open(args.input))
+        )
+        output = (
+            sys.stdout
+            if args.output == "-"
+            else stack.enter_context(open(args.output, "w"))
+        )
+        stack.enter_context(contextlib.redirect_stdout(sys.stderr))
+        counts = run_batch(
+            source,
+            output,
+            private_key_path=args.private_key,
+            public_key_path=args.public_key,
+            provider=args.provider,
+            workers=args.workers,
+            deploy=args.deploy,
+            max_concurrency=args.max_concurrency,
+        )
+    print(
+        ", ".join(f"{count} {status}" for status, count in sorted(counts.items())),
+        file=sys.stderr,
+    )
+    sys.exit(1 if counts["invalid"] or counts["failed"] else 0)
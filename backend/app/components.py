@@ -0,0 +1,424 @@
+import argparse
+import json
+import threading
+import uuid
+from pathlib import Path
+from typing import Sequence
+
+from jinja2 import UndefinedError
+
+from .models.cloudflare_vars import CloudflareVars
+from .models.component import Component
+from .models.github_vars import GithubVars
+from .models.oracle_cloud_config import OCIVars
+from .models.payload import Payload
+from .service import DeploymentService, payload_context
+from .state_store import LocalStateStore, StateStore, state_key
+from .utils.build_template import get_environment
+from .utils.deadline import Deadline
+from .utils.execute_command import OutputSink
+from .utils.instrumentation import Instrumentation
+from .utils.job_log import JobLog
+from .utils.make_directory import remove_workspace
+from .utils.preflight import PreflightError
+from .utils.provider_cache import ProviderCache
+from .utils.workspace_backend import WorkspaceBackend, get_backend
+from .utils.workspace_pool import template_providers, versions_tf
+
+# Renders one component's resources with its providers, variables and outputs
+WRAPPER_TEMPLATE = "components/component.tf.j2"
+
+# Context entries made from a payload section, and from the deploy key
+SECTION_CONTEXT = {
+    "oracle_cloud": [*OCIVars.model_fields, "flex"],
+    "cloudflare": list(CloudflareVars.model_fields),
+    "github": list(GithubVars.model_fields),
+}
+KEY_CONTEXT = [
+    "pem_path",
+    "private_pem_path",
+    "public_pem_path",
+    "ssh_public_key",
+    "ssh_private_key",
+]
+
+# Fields every component's state is keyed by; changing one starts over
+STATE_FIELDS = {"instance_name", "oracle_cloud.tenancy_ocid"}
+
+# In deployment order; a component comes after the components it needs
+COMPONENTS = {
+    component.name: component
+    for component in [
+        Component(
+            name="tunnel",
+            template="components/tunnel.tf.j2",
+            providers=["cloudflare", "random"],
+            inputs=["cloudflare"],
+            outputs={
+                "tunnel_token": "cloudflare_zero_trust_tunnel_cloudflared.backend.tunnel_token",
+                "tunnel_url": '"${cloudflare_zero_trust_tunnel_cloudflared.backend.id}.cfargotunnel.com"',
+                "pretty_url": 'try(cloudflare_record.api_dns[0].hostname, "")',
+            },
+            sensitive=["tunnel_token"],
+        ),
+        Component(
+            name="network",
+            template="components/oracle_network.tf.j2",
+            provider="oracle",
+            providers=["oci"],
+            inputs=["oracle_cloud", "keys"],
+            outputs={"subnet_id": "local.subnet_id"},
+            regional=True,
+        ),
+        Component(
+            name="instance",
+            template="components/oracle_instance.tf.j2",
+            provider="oracle",
+            providers=["oci"],
+            # The instance's user data logs in to GHCR and runs the image
+            inputs=[
+                "oracle_cloud",
+                "instance_name",
+                "vm_username",
+                "vm_password",
+                "github.github_token",
+                "github.github_owner",
+                "github.docker_image",
+                "keys",
+            ],
+            needs={"tunnel_token": "tunnel", "subnet_id": "network"},
+            outputs={"public_ip": "oci_core_instance.vm.public_ip"},
+            regional=True,
+        ),
+        Component(
+            name="github",
+            template="components/github.tf.j2",
+            providers=["github"],
+            inputs=["github", "vm_username", "keys"],
+            needs={"public_ip": "instance"},
+        ),
+    ]
+}
+SENSITIVE_OUTPUTS = sorted(
+    {name for component in COMPONENTS.values() for name in component.sensitive}
+)
+
+
+def components_for(provider: str) -> list[Component]:
+    """
+    The components of a provider's stack, in deployment order.
+
+    Raises:
+        ValueError: When the provider's templates are not split into components
+    """
+    components = [c for c in COMPONENTS.values() if c.provider in (None, provider)]
+    names = {component.name for component in components}
+    if not any(component.provider == provider for component in components) or any(
+        needed not in names for c in components for needed in c.needs.values()
+    ):
+        raise ValueError(f"The {provider} templates are not split into components")
+    return components
+
+
+def context_keys(component: Component) -> set[str]:
+    """Entries of the render context made from the component's inputs."""
+    keys = set()
+    for field in component.inputs:
+        section, _, name = field.partition(".")
+        if field == "keys":
+            keys.update(KEY_CONTEXT)
+        elif name:
+            keys.add(name)
+        else:
+            keys.update(SECTION_CONTEXT.get(section, [section]))
+    return keys
+
+
+def changed_fields(old: Payload, new: Payload) -> set[str]:
+    """Payload fields that differ, as "section.field" or a top-level field name."""
+    old_data, new_data = old.model_dump(), new.model_dump()
+    changed = set()
+    for field in Payload.model_fields:
+        before, after = old_data[field], new_data[field]
+        if isinstance(before, dict) and isinstance(after, dict):
+            changed.update(
+                f"{field}.{name}"
+                for name in before.keys() | after.keys()
+                if before.get(name) != after.get(name)
+            )
+        elif before != after:
+            changed.add(field)
+    return changed
+
+
+def reads(component: Component, field: str) -> bool:
+    """Whether the component's inputs cover a payload field, or part of it."""
+    return any(
+        field == entry or field.startswith(f"{entry}.") or entry.startswith(f"{field}.")
+        for entry in component.inputs
+    )
+
+
+def affected_components(
+    old: Payload, new: Payload, provider: str = "oracle"
+) -> list[str]:
+    """
+    The components an update from old to new has to plan, in deployment order.
+
+    A component is affected when it reads a changed field or needs the
+    outputs of an affected component. Changing a field the state is keyed
+    by deploys every component from scratch.
+    """
+    changed = changed_fields(old, new)
+    components = components_for(provider)
+    if changed & STATE_FIELDS:
+        return [component.name for component in components]
+    affected = []
+    for component in components:
+        if any(reads(component, field) for field in changed) or any(
+            needed in affected for needed in component.needs.values()
+        ):
+            affected.append(component.name)
+    return affected
+
+
+def render_component(
+    component: Component, context: dict, providers: dict[str, str]
+) -> dict[str, str]:
+    """
+    Render a component's workspace from the context entries of its inputs.
+
+    Args:
+        providers (dict[str, str]): Versions of the providers the stack requires
+
+    Returns:
+        dict[str, str]: Terraform file name mapped to rendered content
+
+    Raises:
+        PreflightError: When the component reads something its inputs do not cover
+    """
+    keys = context_keys(component)
+    try:
+        main_tf = (
+            get_environment(strict=True)
+            .get_template(WRAPPER_TEMPLATE)
+            .render(
+                **{key: value for key, value in context.items() if key in keys},
+                component_template=component.template,
+                component_providers=component.providers,
+                component_inputs=list(component.needs),
+                component_outputs=component.outputs,
+                sensitive_outputs=SENSITIVE_OUTPUTS,
+            )
+        )
+    except UndefinedError as e:
+        raise PreflightError([f"{component.template}: {e.message}"])
+    versions = {
+        source: version
+        for source, version in providers.items()
+        if source.rsplit("/", 1)[1] in component.providers
+    }
+    return {"versions.tf": versions_tf(versions), "main.tf": main_tf}
+
+
+def deploy_components(
+    payload: Payload,
+    private_key_path: Path,
+    public_key_path: Path,
+    provider: str = "oracle",
+    job_id: str = None,
+    force: bool = False,
+    resume: bool = False,
+    sinks: Sequence[OutputSink] = (),
+    instrumentation: Instrumentation = None,
+    cancel_event: threading.Event = None,
+    job_log: JobLog = None,
+    deadline: Deadline = None,
+    backend: WorkspaceBackend = None,
+    parallelism: int = None,
+    state_store: StateStore = None,
+) -> dict:
+    """
+    Deploy a payload component by component, each against its own state.
+
+    Each component is rendered only from the payload fields it reads and the
+    outputs of the components it needs, which reach it as Terraform
+    variables. A component whose files and variables match its last
+    deployment is not planned at all, so an update only refreshes and
+    applies the components its changes reach: a new docker_image applies the
+    instance and the GitHub secrets but leaves the tunnel and the network
+    alone. Components deploy in order, and a failure stops the ones after
+    it; those before it keep their new state.
+
+    Returns:
+        dict: The stack's "outputs", without sensitive ones, and each
+        component's deployment result under "components"
+
+    Raises:
+        PreflightError: When the payload has problems
+        ValueError: When the provider's templates are not split into components
+    """
+    components = components_for(provider)
+    problems = payload.preflight(provider)
+    if problems:
+        raise PreflightError(problems)
+    backend = backend or get_backend()
+    job_id = job_id or (instrumentation.job_id if instrumentation else uuid.uuid4().hex)
+    options = {
+        "provider_cache": ProviderCache(),
+        "state_store": state_store,
+        "instrumentation": instrumentation,
+        "sinks": sinks,
+        "cancel_event": cancel_event,
+        "job_log": job_log or JobLog(job_id),
+        "deadline": deadline or Deadline(),
+        "parallelism": parallelism,
+    }
+    context = payload_context(payload, private_key_path, public_key_path)
+    providers = template_providers(provider)
+    outputs, results = {}, {}
+
+    for component in components:
+        result = deploy_component(
+            component,
+            payload,
+            context,
+            providers,
+            outputs,
+            private_key_path,
+            job_id,
+            force=force,
+            resume=resume,
+            backend=backend,
+            **options,
+        )
+        outputs.update(result["outputs"])
+        results[component.name] = component_result(result)
+
+    return {"outputs": public_outputs(outputs), "components": results}
+
+
+def deploy_component(
+    component: Component,
+    payload: Payload,
+    context: dict,
+    providers: dict[str, str],
+    outputs: dict,
+    private_key_path: Path,
+    job_id: str,
+    target: str = None,
+    force: bool = False,
+    resume: bool = False,
+    backend: WorkspaceBackend = None,
+    **options,
+) -> dict:
+    """
+    Render and deploy one component in a workspace of its own, then remove it.
+
+    Args:
+        outputs (dict): Outputs of the components deployed before it
+        target (Optional[str]): Fan-out target it is deployed for; its state
+            is keyed by the target too
+        options: Passed on to DeploymentService
+
+    Returns:
+        dict: The component's deployment result, outputs included
+    """
+    backend = backend or get_backend()
+    label = ":".join(filter(None, [job_id, target, component.name]))
+    service = DeploymentService(
+        directory=backend.make_directory(label),
+        backend=backend,
+        target=target,
+        component=component.name,
+        **options,
+    )
+    service.payload, service.provider = payload, component.provider
+    try:
+        service.write_workspace(
+            render_component(component, context, providers),
+            private_key_path,
+            tfvars={name: outputs[name] for name in component.needs},
+        )
+        result = service.deploy(force=force, resume=resume)
+    finally:
+        remove_workspace(service.directory)
+    print(
+        f"Component {component.name}{f' of {target}' if target else ''}: "
+        + ("unchanged" if result.get("cached") else "deployed")
+    )
+    return result
+
+
+def component_result(result: dict) -> dict:
+    """A component's deployment result without its outputs, which may be sensitive."""
+    return {key: value for key, value in result.items() if key != "outputs"}
+
+
+def public_outputs(outputs: dict) -> dict:
+    """Outputs that may go into a job's result."""
+    return {
+        name: value for name, value in outputs.items() if name not in SENSITIVE_OUTPUTS
+    }
+
+
+def destroy_components(
+    payload: Payload,
+    private_key_path: Path,
+    public_key_path: Path,
+    provider: str = "oracle",
+    state_store: StateStore = None,
+    backend: WorkspaceBackend = None,
+) -> dict:
+    """
+    Destroy a componentized deployment, components before the ones they need.
+
+    The outputs a component needs come from the last deployment of the
+    components that produce them.
+
+    Returns:
+        dict: Each component's destroy result
+    """
+    state_store = state_store or LocalStateStore()
+    backend = backend or get_backend()
+    context = payload_context(payload, private_key_path, public_key_path)
+    providers = template_providers(provider)
+    results = {}
+
+    for component in reversed(components_for(provider)):
+        tfvars = {}
+        for name, needed in component.needs.items():
+            _, last = state_store.last_deployment(state_key(payload, component=needed))
+            tfvars[name] = ((last or {}).get("outputs") or {}).get(name, "")
+        service = DeploymentService(
+            state_store=state_store, backend=backend, component=component.name
+        )
+        service.payload, service.provider = payload, provider
+        try:
+            service.write_workspace(
+                render_component(component, context, providers),
+                private_key_path,
+                tfvars=tfvars,
+            )
+            results[component.name] = service.destroy()
+        finally:
+            remove_workspace(service.directory)
+    return results
+
+
+# cd backend && python -m app.components old_payload.json new_payload.json
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="List the components an update from one payload to another applies"
+    )
+    parser.add_argument("old", help="Payload JSON file last deployed")
+    parser.add_argument("new", help="Payload JSON file to deploy")
+    parser.add_argument("--provider", default="oracle")
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = Payload(**json.load(f))
+    with open(args.new) as f:
+        new = Payload(**json.load(f))
+    for name in affected_components(old, new, args.provider):
+        print(name)
@@ -0,0 +1,330 @@
+import argparse
+import contextlib
+import json
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Sequence
+
+from .batch import describe_error
+from .components import (
+    COMPONENTS,
+    component_result,
+    components_for,
+    deploy_component,
+    public_outputs,
+    render_component,
+)
+from .models.component import Component
+from .models.deploy_target import DeployTarget
+from .models.fan_out_result import FanOutResult
+from .models.payload import Payload
+from .models.target_result import TargetResult
+from .service import DeploymentCancelled, payload_context
+from .utils.deadline import Deadline
+from .utils.execute_command import OutputSink
+from .utils.instrumentation import Instrumentation
+from .utils.job_log import JobLog
+from .utils.preflight import PreflightError
+from .utils.provider_cache import ProviderCache
+from .utils.workspace_backend import WorkspaceBackend, get_backend
+from .utils.workspace_pool import template_providers
+
+
+def check_targets(payload: Payload, targets: Sequence[DeployTarget]):
+    """
+    Raises:
+        ValueError: When there are no targets, two share a name, or the
+            payload has no oracle_cloud section to point at them
+    """
+    if not payload.oracle_cloud:
+        raise ValueError("Fan-out targets need a payload with oracle_cloud")
+    if not targets:
+        raise ValueError("A fan-out deployment needs at least one target")
+    labels = [target.label for target in targets]
+    duplicates = sorted({label for label in labels if labels.count(label) > 1})
+    if duplicates:
+        raise ValueError(f"Targets must have distinct names: {', '.join(duplicates)}")
+
+
+def deploy_targets(
+    payload: Payload,
+    targets: Sequence[DeployTarget],
+    private_key_path: Path,
+    public_key_path: Path,
+    provider: str = "oracle",
+    job_id: str = None,
+    max_parallel: int = None,
+    force: bool = False,
+    resume: bool = False,
+    on_result: Callable[[TargetResult], object] = None,
+    sinks: Sequence[OutputSink] = (),
+    instrumentation: Instrumentation = None,
+    cancel_event: threading.Event = None,
+    job_log: JobLog = None,
+    deadline: Deadline = None,
+    backend: WorkspaceBackend = None,
+    parallelism: int = None,
+) -> FanOutResult:
+    """
+    Deploy one payload to several regions or compartments in parallel.
+
+    Only the regional components (network and instance) are deployed per
+    target, each on its own thread against state keyed by the target's
+    name. The components the regions share are deployed once, against the
+    payload's own component state: the tunnel, whose token every instance
+    connects with, before the targets, and the GitHub workflow and secrets
+    after them, with the public IPs of every deployed target as its deploy
+    hosts. Destroying a target's state therefore never touches what the
+    other targets use.
+
+    The templates' context (keys included) is built once and each target is
+    rendered from it with its own region and compartment. A target that
+    fails, or is invalid, does not stop the others; on_result is called with
+    each target's result as it finishes. Terraform output is tagged with the
+    target's and component's names.
+
+    Args:
+        payload (Payload): Payload shared by the targets
+        targets (Sequence[DeployTarget]): Regions and compartments to deploy to
+        max_parallel (Optional[int]): Targets deploying at once (default: all)
+        on_result (Optional[Callable]): Called with each TargetResult, in finishing order
+
+    Returns:
+        FanOutResult: One result per target, in target order, and the
+        shared components' results
+
+    Raises:
+        ValueError: When there are no targets, they share names, or the
+            payload has no oracle_cloud section
+    """
+    check_targets(payload, targets)
+    components = components_for(provider)
+    regional = [component for component in components if component.regional]
+    before = [
+        component
+        for component in components
+        if not component.regional
+        and not any(COMPONENTS[needed].regional for needed in component.needs.values())
+    ]
+    after = [c for c in components if not c.regional and c not in before]
+
+    backend = backend or get_backend()
+    job_id = job_id or (instrumentation.job_id if instrumentation else uuid.uuid4().hex)
+    options = {
+        "provider_cache": ProviderCache(),
+        "instrumentation": instrumentation,
+        "sinks": sinks,
+        "cancel_event": cancel_event,
+        "job_log": job_log or JobLog(job_id),
+        "deadline": deadline or Deadline(),
+        "parallelism": parallelism,
+    }
+    shared_context = payload_context(payload, private_key_path, public_key_path)
+    providers = template_providers(provider)
+    fan_out = FanOutResult(targets=[])
+    results: dict[str, TargetResult] = {}
+
+    def report(result: TargetResult):
+        results[result.target] = result
+        print(f"Target {result.target} ({result.region}): {result.status}")
+        if on_result:
+            on_result(result)
+
+    def deploy_shared(component: Component, outputs: dict):
+        result = deploy_component(
+            component,
+            payload,
+            shared_context,
+            providers,
+            outputs,
+            private_key_path,
+            job_id,
+            force=force,
+            resume=resume,
+            backend=backend,
+            **options,
+        )
+        outputs.update(result["outputs"])
+        fan_out.shared[component.name] = component_result(result)
+
+    def deploy_regions(target: DeployTarget, target_payload: Payload, context: dict):
+        started = time.monotonic()
+        outputs, produced, deployed = dict(shared_outputs), {}, {}
+        try:
+            for component in regional:
+                result = deploy_component(
+                    component,
+                    target_payload,
+                    context,
+                    providers,
+                    outputs,
+                    private_key_path,
+                    job_id,
+                    target=target.label,
+                    force=force,
+                    resume=resume,
+                    backend=backend,
+                    **options,
+                )
+                outputs.update(result["outputs"])
+                produced.update(result["outputs"])
+                deployed[component.name] = component_result(result)
+        except Exception as e:
+            status = "cancelled" if isinstance(e, DeploymentCancelled) else "failed"
+            return TargetResult(
+                target=target.label, region=target.region, status=status, error=str(e)
+            )
+        return TargetResult(
+            target=target.label,
+            region=target.region,
+            status="deployed",
+            result={"outputs": public_outputs(produced), "components": deployed},
+            seconds=time.monotonic() - started,
+        )
+
+    rendered = []
+    for target in targets:
+        target_payload = target.payload_for(payload)
+        context = {
+            **shared_context,
+            "region": target_payload.oracle_cloud.region,
+            "compartment_ocid": target_payload.oracle_cloud.compartment_ocid,
+        }
+        try:
+            problems = target_payload.preflight(provider)
+            if problems:
+                raise PreflightError(problems)
+            for component in regional:
+                render_component(component, context, providers)
+        except Exception as e:
+            report(
+                TargetResult(
+                    target=target.label,
+                    region=target.region,
+                    status="invalid" if isinstance(e, PreflightError) else "failed",
+                    error=describe_error(e),
+                )
+            )
+            continue
+        rendered.append((target, target_payload, context))
+
+    shared_outputs = {}
+    if rendered:
+        try:
+            for component in before:
+                deploy_shared(component, shared_outputs)
+        except Exception as e:
+            fan_out.error = f"Shared component {component.name}: {describe_error(e)}"
+            status = "cancelled" if isinstance(e, DeploymentCancelled) else "failed"
+            for target, _, _ in rendered:
+                report(
+                    TargetResult(
+                        target=target.label,
+                        region=target.region,
+                        status=status,
+                        error=fan_out.error,
+                    )
+                )
+            rendered = []
+
+    if rendered:
+        with ThreadPoolExecutor(
+            max_parallel or len(rendered), thread_name_prefix="fan-out"
+        ) as executor:
+            futures = [executor.submit(deploy_regions, *args) for args in rendered]
+            for future in as_completed(futures):
+                report(future.result())
+
+    fan_out.targets = [results[target.label] for target in targets]
+    deployed = [result for result in fan_out.targets if result.status == "deployed"]
+    if deployed and not fan_out.error:
+        # Values the shared components read from every region, e.g. deploy hosts
+        outputs = dict(shared_outputs)
+        for name in {name for c in after for name in c.needs}:
+            values = [str(r.result["outputs"].get(name)) for r in deployed]
+            outputs[name] = ",".join(values)
+        try:
+            for component in after:
+                deploy_shared(component, outputs)
+        except Exception as e:
+            fan_out.error = f"Shared component {component.name}: {describe_error(e)}"
+        shared_outputs = outputs
+    fan_out.outputs = public_outputs(
+        {
+            name: value
+            for name, value in shared_outputs.items()
+            if any(name in c.outputs for c in before + after)
+        }
+    )
+    return fan_out
+
+
+def fan_out_summary(fan_out: FanOutResult) -> dict:
+    """
+    The result of a fan-out job: every target's result by name.
+
+    Raises:
+        DeploymentCancelled: When the job was cancelled and no target deployed
+        RuntimeError: When no target deployed, or a shared component failed
+    """
+    results = fan_out.targets
+    if not any(result.status == "deployed" for result in results):
+        errors = "; ".join(f"{r.target}: {r.error}" for r in results)
+        if any(result.status == "cancelled" for result in results):
+            raise DeploymentCancelled(f"Every target was cancelled or failed: {errors}")
+        raise RuntimeError(f"Every target failed: {errors}")
+    if fan_out.error:
+        raise RuntimeError(fan_out.error)
+    return {
+        "targets": {result.target: result.model_dump() for result in results},
+        "shared": fan_out.shared,
+        "outputs": fan_out.outputs,
+        "deployed": sum(result.status == "deployed" for result in results),
+        "failed": sum(result.status != "deployed" for result in results),
+    }
+
+
+# cd backend && python -m app.fan_out payload.json targets.json --private-key key.pem
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Deploy one payload to several regions in parallel"
+    )
+    parser.add_argument("payload", help="Payload JSON file")
+    parser.add_argument(
+        "targets", help='JSON list of targets, e.g. [{"region": "eu-frankfurt-1"}]'
+    )
+    parser.add_argument("--private-key", type=Path, required=True)
+    parser.add_argument("--public-key", type=Path)
+    parser.add_argument("--provider", default="oracle")
+    parser.add_argument("--max-parallel", type=int)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    with open(args.payload) as f:
+        payload = Payload(**json.load(f))
+    with open(args.targets) as f:
+        targets = [DeployTarget(**target) for target in json.load(f)]
+
+    # Progress goes to stderr, one result line per target to stdout
+    output = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        fan_out = deploy_targets(
+            payload,
+            targets,
+            args.private_key,
+            args.public_key or args.private_key,
+            provider=args.provider,
+            max_parallel=args.max_parallel,
+            force=args.force,
+            on_result=lambda result: print(
+                result.model_dump_json(exclude_none=True), file=output, flush=True
+            ),
+        )
+    if fan_out.error:
+        print(fan_out.error, file=sys.stderr)
+    deployed = all(result.status == "deployed" for result in fan_out.targets)
+    sys.exit(0 if deployed and not fan_out.error else 1)
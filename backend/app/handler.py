@@ -1,23 +1,61 @@
 import json
+import threading
 from pathlib import Path
-import time
+from typing import Sequence
 
 from app.service import DeploymentService
 from app.models.payload import Payload
-from app.utils.make_directory import make_directory
+from app.utils.deadline import Deadline
+from app.utils.execute_command import OutputSink
+from app.utils.instrumentation import Instrumentation
+from app.utils.job_log import JobLog
+from app.utils.make_directory import release_workspace
+from app.utils.workspace_backend import WorkspaceBackend
 
 
 # cd "/Users/benedictnursalim/Documents/Github Projects/stackable/backend" && python -m app.handler
 def run_job(
     private_key_path: Path, public_key_path: Path, payload_path: Path, provider: str
 ):
-    deployment_service = DeploymentService(directory=make_directory())
-
     with open(payload_path, "r") as f:
         payload_data = json.load(f)
 
     payload = Payload(**payload_data)
 
+    deployment_service = deploy_payload(
+        payload, private_key_path, public_key_path, provider
+    )
+    return deployment_service, deployment_service.instrumentation.phases
+
+
+def deploy_payload(
+    payload: Payload,
+    private_key_path: Path,
+    public_key_path: Path,
+    provider: str,
+    directory: Path = None,
+    force: bool = False,
+    sinks: Sequence[OutputSink] = (),
+    instrumentation: Instrumentation = None,
+    cancel_event: threading.Event = None,
+    resume: bool = False,
+    validate: bool = False,
+    job_log: JobLog = None,
+    deadline: Deadline = None,
+    backend: WorkspaceBackend = None,
+    parallelism: int = None,
+) -> DeploymentService:
+    deployment_service = DeploymentService(
+        directory=directory,
+        instrumentation=instrumentation,
+        sinks=sinks,
+        cancel_event=cancel_event,
+        job_log=job_log,
+        deadline=deadline,
+        backend=backend,
+        parallelism=parallelism,
+    )
+
     templates = deployment_service.set_payload(
         payload, private_key_path, public_key_path, provider=provider
     )
@@ -25,23 +63,22 @@ def run_job(
     rendered_template = templates[0]
     provider_template = templates[1]
 
-    deployment_service.generate_tf_files(
-        rendered_template, private_key_path, file_name="main.tf"
-    )
-    deployment_service.generate_tf_files(
-        provider_template, private_key_path, file_name="provider.tf"
+    deployment_service.write_workspace(
+        {"main.tf": rendered_template, "provider.tf": provider_template},
+        private_key_path,
     )
 
     print("Generated Terraform files successfully!")
+    deployment_service.preflight(validate=validate)
     print("Starting deployment process...")
-    deployment_service.deploy()
+    deployment_service.deploy(force=force, resume=resume)
     return deployment_service
 
 
 if __name__ == "__main__":
     build_job = None
     try:
-        build_job = run_job(
+        build_job, metrics = run_job(
             Path("test_files/benedictnursalim@gmail.com-2025-08-15T19_04_27.768Z.pem"),
             Path(
                 "test_files/benedictnursalim@gmail.com-2025-08-15T19_04_28.902Z_public.pem"
@@ -50,6 +87,8 @@ if __name__ == "__main__":
             "oracle",
         )
         print(f"Terraform files generated in: {build_job.directory}")
+        for phase in metrics:
+            print(f"{phase.phase}: {phase.duration_seconds:.2f}s")
         print("Deployment completed successfully!")
 
     except Exception as e:
@@ -59,9 +98,8 @@ if __name__ == "__main__":
 
     finally:
         if build_job:
-            print("Waiting 10 seconds before cleanup...")
-            time.sleep(10)
-            build_job.cleanup()
-            print("Cleanup completed.")
+            # Leave the files for inspection; the workspace reaper deletes them
+            release_workspace(build_job.directory, keep_for=600)
+            print("Workspace kept for 10 minutes before the reaper removes it.")
         else:
             print("No cleanup needed - deployment service was not created.")
@@ -0,0 +1,619 @@
+import argparse
+import hashlib
+import json
+import os
+import queue
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from contextlib import closing
+from pathlib import Path
+from typing import Callable, Optional
+
+from .components import deploy_components
+from .fan_out import deploy_targets, fan_out_summary
+from .handler import deploy_payload
+from .models.deploy_target import DeployTarget
+from .models.deployment_job import DeploymentJob
+from .models.payload import Payload
+from .models.phase_metrics import PhaseMetrics
+from .models.queued_job import QueuedJob
+from .state_store import STATE_FILE, LocalStateStore, is_newer_state, state_key
+from .utils.deadline import Deadline
+from .utils.instrumentation import Instrumentation, MetricsSink, default_sinks
+from .utils.job_log import JobLog, remove_old_logs
+from .utils.workspace_backend import get_backend
+from .utils.workspace_reaper import WorkspaceReaper
+from .utils.make_directory import (
+    claim_workspace,
+    release_workspace,
+    remove_workspace,
+)
+
+DEFAULT_QUEUE_DIR = Path(__file__).parents[1] / ".job_queue"
+COLUMNS = (
+    "job, idempotency_key, payload_hash, state, phase, workspace, attempts, "
+    "lease_owner, lease_expires, result, error, created_at, updated_at"
+)
+
+
+class LeaseLostError(RuntimeError):
+    """Raised when a worker's lease on a job expired and another worker took it."""
+
+
+class IdempotencyConflictError(ValueError):
+    """Raised when an idempotency key is reused with a different payload."""
+
+
+def payload_hash(job: DeploymentJob) -> str:
+    data = job.payload.model_dump_json()
+    if job.targets:
+        data += json.dumps([target.model_dump() for target in job.targets])
+    if job.components:
+        data += "components"
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class JobQueue:
+    """
+    Durable job queue in a SQLite database (WAL mode).
+
+    Every job keeps its payload hash, the phases it finished, its workspace
+    path and its result, so a job whose worker died is claimed again once
+    its lease runs out and resumes in the same workspace. Jobs claimed more
+    than max_attempts times are failed instead of crashing workers forever.
+
+    enqueue() calls from many threads are committed together: a writer
+    thread takes up to batch_size pending submissions per transaction, so
+    the fsync cost is shared by the batch. synchronous=NORMAL keeps
+    committed jobs across process crashes; a power loss can drop the last
+    few transactions.
+    """
+
+    def __init__(
+        self,
+        root: Path = None,
+        lease_seconds: float = 300,
+        max_attempts: int = 3,
+        batch_size: int = 500,
+    ):
+        self.root = Path(
+            root or os.environ.get("STACKABLE_QUEUE_DIR") or DEFAULT_QUEUE_DIR
+        )
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self._pending = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        self.root.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(
+            self.root / "queue.db",
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, idempotency_key TEXT UNIQUE, "
+            "payload_hash TEXT, job TEXT, state TEXT, phase TEXT, workspace TEXT, "
+            "attempts INTEGER DEFAULT 0, lease_owner TEXT, lease_expires REAL, "
+            "result TEXT, error TEXT, priority INTEGER, "
+            "created_at REAL, updated_at REAL)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_by_state "
+            "ON jobs (state, priority, created_at)"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS job_phases ("
+            "job_id TEXT, attempt INTEGER, phase TEXT, at REAL)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS job_phases_by_job ON job_phases (job_id)"
+        )
+        return connection
+
+    def enqueue(self, job: DeploymentJob, idempotency_key: str = None) -> str:
+        """
+        Durably queue a job.
+
+        Returns:
+            str: The job's id, or the id of the job already queued under
+            idempotency_key
+
+        Raises:
+            IdempotencyConflictError: If the key was used for a different payload
+        """
+        future = Future()
+        self._pending.put((job, idempotency_key, future))
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write_loop, name="job-queue-writer", daemon=True
+                )
+                self._writer.start()
+        return future.result()
+
+    def enqueue_many(self, jobs: list[tuple[DeploymentJob, Optional[str]]]) -> list:
+        """
+        Queue (job, idempotency_key) pairs in one transaction; returns job ids.
+
+        A reused key with a different payload raises IdempotencyConflictError
+        after the other jobs have been committed.
+        """
+        with closing(self._connect()) as connection:
+            results = self._insert(connection, jobs)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        return results
+
+    def _write_loop(self):
+        with closing(self._connect()) as connection:
+            while True:
+                batch = [self._pending.get()]
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._pending.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    results = self._insert(connection, [item[:2] for item in batch])
+                except Exception as e:
+                    results = [e] * len(batch)
+                for (_, _, future), result in zip(batch, results):
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+
+    def _insert(self, connection: sqlite3.Connection, jobs: list) -> list:
+        """Insert jobs in one transaction; returns a job id or an exception per job."""
+        now = time.time()
+        results = []
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for job, idempotency_key in jobs:
+                digest = payload_hash(job)
+                if idempotency_key:
+                    row = connection.execute(
+                        "SELECT job_id, payload_hash FROM jobs WHERE idempotency_key = ?",
+                        (idempotency_key,),
+                    ).fetchone()
+                    if row and row[1] != digest:
+                        results.append(
+                            IdempotencyConflictError(
+                                f"Idempotency key {idempotency_key} was used for "
+                                "a different payload"
+                            )
+                        )
+                        continue
+                    if row:
+                        results.append(row[0])
+                        continue
+                connection.execute(
+                    "INSERT INTO jobs (job_id, idempotency_key, payload_hash, job, "
+                    "state, priority, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)",
+                    (
+                        job.job_id,
+                        idempotency_key,
+                        digest,
+                        job.model_dump_json(),
+                        job.priority,
+                        now,
+                        now,
+                    ),
+                )
+                connection.execute(
+                    "INSERT INTO job_phases VALUES (?, 0, 'queued', ?)",
+                    (job.job_id, now),
+                )
+                results.append(job.job_id)
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return results
+
+    def claim(self, owner: str) -> Optional[QueuedJob]:
+        """
+        Lease the next job to owner: a queued job, or a running one whose lease expired.
+
+        Returns:
+            Optional[QueuedJob]: The claimed job, with the phase and workspace
+            of any interrupted attempt, or None if nothing is runnable
+        """
+        with closing(self._connect()) as connection:
+            while True:
+                now = time.time()
+                connection.execute("BEGIN IMMEDIATE")
+                row = connection.execute(
+                    "SELECT job_id, attempts FROM jobs WHERE state = 'queued' "
+                    "OR (state = 'running' AND lease_expires < ?) "
+                    "ORDER BY priority, created_at LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    connection.execute("COMMIT")
+                    return None
+                job_id, attempts = row
+                if attempts >= self.max_attempts:
+                    connection.execute(
+                        "UPDATE jobs SET state = 'failed', lease_owner = NULL, "
+                        "error = ?, updated_at = ? WHERE job_id = ?",
+                        (f"Abandoned after {attempts} attempts", now, job_id),
+                    )
+                    connection.execute("COMMIT")
+                    continue
+                connection.execute(
+                    "UPDATE jobs SET state = 'running', lease_owner = ?, "
+                    "lease_expires = ?, attempts = attempts + 1, updated_at = ? "
+                    "WHERE job_id = ?",
+                    (owner, now + self.lease_seconds, now, job_id),
+                )
+                connection.execute(
+                    "INSERT INTO job_phases VALUES (?, ?, 'claimed', ?)",
+                    (job_id, attempts + 1, now),
+                )
+                connection.execute("COMMIT")
+                return self._get(connection, job_id)
+
+    def _update_leased(
+        self, job_id: str, owner: str, assignments: str, values: tuple, phase: str
+    ):
+        """Apply an update only while owner holds the job's lease."""
+        now = time.time()
+        with closing(self._connect()) as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            updated = connection.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? "
+                "WHERE job_id = ? AND lease_owner = ? AND state = 'running'",
+                (*values, now, job_id, owner),
+            ).rowcount
+            if updated and phase:
+                connection.execute(
+                    "INSERT INTO job_phases "
+                    "SELECT job_id, attempts, ?, ? FROM jobs WHERE job_id = ?",
+                    (phase, now, job_id),
+                )
+            connection.execute("COMMIT")
+        if not updated:
+            raise LeaseLostError(f"{owner} no longer holds the lease on job {job_id}")
+
+    def heartbeat(self, job_id: str, owner: str):
+        """Extend owner's lease on a running job."""
+        self._update_leased(
+            job_id,
+            owner,
+            "lease_expires = ?",
+            (time.time() + self.lease_seconds,),
+            None,
+        )
+
+    def record_phase(self, job_id: str, owner: str, phase: str, workspace: Path = None):
+        """Record a finished phase (and the workspace, when given) and extend the lease."""
+        assignments, values = "phase = ?, lease_expires = ?", (
+            phase,
+            time.time() + self.lease_seconds,
+        )
+        if workspace is not None:
+            assignments += ", workspace = ?"
+            values += (str(workspace),)
+        self._update_leased(job_id, owner, assignments, values, phase)
+
+    def complete(self, job_id: str, owner: str, result: dict):
+        self._update_leased(
+            job_id,
+            owner,
+            "state = 'succeeded', result = ?, error = NULL, lease_owner = NULL",
+            (json.dumps(result),),
+            "succeeded",
+        )
+
+    def fail(self, job_id: str, owner: str, error: str):
+        self._update_leased(
+            job_id,
+            owner,
+            "state = 'failed', error = ?, lease_owner = NULL",
+            (error,),
+            "failed",
+        )
+
+    def _get(self, connection: sqlite3.Connection, job_id: str) -> Optional[QueuedJob]:
+        row = connection.execute(
+            f"SELECT {COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        fields = dict(zip((c.strip() for c in COLUMNS.split(",")), row))
+        fields["job"] = DeploymentJob.model_validate_json(fields["job"])
+        fields["result"] = json.loads(fields["result"]) if fields["result"] else None
+        return QueuedJob(**fields)
+
+    def get(self, job_id: str) -> Optional[QueuedJob]:
+        with closing(self._connect()) as connection:
+            return self._get(connection, job_id)
+
+    def phases(self, job_id: str) -> list[tuple[int, str, float]]:
+        """Phase transitions of a job as (attempt, phase, unix time), oldest first."""
+        with closing(self._connect()) as connection:
+            return connection.execute(
+                "SELECT attempt, phase, at FROM job_phases WHERE job_id = ? "
+                "ORDER BY rowid",
+                (job_id,),
+            ).fetchall()
+
+    def counts(self) -> dict[str, int]:
+        with closing(self._connect()) as connection:
+            return dict(
+                connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state")
+            )
+
+
+class QueuePhaseSink(MetricsSink):
+    """Records each finished phase of a job in the queue, renewing its lease."""
+
+    def __init__(self, job_queue: JobQueue, job_id: str, owner: str):
+        self.job_queue = job_queue
+        self.job_id = job_id
+        self.owner = owner
+
+    def emit(self, metrics: PhaseMetrics):
+        self.job_queue.record_phase(self.job_id, self.owner, metrics.phase)
+
+
+def run_queued_job(
+    job_queue: JobQueue,
+    claimed: QueuedJob,
+    owner: str,
+    cancel_event: threading.Event,
+) -> dict:
+    """
+    Deploy a claimed job, resuming in the workspace of an interrupted attempt.
+
+    Terraform state left in that workspace by an apply that died half-way is
+    saved to the state store first, so the retry plans against the resources
+    that were already created, unless a later deployment stored newer state.
+    A retried job resumes from its last checkpointed phase. The workspace is removed when the job ends,
+    unless the lease was lost and another worker now owns it.
+    """
+    job = claimed.job
+    backend = get_backend()
+    instrumentation = Instrumentation(
+        job.job_id,
+        sinks=[*default_sinks, QueuePhaseSink(job_queue, job.job_id, owner)],
+    )
+    if job.targets:
+        # Each target and shared component resumes from its own checkpoints
+        fan_out = deploy_targets(
+            job.payload,
+            job.targets,
+            job.private_key_path,
+            job.public_key_path,
+            job.provider,
+            job_id=job.job_id,
+            force=job.force,
+            resume=claimed.attempts > 1,
+            instrumentation=instrumentation,
+            cancel_event=cancel_event,
+            deadline=Deadline(job.deadline_seconds),
+            backend=backend,
+            parallelism=job.parallelism,
+        )
+        return fan_out_summary(fan_out)
+    if job.components:
+        # Each component resumes from its own checkpoints, like fan-out targets
+        return deploy_components(
+            job.payload,
+            job.private_key_path,
+            job.public_key_path,
+            job.provider,
+            job_id=job.job_id,
+            force=job.force,
+            resume=claimed.attempts > 1,
+            instrumentation=instrumentation,
+            cancel_event=cancel_event,
+            deadline=Deadline(job.deadline_seconds),
+            backend=backend,
+            parallelism=job.parallelism,
+        )
+
+    directory = Path(claimed.workspace) if claimed.workspace else None
+    if directory and directory.is_dir():
+        print(f"Resuming job {job.job_id} in {directory} after {claimed.phase}")
+        claim_workspace(directory, job.job_id)
+        if (directory / STATE_FILE).exists():
+            # Another job may have deployed the instance since this one died
+            state_store, key = LocalStateStore(), state_key(job.payload)
+            with state_store.lock(key):
+                left = (directory / STATE_FILE).read_bytes()
+                if is_newer_state(left, state_store.read(key)):
+                    state_store.save(key, directory)
+                else:
+                    print(f"Stored state of {key} is newer, discarding the workspace's")
+                    state_store.restore(key, directory)
+    else:
+        directory = backend.make_directory(job.job_id)
+    job_queue.record_phase(job.job_id, owner, "workspace", workspace=directory)
+
+    try:
+        service = deploy_payload(
+            job.payload,
+            job.private_key_path,
+            job.public_key_path,
+            job.provider,
+            directory=directory,
+            force=job.force,
+            instrumentation=instrumentation,
+            cancel_event=cancel_event,
+            resume=claimed.attempts > 1,
+            deadline=Deadline(job.deadline_seconds),
+            backend=backend,
+            parallelism=job.parallelism,
+        )
+        return service.result
+    except LeaseLostError:
+        cancel_event.set()
+        raise
+    finally:
+        if cancel_event.is_set():
+            release_workspace(directory)
+        else:
+            remove_workspace(directory)
+
+
+class QueueWorker:
+    """
+    Claims jobs from a JobQueue and runs them one at a time.
+
+    The lease is renewed every lease_seconds / 3 while a job runs. If it is
+    lost anyway, the job's terraform command is interrupted and the job is
+    left to the worker that took it over.
+    """
+
+    def __init__(
+        self,
+        job_queue: JobQueue,
+        worker_id: str = None,
+        runner: Callable[..., dict] = run_queued_job,
+        poll_interval: float = 1.0,
+    ):
+        self.job_queue = job_queue
+        self.worker_id = worker_id or (
+            f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        )
+        self.runner = runner
+        self.poll_interval = poll_interval
+
+    def run(self, stop: threading.Event):
+        while not stop.is_set():
+            if not self.run_once():
+                stop.wait(self.poll_interval)
+
+    def run_once(self) -> bool:
+        """Claim and run one job; returns False when the queue had none."""
+        claimed = self.job_queue.claim(self.worker_id)
+        if claimed is None:
+            return False
+        job_id = claimed.job.job_id
+        lease_lost = threading.Event()
+        finished = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(job_id, lease_lost, finished), daemon=True
+        )
+        heartbeat.start()
+        try:
+            try:
+                result = self.runner(
+                    self.job_queue, claimed, self.worker_id, lease_lost
+                )
+            except Exception as e:
+                if lease_lost.is_set() or isinstance(e, LeaseLostError):
+                    raise LeaseLostError(str(e))
+                print(f"Job {job_id} failed: {e}")
+                self.job_queue.fail(job_id, self.worker_id, str(e))
+            else:
+                self.job_queue.complete(job_id, self.worker_id, result)
+        except LeaseLostError:
+            print(f"Job {job_id} was taken over by another worker")
+        finally:
+            finished.set()
+            heartbeat.join()
+        return True
+
+    def _heartbeat(
+        self, job_id: str, lease_lost: threading.Event, finished: threading.Event
+    ):
+        while not finished.wait(self.job_queue.lease_seconds / 3):
+            try:
+                self.job_queue.heartbeat(job_id, self.worker_id)
+            except LeaseLostError:
+                print(f"Lost the lease on job {job_id}, stopping it")
+                lease_lost.set()
+                return
+
+
+# cd backend && python -m app.job_queue submit payload.json --private-key key.pem
+# cd backend && python -m app.job_queue work --workers 4
+# cd backend && python -m app.job_queue status <job_id>
+# cd backend && python -m app.job_queue log <job_id>
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Submit jobs to the job queue and run them"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    submit = commands.add_parser("submit", help="Queue a payload; prints the job id")
+    submit.add_argument("payload", help="Payload JSON file")
+    submit.add_argument("--private-key", type=Path, required=True)
+    submit.add_argument("--public-key", type=Path)
+    submit.add_argument("--provider", default="oracle")
+    submit.add_argument("--targets", help="JSON file listing targets to fan out to")
+    submit.add_argument("--components", action="store_true")
+    submit.add_argument("--force", action="store_true")
+    submit.add_argument("--idempotency-key")
+    work = commands.add_parser("work", help="Run workers until interrupted")
+    work.add_argument("--workers", type=int, default=1)
+    status = commands.add_parser("status", help="Print a queued job's state as JSON")
+    status.add_argument("job_id")
+    output = commands.add_parser("log", help="Print a job's terraform output")
+    output.add_argument("job_id")
+    args = parser.parse_args()
+
+    job_queue = JobQueue()
+    if args.command == "submit":
+        with open(args.payload) as f:
+            payload = Payload(**json.load(f))
+        targets = []
+        if args.targets:
+            with open(args.targets) as f:
+                targets = [DeployTarget(**target) for target in json.load(f)]
+        # Workers may run from another directory, so the keys' paths are absolute
+        job = DeploymentJob(
+            payload=payload,
+            private_key_path=args.private_key.resolve(),
+            public_key_path=(args.public_key or args.private_key).resolve(),
+            provider=args.provider,
+            force=args.force,
+            targets=targets,
+            components=args.components,
+        )
+        print(job_queue.enqueue(job, idempotency_key=args.idempotency_key))
+    elif args.command == "status":
+        queued = job_queue.get(args.job_id)
+        if queued is None:
+            sys.exit(f"Unknown job {args.job_id}")
+        # The payload carries credentials; the job's other fields are enough here
+        print(queued.model_dump_json(indent=2, exclude={"job": {"payload"}}))
+    elif args.command == "log":
+        log = JobLog.open(args.job_id)
+        if log is None:
+            sys.exit(f"No log for job {args.job_id}")
+        sys.stdout.buffer.write(log.read())
+    else:
+        WorkspaceReaper().start()
+        remove_old_logs()
+        if get_backend().name == "memory":
+            WorkspaceReaper(get_backend().root).start()
+        stop = threading.Event()
+        threads = [
+            threading.Thread(target=QueueWorker(job_queue).run, args=(stop,))
+            for _ in range(args.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        print(f"Started {args.workers} queue workers: {job_queue.counts()}")
+        try:
+            while any(thread.is_alive() for thread in threads):
+                time.sleep(1)
+        except KeyboardInterrupt:
+            stop.set()
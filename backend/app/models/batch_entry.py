@@ -0,0 +1,28 @@
+from pathlib import Path
+from typing import Optional
+from pydantic import BaseModel
+from .payload import Payload
+
+
+class BatchEntry(BaseModel):
+    """
+    One line of a batch file.
+
+    A line is either a bare payload or an object with a "payload" key and
+    any of the other fields; missing fields come from the command line.
+
+    Attributes:
+        payload: The deployment payload
+        id: Caller's identifier, echoed in the result line
+        provider: Provider template to render
+        private_key_path: Private key for this payload
+        public_key_path: Matching public key (default: the private key path)
+        force: Deploy even if the configuration matches the last deployment
+    """
+
+    payload: Payload
+    id: Optional[str] = None
+    provider: Optional[str] = None
+    private_key_path: Optional[Path] = None
+    public_key_path: Optional[Path] = None
+    force: bool = False
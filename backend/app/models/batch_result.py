@@ -0,0 +1,28 @@
+from pathlib import Path
+from typing import Optional
+from pydantic import BaseModel
+
+
+class BatchResult(BaseModel):
+    """
+    Outcome of one batch line, written as one JSON line.
+
+    Attributes:
+        line: Line number in the input, starting at 1
+        id: The entry's id, if it had one
+        instance_name: The payload's instance name
+        status: invalid, failed, rendered or deployed
+        directory: Rendered workspace (kept in render-only mode)
+        result: Deployment result
+        error: Validation or deployment error
+        seconds: Time spent rendering and deploying the line
+    """
+
+    line: int
+    id: Optional[str] = None
+    instance_name: Optional[str] = None
+    status: str
+    directory: Optional[Path] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    seconds: Optional[float] = None
@@ -1,9 +1,24 @@
+import re
 from pydantic import BaseModel
 from typing import Optional
 
+ZONE_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
 
 class CloudflareVars(BaseModel):
     cf_api_token: str
     cf_account_id: str
     cf_zone_id: Optional[str] = ""
     domain: Optional[str] = ""
+
+    def preflight(self) -> list[str]:
+        """Problems the Cloudflare provider would only report at apply time."""
+        problems = []
+        for field in ("cf_api_token", "cf_account_id"):
+            if not getattr(self, field).strip():
+                problems.append(f"{field}: must not be empty")
+        if self.domain and not self.cf_zone_id:
+            problems.append("cf_zone_id: required when domain is set")
+        elif self.cf_zone_id and not ZONE_ID_PATTERN.fullmatch(self.cf_zone_id):
+            problems.append(f"cf_zone_id: {self.cf_zone_id!r} is not a zone id")
+        return problems
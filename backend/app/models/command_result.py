@@ -0,0 +1,33 @@
+from typing import Optional
+from pydantic import BaseModel
+
+
+class CommandResult(BaseModel):
+    """
+    Outcome of a command run by the execution engine.
+
+    Attributes:
+        argv: The command that was executed
+        returncode: Exit status (negative when killed by a signal)
+        stdout: Retained stdout lines, joined (the tail when the sink is bounded)
+        stderr: Retained stderr lines, joined (the tail when the sink is bounded)
+        duration_seconds: Wall-clock time from start to exit
+        timed_out: Whether the process group was killed on timeout
+        cancelled: Whether the process group was stopped by its cancel event
+        cpu_seconds: CPU time of the process tree, sampled from /proc (None elsewhere)
+        peak_rss_bytes: Largest sampled resident memory of the process tree
+        stdout_bytes: Bytes read from stdout
+        stderr_bytes: Bytes read from stderr
+    """
+
+    argv: list[str]
+    returncode: int
+    stdout: str = ""
+    stderr: str = ""
+    duration_seconds: float = 0.0
+    timed_out: bool = False
+    cancelled: bool = False
+    cpu_seconds: Optional[float] = None
+    peak_rss_bytes: Optional[int] = None
+    stdout_bytes: int = 0
+    stderr_bytes: int = 0
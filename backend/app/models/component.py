@@ -0,0 +1,30 @@
+from typing import Optional
+from pydantic import BaseModel
+
+
+class Component(BaseModel):
+    """
+    A part of the stack that is deployed with its own Terraform state.
+
+    Attributes:
+        name: Names the component's state and output tag
+        template: Template of its resources, under terraform_templates/
+        provider: Provider template it belongs to (default: every provider)
+        providers: Terraform providers its resources use
+        inputs: Payload fields it reads, as "section" or "section.field";
+            "keys" stands for the deploy key
+        needs: Outputs of other components it reads, mapped to their component
+        outputs: Terraform expressions it outputs for the job and other components
+        sensitive: Outputs passed to other components but left out of the job's result
+        regional: Deployed once per region by fan-out jobs; the others are shared
+    """
+
+    name: str
+    template: str
+    provider: Optional[str] = None
+    providers: list[str]
+    inputs: list[str]
+    needs: dict[str, str] = {}
+    outputs: dict[str, str] = {}
+    sensitive: list[str] = []
+    regional: bool = False
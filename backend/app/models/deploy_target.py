@@ -0,0 +1,38 @@
+from typing import Optional
+from pydantic import BaseModel, Field
+from .payload import Payload
+
+# Target names end up in state keys and log file names
+NAME_PATTERN = r"^[A-Za-z0-9_.-]+$"
+
+
+class DeployTarget(BaseModel):
+    """
+    One region (and compartment) a fan-out deployment sends the payload to.
+
+    Attributes:
+        region: OCI region to deploy into, e.g. "eu-frankfurt-1"
+        compartment_ocid: Compartment to deploy into (default: the payload's)
+        name: Names the target's result and state (default: the region)
+    """
+
+    region: str = Field(pattern=NAME_PATTERN)
+    compartment_ocid: Optional[str] = None
+    name: Optional[str] = Field(default=None, pattern=NAME_PATTERN)
+
+    @property
+    def label(self) -> str:
+        return self.name or self.region
+
+    def payload_for(self, payload: Payload) -> Payload:
+        """A copy of payload pointed at this target's region and compartment."""
+        if not payload.oracle_cloud:
+            raise ValueError("Fan-out targets need a payload with oracle_cloud")
+        oracle_cloud = payload.oracle_cloud.model_copy(
+            update={
+                "region": self.region,
+                "compartment_ocid": self.compartment_ocid
+                or payload.oracle_cloud.compartment_ocid,
+            }
+        )
+        return payload.model_copy(update={"oracle_cloud": oracle_cloud})
@@ -0,0 +1,46 @@
+import uuid
+from pathlib import Path
+from typing import Optional
+from pydantic import BaseModel, Field
+from .deploy_target import DeployTarget
+from .payload import Payload
+
+
+class DeploymentJob(BaseModel):
+    """
+    A payload queued for deployment.
+
+    Attributes:
+        payload: The deployment payload
+        private_key_path: Path to the private key used for the deployment
+        public_key_path: Path to the matching public key
+        provider: Provider template to render (default: "oracle")
+        tenant: Customer the job belongs to, used for fair sharing
+        priority: Lower values run first (default: 0)
+        force: Deploy even if the configuration matches the last deployment
+        deadline_seconds: Limit on the whole deployment once it starts running
+        targets: Regions to deploy the payload to in parallel, instead of its own
+        parallelism: Fixed terraform -parallelism, overriding the payload's
+        components: Deploy the stack component by component, each with its own state
+        job_id: Unique identifier for the job
+    """
+
+    payload: Payload
+    private_key_path: Path
+    public_key_path: Path
+    provider: str = "oracle"
+    tenant: str = "default"
+    priority: int = 0
+    force: bool = False
+    deadline_seconds: Optional[float] = Field(default=None, gt=0)
+    targets: list[DeployTarget] = []
+    parallelism: Optional[int] = Field(default=None, ge=1)
+    components: bool = False
+    job_id: str = Field(default_factory=lambda: uuid.uuid4().hex)
+
+    @property
+    def account(self) -> str:
+        """Cloud account the job deploys into, used for per-account limits."""
+        if self.payload.oracle_cloud:
+            return f"{self.provider}:{self.payload.oracle_cloud.tenancy_ocid}"
+        return f"cloudflare:{self.payload.cloudflare.cf_account_id}"
@@ -0,0 +1,20 @@
+from typing import Optional
+from pydantic import BaseModel
+from .target_result import TargetResult
+
+
+class FanOutResult(BaseModel):
+    """
+    Outcome of a fan-out deployment.
+
+    Attributes:
+        targets: One result per target, in target order
+        shared: Results of the components every target shares, by name
+        outputs: Outputs of the shared components, without sensitive ones
+        error: Why a shared component failed
+    """
+
+    targets: list[TargetResult]
+    shared: dict[str, dict] = {}
+    outputs: dict = {}
+    error: Optional[str] = None
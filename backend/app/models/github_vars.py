@@ -1,8 +1,24 @@
+import re
 from pydantic import BaseModel
 
+OWNER_PATTERN = re.compile(r"[A-Za-z0-9](-?[A-Za-z0-9])*")
+REPO_PATTERN = re.compile(r"[A-Za-z0-9._-]+")
+
 
 class GithubVars(BaseModel):
     github_token: str
     github_owner: str
     repo_name: str
     docker_image: str
+
+    def preflight(self) -> list[str]:
+        """Problems the GitHub provider would only report at apply time."""
+        problems = []
+        for field in ("github_token", "docker_image"):
+            if not getattr(self, field).strip():
+                problems.append(f"{field}: must not be empty")
+        if not OWNER_PATTERN.fullmatch(self.github_owner):
+            problems.append(f"github_owner: {self.github_owner!r} is not a GitHub user")
+        if not REPO_PATTERN.fullmatch(self.repo_name):
+            problems.append(f"repo_name: {self.repo_name!r} is not a repository name")
+        return problems
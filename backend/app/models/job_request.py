@@ -0,0 +1,33 @@
+from typing import Optional
+from pydantic import BaseModel, Field
+from .deploy_target import DeployTarget
+from .payload import Payload
+
+
+class JobRequest(BaseModel):
+    """
+    Body of a job submission to the HTTP API.
+
+    Attributes:
+        payload: The deployment payload
+        private_key: PEM or OpenSSH private key for the instance
+        provider: Provider template to render (default: "oracle")
+        tenant: Customer the job belongs to, used for fair sharing
+        priority: Lower values run first (default: 0)
+        force: Deploy even if the configuration matches the last deployment
+        deadline_seconds: Limit on the whole deployment once it starts running
+        targets: Regions to deploy the payload to in parallel, instead of its own
+        parallelism: Fixed terraform -parallelism, overriding the payload's
+        components: Deploy the stack component by component, each with its own state
+    """
+
+    payload: Payload
+    private_key: str
+    provider: str = "oracle"
+    tenant: str = "default"
+    priority: int = 0
+    force: bool = False
+    deadline_seconds: Optional[float] = Field(default=None, gt=0)
+    targets: list[DeployTarget] = []
+    parallelism: Optional[int] = Field(default=None, ge=1)
+    components: bool = False
@@ -0,0 +1,29 @@
+from typing import Optional
+from pydantic import BaseModel
+
+
+class JobStatus(BaseModel):
+    """
+    Status of a submitted deployment job.
+
+    Attributes:
+        job_id: Identifier returned on submission
+        state: One of queued, running, succeeded, failed or cancelled
+        tenant: Customer the job belongs to
+        provider: Provider template the job renders
+        submitted_at: Unix time the job was accepted
+        started_at: Unix time the job left the queue
+        finished_at: Unix time the job reached a final state
+        error: Failure or cancellation message
+        phases: Names of the phases finished so far
+    """
+
+    job_id: str
+    state: str
+    tenant: str
+    provider: str
+    submitted_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    phases: list[str] = []
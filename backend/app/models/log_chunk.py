@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+
+
+class LogChunk(BaseModel):
+    """
+    One gzip member of a job log, and where its text sits in the whole log.
+
+    Attributes:
+        phase: Phase whose output the chunk holds
+        offset: Offset of the chunk's first byte in the uncompressed log
+        length: Uncompressed bytes in the chunk
+        compressed_offset: Offset of the gzip member in the log file
+        compressed_length: Size of the gzip member
+    """
+
+    phase: str
+    offset: int
+    length: int
+    compressed_offset: int
+    compressed_length: int
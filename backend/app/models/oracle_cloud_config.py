@@ -1,12 +1,29 @@
+import re
 from typing import Optional
 from pydantic import BaseModel
 
+# ocid1.<resource type>.<realm>.[region][.future use].<unique id>
+OCID_PATTERN = re.compile(
+    r"ocid1\.([a-z0-9]+)\.[a-z0-9-]+\.[a-z0-9-]*(\.[a-z0-9-]+)?\.\w+"
+)
+REGION_PATTERN = re.compile(r"[a-z]{2}-[a-z]+-\d+")
+FINGERPRINT_PATTERN = re.compile(r"[0-9a-f]{2}(:[0-9a-f]{2})*")
+
 
 class FlexShape(BaseModel):
     shape: Optional[str] = "VM.Standard.E2.1.Micro"
     ocpus: Optional[float] = 1
     memory_gb: Optional[int] = 1
 
+    def preflight(self) -> list[str]:
+        """Problems OCI would only report at apply time."""
+        problems = []
+        if self.ocpus is not None and self.ocpus <= 0:
+            problems.append("ocpus: must be greater than 0")
+        if self.memory_gb is not None and self.memory_gb <= 0:
+            problems.append("memory_gb: must be greater than 0")
+        return problems
+
 
 class OCIVars(BaseModel):
     flex_shape: Optional[FlexShape] = None
@@ -15,3 +32,30 @@ class OCIVars(BaseModel):
     fingerprint: str
     region: str
     compartment_ocid: str
+
+    def preflight(self) -> list[str]:
+        """Problems the OCI provider would only report after terraform init."""
+        problems = []
+        # The root compartment of a tenancy is the tenancy itself
+        for field, types in (
+            ("tenancy_ocid", ("tenancy",)),
+            ("user_ocid", ("user",)),
+            ("compartment_ocid", ("compartment", "tenancy")),
+        ):
+            value = getattr(self, field)
+            match = OCID_PATTERN.fullmatch(value)
+            if not match:
+                problems.append(f"{field}: {value!r} is not an OCID")
+            elif match.group(1) not in types:
+                problems.append(
+                    f"{field}: expected a {' or '.join(types)} OCID, got {match.group(1)}"
+                )
+        if not FINGERPRINT_PATTERN.fullmatch(self.fingerprint):
+            problems.append(
+                f"fingerprint: {self.fingerprint!r} is not an API key fingerprint"
+            )
+        if not REGION_PATTERN.fullmatch(self.region):
+            problems.append(f"region: {self.region!r} is not an OCI region")
+        if self.flex_shape:
+            problems.extend(f"flex_shape.{p}" for p in self.flex_shape.preflight())
+        return problems
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 from .github_vars import GithubVars
 from .cloudflare_vars import CloudflareVars
@@ -17,6 +17,7 @@ class Payload(BaseModel):
         instance_name: Name of the VM instance (default: "backend-vm")
         vm_username: Username for VM access (default: "user")
         vm_password: Password for VM access (default: "password")
+        parallelism: Fixed terraform -parallelism instead of the adaptive one
     """
 
     oracle_cloud: Optional[OCIVars] = None
@@ -25,3 +26,27 @@ class Payload(BaseModel):
     instance_name: str = "backend-vm"
     vm_username: str = "user"
     vm_password: str = "password"
+    parallelism: Optional[int] = Field(default=None, ge=1)
+
+    def preflight(self, provider: str = None) -> list[str]:
+        """
+        Check the fields terraform would otherwise only reject minutes in.
+
+        Args:
+            provider (Optional[str]): Provider template the payload is rendered with
+
+        Returns:
+            list[str]: Every problem found, as "field.path: message"
+        """
+        problems = []
+        if provider == "oracle" and not self.oracle_cloud:
+            problems.append("oracle_cloud: required by the oracle provider")
+        for section in ("oracle_cloud", "cloudflare", "github"):
+            if getattr(self, section):
+                problems.extend(
+                    f"{section}.{problem}"
+                    for problem in getattr(self, section).preflight()
+                )
+        if not self.instance_name.strip():
+            problems.append("instance_name: must not be empty")
+        return problems
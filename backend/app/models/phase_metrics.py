@@ -0,0 +1,29 @@
+from typing import Optional
+from pydantic import BaseModel
+
+
+class PhaseMetrics(BaseModel):
+    """
+    Measurements for one phase of a deployment job.
+
+    Attributes:
+        job_id: Job the phase belongs to
+        phase: Phase name (render, materialize, init, plan, apply, ...)
+        started_at: Unix time the phase started
+        duration_seconds: Wall-clock time of the phase
+        returncode: Exit status for command phases, None for in-process phases
+        cpu_seconds: CPU time of the terraform process tree
+        peak_rss_bytes: Peak resident memory of the terraform process tree
+        stdout_bytes: Bytes of stdout produced
+        stderr_bytes: Bytes of stderr produced
+    """
+
+    job_id: str
+    phase: str
+    started_at: float
+    duration_seconds: float
+    returncode: Optional[int] = None
+    cpu_seconds: Optional[float] = None
+    peak_rss_bytes: Optional[int] = None
+    stdout_bytes: int = 0
+    stderr_bytes: int = 0
@@ -0,0 +1,29 @@
+from pydantic import BaseModel
+
+
+class ResourceChange(BaseModel):
+    address: str
+    actions: list[str]
+
+
+class PlanSummary(BaseModel):
+    """
+    Structured counts from a saved Terraform plan.
+
+    Attributes:
+        add: Resources to create (replacements count here and in destroy)
+        change: Resources to update in place
+        destroy: Resources to delete
+        outputs_changed: Whether any root module output changes
+        resource_changes: Address and actions of every resource that changes
+    """
+
+    add: int = 0
+    change: int = 0
+    destroy: int = 0
+    outputs_changed: bool = False
+    resource_changes: list[ResourceChange] = []
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.add or self.change or self.destroy or self.outputs_changed)
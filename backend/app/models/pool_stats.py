@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+
+
+class PoolStats(BaseModel):
+    """
+    Snapshot of the pre-warmed workspaces of one provider template.
+
+    Attributes:
+        provider: Provider template the workspaces are initialized for
+        ready: Warm workspaces waiting for a job
+        target: Warm workspaces the pool is refilling towards
+        hits: Checkouts served with a warm workspace
+        misses: Checkouts that found the pool empty
+        reused: Workspaces scrubbed and returned to the pool after a job
+        arrivals_per_minute: Recent checkout rate the target is sized from
+        warm_seconds: Average time to warm one workspace
+    """
+
+    provider: str
+    ready: int = 0
+    target: int = 0
+    hits: int = 0
+    misses: int = 0
+    reused: int = 0
+    arrivals_per_minute: float = 0.0
+    warm_seconds: float = 0.0
@@ -0,0 +1,38 @@
+from typing import Optional
+from pydantic import BaseModel
+from .deployment_job import DeploymentJob
+
+
+class QueuedJob(BaseModel):
+    """
+    A job as recorded in the durable job queue.
+
+    Attributes:
+        job: The deployment job
+        idempotency_key: Key that collapses duplicate submissions, if given
+        payload_hash: SHA-256 of the job's payload
+        state: One of queued, running, succeeded or failed
+        phase: Last phase the job finished (render, init, plan, apply, ...)
+        workspace: Workspace directory of the current or last attempt
+        attempts: Number of times a worker claimed the job
+        lease_owner: Worker holding the job while it runs
+        lease_expires: Unix time the lease runs out unless renewed
+        result: Deployment result once the job succeeded
+        error: Failure message of the last attempt
+        created_at: Unix time the job was enqueued
+        updated_at: Unix time of the last change
+    """
+
+    job: DeploymentJob
+    idempotency_key: Optional[str] = None
+    payload_hash: str
+    state: str
+    phase: Optional[str] = None
+    workspace: Optional[str] = None
+    attempts: int = 0
+    lease_owner: Optional[str] = None
+    lease_expires: Optional[float] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
@@ -0,0 +1,22 @@
+from pydantic import BaseModel
+
+
+class ReapReport(BaseModel):
+    """
+    Result of one workspace reaper pass.
+
+    Attributes:
+        scanned: Workspaces found
+        live: Workspaces in use by a running job, never touched
+        deleted: Workspaces removed, expired or evicted
+        evicted: Of those, removed before their TTL to get under the quota
+        reclaimed_bytes: Disk space freed
+        remaining_bytes: Disk space still used by workspaces
+    """
+
+    scanned: int = 0
+    live: int = 0
+    deleted: int = 0
+    evicted: int = 0
+    reclaimed_bytes: int = 0
+    remaining_bytes: int = 0
@@ -0,0 +1,22 @@
+from pydantic import BaseModel
+
+
+class ResourceLatency(BaseModel):
+    """
+    How much one resource contributes to apply latency across jobs.
+
+    Attributes:
+        resource: Resource address without its count/for_each index
+        jobs: Applies the resource took part in
+        critical_jobs: Applies where it was on the critical path
+        critical_seconds: Total time it spent on critical paths
+        p50_seconds: Median duration
+        p95_seconds: 95th percentile duration
+    """
+
+    resource: str
+    jobs: int = 0
+    critical_jobs: int = 0
+    critical_seconds: float = 0.0
+    p50_seconds: float = 0.0
+    p95_seconds: float = 0.0
@@ -0,0 +1,35 @@
+from typing import Optional
+from pydantic import BaseModel
+
+
+class ResourceTiming(BaseModel):
+    """
+    One resource's work within a terraform command, from its -json events.
+
+    Attributes:
+        job_id: Job the resource belongs to
+        phase: Command phase (plan for refreshes, apply for changes)
+        address: Resource address, e.g. github_actions_secret.deploy_key
+        resource_type: Resource type, e.g. github_actions_secret
+        action: create, update, delete, replace, read or refresh
+        started_at: Unix time terraform started the resource
+        duration_seconds: Time until terraform finished it
+        status: complete or errored
+        completed: Resources finished in the phase so far, including this one
+        total: Resources the phase will touch, when known from the plan
+    """
+
+    job_id: str
+    phase: str
+    address: str
+    resource_type: str
+    action: str
+    started_at: float
+    duration_seconds: float
+    status: str = "complete"
+    completed: int = 0
+    total: Optional[int] = None
+
+    @property
+    def finished_at(self) -> float:
+        return self.started_at + self.duration_seconds
@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+
+
+class SchedulerStats(BaseModel):
+    """
+    Snapshot of the job scheduler.
+
+    Attributes:
+        queued: Jobs waiting for a slot
+        running: Jobs currently deploying
+        completed: Jobs that finished successfully
+        failed: Jobs that raised an error
+        average_wait_seconds: Mean time from submit to start over started jobs
+        max_wait_seconds: Longest time from submit to start
+        jobs_per_hour: Finished jobs per hour since the first job started
+    """
+
+    queued: int = 0
+    running: int = 0
+    completed: int = 0
+    failed: int = 0
+    average_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+    jobs_per_hour: float = 0.0
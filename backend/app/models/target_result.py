@@ -0,0 +1,23 @@
+from typing import Optional
+from pydantic import BaseModel
+
+
+class TargetResult(BaseModel):
+    """
+    Outcome of one target of a fan-out deployment.
+
+    Attributes:
+        target: The target's name
+        region: Region the target deploys into
+        status: invalid, failed, cancelled or deployed
+        result: Deployment result
+        error: Validation or deployment error
+        seconds: Time from rendering the target to its result
+    """
+
+    target: str
+    region: str
+    status: str
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    seconds: Optional[float] = None
@@ -0,0 +1,21 @@
+from pathlib import Path
+from pydantic import BaseModel
+
+
+class WorkspaceManifest(BaseModel):
+    """
+    What a workspace materialization wrote.
+
+    Attributes:
+        directory: The workspace directory
+        written: Files that were (re)written
+        unchanged: Files skipped because their content hash matched
+        hashes: SHA-256 of every artifact, by file name
+        bytes_written: Total size of the written files
+    """
+
+    directory: Path
+    written: list[str] = []
+    unchanged: list[str] = []
+    hashes: dict[str, str] = {}
+    bytes_written: int = 0
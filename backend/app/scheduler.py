@@ -0,0 +1,278 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable
+
+from app.components import deploy_components
+from app.fan_out import deploy_targets, fan_out_summary
+from app.handler import deploy_payload
+from app.models.deployment_job import DeploymentJob
+from app.models.scheduler_stats import SchedulerStats
+from app.models.target_result import TargetResult
+from app.utils.deadline import Deadline
+from app.utils.make_directory import remove_workspace
+from app.utils.workspace_backend import get_backend
+from app.utils.workspace_pool import WorkspacePool
+
+
+def run_deployment(
+    job: DeploymentJob,
+    pool: WorkspacePool = None,
+    on_target: Callable[[TargetResult], object] = None,
+    **options,
+) -> dict:
+    """
+    Deploy a job in a fresh workspace and remove the workspace afterwards.
+
+    With a pool, the workspace is a pre-warmed one when the pool has one, and
+    goes back to the pool after a successful deployment. Extra keyword
+    arguments (sinks, instrumentation, cancel_event) are passed on to
+    deploy_payload. The job's deadline starts counting here.
+
+    A job with targets is fanned out instead, with on_target called as each
+    target finishes; it fails only when no target deployed. A job with
+    components set is deployed component by component.
+    """
+    backend = get_backend()
+    if job.targets:
+        fan_out = deploy_targets(
+            job.payload,
+            job.targets,
+            job.private_key_path,
+            job.public_key_path,
+            job.provider,
+            job_id=job.job_id,
+            force=job.force,
+            on_result=on_target,
+            deadline=Deadline(job.deadline_seconds),
+            backend=backend,
+            parallelism=job.parallelism,
+            **options,
+        )
+        return fan_out_summary(fan_out)
+    if job.components:
+        return deploy_components(
+            job.payload,
+            job.private_key_path,
+            job.public_key_path,
+            job.provider,
+            job_id=job.job_id,
+            force=job.force,
+            deadline=Deadline(job.deadline_seconds),
+            backend=backend,
+            parallelism=job.parallelism,
+            **options,
+        )
+    directory = pool and pool.checkout(job.provider, job.job_id)
+    directory = directory or backend.make_directory(job.job_id)
+    succeeded = False
+    try:
+        service = deploy_payload(
+            job.payload,
+            job.private_key_path,
+            job.public_key_path,
+            job.provider,
+            directory=directory,
+            force=job.force,
+            deadline=Deadline(job.deadline_seconds),
+            backend=backend,
+            parallelism=job.parallelism,
+            **options,
+        )
+        succeeded = True
+        return service.result
+    finally:
+        if pool:
+            pool.checkin(directory, job.provider, reuse=succeeded)
+        else:
+            remove_workspace(directory)
+
+
+class JobScheduler:
+    """
+    Runs many deployment jobs concurrently on a bounded worker pool.
+
+    A job starts when a global slot is free and neither its provider nor its
+    cloud account is at its limit. Among the jobs that could start, the lowest
+    priority value wins; ties go to the tenant with the fewest running jobs,
+    then the tenant that has been served least, so one tenant's backlog cannot
+    starve the others. Within a tenant, jobs start in priority then submit
+    order.
+
+    Deployments are blocking, so each one runs on a thread of a pool sized to
+    the global cap; the scheduler itself lives on the event loop that calls
+    submit().
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = None,
+        provider_limits: dict[str, int] = None,
+        account_limit: int = None,
+        runner: Callable[[DeploymentJob], dict] = run_deployment,
+    ):
+        self.max_concurrency = max_concurrency or int(
+            os.environ.get("STACKABLE_MAX_CONCURRENCY", 4)
+        )
+        self.provider_limits = provider_limits or {}
+        self.account_limit = account_limit
+        self.runner = runner
+
+        self._queues = defaultdict(list)
+        self._sequence = itertools.count()
+        self._running = defaultdict(int)
+        self._served = defaultdict(int)
+        self._futures = {}
+        self._tasks = set()
+        self._submitted_at = {}
+        self._started = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._completed = 0
+        self._failed = 0
+        self._first_start = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrency, thread_name_prefix="deploy"
+        )
+
+    def submit(self, job: DeploymentJob) -> asyncio.Future:
+        """Queue a job; the returned future resolves to the runner's result."""
+        future = asyncio.get_running_loop().create_future()
+        self._futures[job.job_id] = future
+        self._submitted_at[job.job_id] = time.monotonic()
+        heapq.heappush(
+            self._queues[job.tenant], (job.priority, next(self._sequence), job)
+        )
+        self._dispatch()
+        return future
+
+    def cancel(self, job_id: str) -> bool:
+        """Remove a queued job and cancel its future; running jobs are not affected."""
+        for queue in self._queues.values():
+            for index, (_, _, job) in enumerate(queue):
+                if job.job_id == job_id:
+                    queue.pop(index)
+                    heapq.heapify(queue)
+                    self._submitted_at.pop(job_id, None)
+                    self._futures.pop(job_id).cancel()
+                    return True
+        return False
+
+    async def run_all(self, jobs: Iterable[DeploymentJob]) -> list:
+        """Submit jobs and wait for all of them; failures are returned as exceptions."""
+        futures = [self.submit(job) for job in jobs]
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    async def join(self):
+        """Wait until every submitted job has finished."""
+        while self._futures or self._tasks:
+            await asyncio.gather(
+                *self._futures.values(), *self._tasks, return_exceptions=True
+            )
+
+    def stats(self) -> SchedulerStats:
+        finished = self._completed + self._failed
+        elapsed = time.monotonic() - self._first_start if self._first_start else 0
+        return SchedulerStats(
+            queued=sum(len(queue) for queue in self._queues.values()),
+            running=self._running["total", ""],
+            completed=self._completed,
+            failed=self._failed,
+            average_wait_seconds=(
+                self._total_wait / self._started if self._started else 0.0
+            ),
+            max_wait_seconds=self._max_wait,
+            jobs_per_hour=finished * 3600 / elapsed if elapsed else 0.0,
+        )
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _slots(self, job: DeploymentJob) -> list[tuple[str, str]]:
+        return [
+            ("total", ""),
+            ("tenant", job.tenant),
+            ("provider", job.provider),
+            ("account", job.account),
+        ]
+
+    def _eligible(self, job: DeploymentJob) -> bool:
+        provider_limit = self.provider_limits.get(job.provider)
+        if provider_limit and self._running["provider", job.provider] >= provider_limit:
+            return False
+        if self.account_limit and self._running["account", job.account] >= (
+            self.account_limit
+        ):
+            return False
+        return True
+
+    def _next_job(self) -> DeploymentJob:
+        candidates = []
+        for tenant, queue in self._queues.items():
+            # A job held back by its provider or account must not block the
+            # tenant's jobs behind it
+            entry = next((e for e in sorted(queue) if self._eligible(e[2])), None)
+            if entry:
+                priority, sequence, _ = entry
+                candidates.append(
+                    (
+                        priority,
+                        self._running["tenant", tenant],
+                        self._served[tenant],
+                        sequence,
+                        tenant,
+                        entry,
+                    )
+                )
+        if not candidates:
+            return None
+        *_, tenant, entry = min(candidates)
+        queue = self._queues[tenant]
+        if entry is queue[0]:
+            return heapq.heappop(queue)[2]
+        queue.remove(entry)
+        heapq.heapify(queue)
+        return entry[2]
+
+    def _dispatch(self):
+        while self._running["total", ""] < self.max_concurrency:
+            job = self._next_job()
+            if job is None:
+                return
+            self._start(job)
+
+    def _start(self, job: DeploymentJob):
+        now = time.monotonic()
+        self._first_start = self._first_start or now
+        wait = now - self._submitted_at.pop(job.job_id)
+        self._started += 1
+        self._total_wait += wait
+        self._max_wait = max(self._max_wait, wait)
+        self._served[job.tenant] += 1
+        for slot in self._slots(job):
+            self._running[slot] += 1
+        task = asyncio.ensure_future(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: DeploymentJob):
+        future = self._futures.pop(job.job_id)
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(self._executor, self.runner, job)
+        except Exception as e:
+            self._failed += 1
+            if not future.done():
+                future.set_exception(e)
+        else:
+            self._completed += 1
+            if not future.done():
+                future.set_result(result)
+        finally:
+            for slot in self._slots(job):
+                self._running[slot] -= 1
+            self._dispatch()
@@ -1,15 +1,144 @@
+import contextlib
+import json
 import shutil
+import threading
+from typing import Sequence
+from jinja2 import TemplateNotFound, UndefinedError
 from .models.payload import Payload
 from pathlib import Path
 from .utils.file_extraction import decode_file, read_file
 from .utils.build_template import build_template
-from .utils.execute_command import execute_command
+from .utils.deadline import PHASE_TIMEOUTS, Deadline, DeadlineExceeded
+from .utils.execute_command import OutputSink, PrefixSink, execute, last_lines
+from .models.command_result import CommandResult
+from .models.workspace_manifest import WorkspaceManifest
+from .utils.fingerprint import deployment_fingerprint
+from .utils.instrumentation import Instrumentation
+from .utils.job_log import JobLog
+from .utils.make_directory import forget_workspace
+from .utils.parallelism import (
+    ParallelismController,
+    declared_resources,
+    shared_controller,
+)
+from .utils.plan_summary import summarize_plan
+from .utils.preflight import PreflightError, template_problems, validate_problems
+from .utils.provider_cache import ProviderCache, required_providers
+from .utils.retry import TRANSIENT_PATTERNS, RetryPolicy, TerraformError
+from .utils.terraform_events import ResourceTimeline, critical_path
+from .utils.workspace import materialize_workspace
+from .utils.workspace_backend import WorkspaceBackend, get_backend
+from .state_store import (
+    LocalStateStore,
+    StateLockError,
+    StateStore,
+    payload_account,
+    state_key,
+)
+
+PLAN_FILE = "tfplan"
+# Output kept in memory per command for error messages; the job log has all of it
+TAIL_LINES = 200
+TAIL_BYTES = 64 * 1024
+# How long terraform may take to stop gracefully when interrupted
+INTERRUPT_GRACE_SECONDS = 30
+
+
+class DeploymentCancelled(RuntimeError):
+    """Raised when a deployment is cancelled; a running terraform is interrupted."""
+
+
+def payload_context(
+    payload: Payload, private_key_path: Path, public_key_path: Path
+) -> dict:
+    """The variables the templates are rendered with."""
+    context_data = {}
+
+    if payload.oracle_cloud:
+        oracle_data = payload.oracle_cloud.model_dump()
+        context_data.update(oracle_data)
+        if payload.oracle_cloud.flex_shape:
+            context_data["flex"] = payload.oracle_cloud.flex_shape.model_dump()
+        else:
+            context_data["flex"] = {
+                "shape": "VM.Standard.E2.1.Micro",
+                "ocpus": 1,
+                "memory_gb": 1,
+            }
+
+    cloudflare_data = payload.cloudflare.model_dump()
+    context_data.update(cloudflare_data)
+
+    github_data = payload.github.model_dump()
+    context_data.update(github_data)
+
+    context_data.update(
+        {
+            "instance_name": payload.instance_name,
+            "vm_username": payload.vm_username,
+            "vm_password": payload.vm_password,
+        }
+    )
+
+    context_data.update(
+        {
+            "pem_path": str(private_key_path),
+            "private_pem_path": str(private_key_path),
+            "public_pem_path": str(public_key_path),
+            "ssh_public_key": decode_file(private_key_path),
+            "ssh_private_key": read_file(private_key_path),
+        }
+    )
+    return context_data
 
 
 class DeploymentService:
-    def __init__(self, directory: Path):
-        self.directory = directory
+    def __init__(
+        self,
+        directory: Path = None,
+        provider_cache: ProviderCache = None,
+        state_store: StateStore = None,
+        instrumentation: Instrumentation = None,
+        sinks: Sequence[OutputSink] = (),
+        cancel_event: threading.Event = None,
+        retry_policy: RetryPolicy = None,
+        job_log: JobLog = None,
+        deadline: Deadline = None,
+        backend: WorkspaceBackend = None,
+        target: str = None,
+        component: str = None,
+        parallelism: int = None,
+        parallelism_controller: ParallelismController = None,
+    ):
+        # Where the workspace is made when no directory is given
+        self.backend = backend or get_backend()
+        self.directory = directory or self.backend.make_directory()
         self.payload = None
+        self.provider = None
+        self.context = None
+        self.result = None
+        self.provider_cache = provider_cache or ProviderCache()
+        self.state_store = state_store or LocalStateStore()
+        self.instrumentation = instrumentation or Instrumentation(
+            job_id=Path(self.directory).name
+        )
+        # Receive every line terraform prints, e.g. to stream progress to clients
+        self.sinks = sinks
+        self.cancel_event = cancel_event
+        self.deadline = deadline or Deadline()
+        # Fan-out target the workspace deploys; it has its own state and output tag
+        self.target = target
+        # Component of a componentized deployment; it has its own state too
+        self.component = component
+        # A fixed -parallelism; otherwise the controller picks one per command
+        self.parallelism = parallelism
+        self.parallelism_controller = parallelism_controller or shared_controller()
+        # -parallelism each command ran with, by phase
+        self.widths = {}
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.job_log = job_log or JobLog(self.instrumentation.job_id)
+        # Transient failures retried so far, as {"phase", "category", "delay"}
+        self.retries = []
 
     def set_payload(
         self,
@@ -18,153 +147,555 @@ class DeploymentService:
         public_key_path: Path,
         provider: str = None,
     ) -> str:
-        self.payload = payload
-        context_data = {}
-
-        if payload.oracle_cloud:
-            oracle_data = payload.oracle_cloud.model_dump()
-            context_data.update(oracle_data)
-            if payload.oracle_cloud.flex_shape:
-                context_data["flex"] = payload.oracle_cloud.flex_shape.model_dump()
-            else:
-                context_data["flex"] = {
-                    "shape": "VM.Standard.E2.1.Micro",
-                    "ocpus": 1,
-                    "memory_gb": 1,
-                }
-
-        cloudflare_data = payload.cloudflare.model_dump()
-        context_data.update(cloudflare_data)
-
-        github_data = payload.github.model_dump()
-        context_data.update(github_data)
-
-        context_data.update(
-            {
-                "instance_name": payload.instance_name,
-                "vm_username": payload.vm_username,
-                "vm_password": payload.vm_password,
-            }
-        )
-
-        context_data.update(
-            {
-                "pem_path": str(private_key_path),
-                "private_pem_path": str(private_key_path),
-                "public_pem_path": str(public_key_path),
-                "ssh_public_key": decode_file(private_key_path),
-                "ssh_private_key": read_file(private_key_path),
-            }
+        return self.render(
+            payload,
+            payload_context(payload, private_key_path, public_key_path),
+            provider,
         )
 
-        rendered_template = build_template().render(**context_data)
-        provider_template = build_template(provider).render(**context_data)
+    def render(
+        self, payload: Payload, context: dict, provider: str = None
+    ) -> tuple[str, str]:
+        """Render the main and provider templates from a payload's context."""
+        self.payload = payload
+        self.provider = provider
+        self.context = context
+        with self.instrumentation.phase("render"):
+            try:
+                rendered_template = build_template().render(**context)
+                provider_template = build_template(provider).render(**context)
+            except (UndefinedError, TemplateNotFound):
+                # Report everything that is wrong, not just the first failure
+                raise PreflightError(self.preflight_problems())
 
         return rendered_template, provider_template
 
+    def preflight_problems(self) -> list[str]:
+        """Problems in the payload's fields and in rendering its templates strictly."""
+        if not self.payload:
+            raise ValueError(
+                "Payload must be set before preflight. Call set_payload() first."
+            )
+        return [
+            *self.payload.preflight(self.provider),
+            *template_problems(self.context, self.provider),
+        ]
+
+    def preflight(self, validate: bool = False):
+        """
+        Fail fast on mistakes terraform would only report minutes in.
+
+        Checks the payload's fields and renders the templates with undefined
+        variables as errors. With validate set, also runs terraform validate
+        on the written workspace, against the shared provider cache.
+
+        Raises:
+            PreflightError: Listing every problem found
+        """
+        with self.instrumentation.phase("preflight"):
+            problems = self.preflight_problems()
+            if validate and not problems:
+                problems = self.validate(self.prepare_providers())
+        if problems:
+            raise PreflightError(problems)
+
+    def validate(self, env: dict[str, str] = None) -> list[str]:
+        """Run terraform validate and return its errors."""
+        result = self.run(
+            "validate",
+            ["terraform", "validate", "-json", "-no-color"],
+            timeout=PHASE_TIMEOUTS["validate"],
+            env=env,
+        )
+        return validate_problems(result)
+
     def generate_tf_files(
         self, template_content: str, private_key_path: Path, file_name: str
     ) -> Path:
         """Generate Terraform files in the deployment directory."""
+        self.write_workspace({file_name: template_content}, private_key_path)
+        return self.directory / file_name
+
+    def write_workspace(
+        self,
+        tf_files: dict[str, str],
+        private_key_path: Path,
+        tfvars: dict = None,
+    ) -> WorkspaceManifest:
+        """
+        Write every file the job needs into the deployment directory in one pass.
+
+        Args:
+            tf_files (dict[str, str]): Terraform file name mapped to rendered content
+            private_key_path (Path): Private key deployed as id_rsa / id_rsa.pub
+            tfvars (Optional[dict]): Variables written to terraform.tfvars.json
+
+        Returns:
+            WorkspaceManifest: The files written and skipped
+        """
         if not self.payload:
             raise ValueError(
                 "Payload must be set before generating Terraform files. Call set_payload() first."
             )
 
-        self.directory.mkdir(parents=True, exist_ok=True)
-        deploy_private_key = self.directory / "id_rsa"
-        deploy_public_key = self.directory / "id_rsa.pub"
-
-        # Generate private key content and write it
-        private_key_content = read_file(private_key_path)
-        with open(deploy_private_key, "w") as f:
-            f.write(private_key_content)
-
-        # Generate public key content and write it
-        public_key_content = decode_file(private_key_path)
-        with open(deploy_public_key, "w") as f:
-            f.write(public_key_content)
-
-        # Set proper permissions on the private key
-        deploy_private_key.chmod(0o600)
-        deploy_public_key.chmod(0o644)
+        artifacts = {
+            "id_rsa": (read_file(private_key_path), 0o600),
+            "id_rsa.pub": (decode_file(private_key_path), 0o644),
+        }
+        for file_name, content in tf_files.items():
+            artifacts[file_name] = (str(content), 0o644)
+        if tfvars is not None:
+            artifacts["terraform.tfvars.json"] = (json.dumps(tfvars), 0o600)
 
-        # Generate the main Terraform configuration file
-        tf_file_path = self.directory / file_name
+        with self.instrumentation.phase("materialize"):
+            return materialize_workspace(self.directory, artifacts)
 
-        with open(tf_file_path, "w") as f:
-            f.write(str(template_content))
+    def run(
+        self,
+        phase: str,
+        argv: list,
+        timeout: float,
+        env: dict[str, str] = None,
+        sinks: Sequence[OutputSink] = (),
+        keep_output: bool = False,
+        resources: int = None,
+    ) -> CommandResult:
+        """
+        Run a terraform command in the workspace and record its metrics.
+
+        Output goes to the job log, and only its tail is kept on the result.
+        Commands whose stdout is data (show, output) set keep_output to get
+        all of it instead; their output can hold sensitive values and is not
+        logged.
+
+        Commands that walk the resource graph pass the resources they can
+        touch and run with the -parallelism the controller chooses for them
+        (or the fixed one of the job or payload). Rate limiting in their
+        output lowers the width the account's next commands get.
+
+        The timeout is shortened to the phase's share of the job deadline.
+        Cancelling the job or running out of time interrupts terraform, which
+        gets INTERRUPT_GRACE_SECONDS to stop before its process group is killed.
+
+        Raises:
+            DeploymentCancelled: When the job is cancelled before or during the command
+            DeadlineExceeded: When the job deadline passes before or during it
+        """
+        if self.cancel_event and self.cancel_event.is_set():
+            raise DeploymentCancelled(f"Deployment cancelled before terraform {phase}")
+        timeout = self.deadline.timeout(phase, timeout)
+        output_sinks = list(self.sinks)
+        if keep_output:
+            tail = {"tail_lines": None, "tail_bytes": None}
+        else:
+            tail = {"tail_lines": TAIL_LINES, "tail_bytes": TAIL_BYTES}
+            output_sinks.append(self.job_log.sink(phase))
+        label = "/".join(filter(None, [self.target, self.component]))
+        if label:
+            # Fan-out targets and components share the job's log and stream
+            output_sinks = [PrefixSink(s, f"[{label}] ") for s in output_sinks]
+        account = payload_account(self.payload) if self.payload else None
+        if resources is None:
+            slot = contextlib.nullcontext()
+        else:
+            override = self.parallelism or (self.payload and self.payload.parallelism)
+            slot = self.parallelism_controller.slot(resources, account, override)
+        with slot as parallel:
+            if parallel:
+                argv = [*argv[:2], f"-parallelism={parallel.width}", *argv[2:]]
+                self.widths[phase] = parallel.width
+            result = execute(
+                argv,
+                self.directory,
+                timeout=timeout,
+                env=env,
+                sinks=[*output_sinks, *sinks],
+                kill_grace=INTERRUPT_GRACE_SECONDS,
+                cancel_event=self.cancel_event,
+                **tail,
+            )
+            if parallel:
+                parallel.throttled = bool(
+                    TRANSIENT_PATTERNS["rate_limit"].search(
+                        f"{result.stderr}\n{result.stdout}"
+                    )
+                )
+        if result.timed_out:
+            result.stderr += f"\nCommand timed out after {timeout:g} seconds"
+        self.instrumentation.record_command(phase, result)
+        if result.cancelled:
+            raise DeploymentCancelled(f"Deployment cancelled during terraform {phase}")
+        if result.timed_out and self.deadline.expired:
+            raise DeadlineExceeded(
+                f"Job deadline of {self.deadline.seconds:g}s passed "
+                f"during terraform {phase}"
+            )
+        return result
 
-        return tf_file_path
+    def failure(self, phase: str, result: CommandResult) -> TerraformError:
+        """Report a failed command; the error carries the end of its output."""
+        output = last_lines(result.stderr or result.stdout)
+        print(f"Terraform {phase} failed with return code: {result.returncode}")
+        print(output)
+        print(f"Full output: {self.job_log.path}")
+        return TerraformError(f"Terraform {phase} failed: {output}", phase, result)
 
-    def deploy(self):
-        # Logic to deploy using the provided variables
-        # Logic to deploy using Terraform
-        print("Starting Terraform deployment...")
+    def run_json(
+        self,
+        phase: str,
+        argv: list,
+        timeout: float,
+        env: dict[str, str] = None,
+        total: int = None,
+        resources: int = None,
+    ) -> tuple[CommandResult, ResourceTimeline]:
+        """
+        Run a terraform command with -json and time each resource it touches.
+
+        Error diagnostics, which terraform prints to stdout in this mode, are
+        appended to the result's stderr.
+        """
+        timeline = ResourceTimeline(phase, self.instrumentation, total)
+        argv = [*argv[:2], "-json", *argv[2:]]
+        result = self.run(
+            phase, argv, timeout, env, sinks=[timeline], resources=resources
+        )
+        if timeline.errors:
+            result.stderr = "\n".join([result.stderr, *timeline.errors]).strip()
+        return result, timeline
 
+    def init(self, env: dict[str, str] = None):
+        """Run terraform init against the shared provider cache."""
         # Run terraform init (typically quick, 2 minutes should be enough)
         print("Running terraform init...")
-        stdout, stderr, returncode = execute_command(
-            "terraform init", self.directory, timeout=120
+        result = self.run(
+            "init",
+            ["terraform", "init", "-input=false"],
+            timeout=PHASE_TIMEOUTS["init"],
+            env=env,
         )
 
-        if returncode != 0:
-            print(f"Terraform init failed with return code: {returncode}")
-            print(f"STDERR: {stderr}")
-            print(f"STDOUT: {stdout}")
-            raise RuntimeError(f"Terraform init failed: {stderr}")
+        if result.returncode != 0:
+            raise self.failure("init", result)
 
         print("Terraform init completed successfully!")
-        print(f"Init output: {stdout}")
 
-        # Run terraform destroy first to clean up existing resources and free limits
-        print("Running terraform destroy to clean up existing resources...")
-        stdout, stderr, returncode = execute_command(
-            "terraform destroy -auto-approve", self.directory, timeout=600
+    def mirror_providers(self, env: dict[str, str] = None):
+        """Copy this workspace's providers into the local filesystem mirror."""
+        print("Mirroring providers for offline installs...")
+        result = self.run(
+            "mirror",
+            ["terraform", "providers", "mirror", self.provider_cache.mirror_dir],
+            timeout=PHASE_TIMEOUTS["mirror"],
+            env=env,
+        )
+        if result.returncode != 0:
+            # The plugin cache still works without the mirror, only offline installs do not
+            print(f"Provider mirror failed, continuing without it: {result.stderr}")
+
+    def source(self) -> str:
+        """The workspace's terraform files, concatenated."""
+        return "\n".join(path.read_text() for path in self.directory.glob("*.tf"))
+
+    def required_providers(self) -> dict[str, str]:
+        return required_providers(self.source())
+
+    def fingerprint(self) -> str:
+        """Content hash of the workspace's rendered files, keys and provider pins."""
+        provider_key = self.provider_cache.provider_key(self.required_providers())
+        return deployment_fingerprint(
+            self.directory, self.provider_cache.lock_file(provider_key)
         )
 
-        # Don't fail if destroy fails (might be nothing to destroy)
-        if returncode != 0:
-            print(
-                f"Terraform destroy completed with warnings (this is normal if no resources exist)"
+    def prepare_providers(self) -> dict[str, str]:
+        """
+        Install providers into the workspace, from the shared cache when possible.
+
+        Returns:
+            dict[str, str]: Environment for terraform commands in this workspace
+        """
+        providers = self.required_providers()
+        provider_key = self.provider_cache.provider_key(providers)
+        env = self.provider_cache.env()
+
+        if self.provider_cache.is_initialized(self.directory, provider_key):
+            print("Workspace was initialized ahead of time, skipping terraform init")
+            return env
+        if self.restore_providers(provider_key):
+            return env
+        with self.provider_cache.install_lock():
+            # Another job may have installed the same set while this one waited
+            if self.restore_providers(provider_key):
+                return env
+            self.init(env)
+            self.provider_cache.store(self.directory, provider_key)
+            self.provider_cache.mark_initialized(self.directory, provider_key)
+            if not self.provider_cache.is_mirrored(providers):
+                self.mirror_providers(env)
+        return env
+
+    def restore_providers(self, provider_key: str) -> bool:
+        """Link the cached installation of provider_key into the workspace."""
+        if not self.provider_cache.restore(
+            self.directory,
+            provider_key,
+            symlink=self.backend.symlink_providers(self.directory),
+        ):
+            return False
+        print("Reusing cached provider installation, skipping terraform init")
+        self.provider_cache.mark_initialized(self.directory, provider_key)
+        return True
+
+    def deploy(self, force: bool = False, resume: bool = False):
+        """
+        Plan and apply the workspace against the payload's stored state.
+
+        Existing resources are updated in place; use destroy() to tear an
+        instance down. If the workspace fingerprint matches the last
+        successful deployment of the same instance, the stored result is
+        returned without running terraform unless force is set.
+
+        Each phase is checkpointed in the state store. Transient failures
+        (rate limits, 5xx, lock contention, network errors) are retried from
+        the failed phase within the retry policy's budget; a failed apply is
+        retried from plan, since its saved plan is stale once resources
+        changed. With resume set, a deployment of the same configuration
+        that already applied continues from its outputs.
+        """
+        print("Starting Terraform deployment...")
+
+        if not self.payload:
+            return self.retrying("apply", self.apply, self.prepare_providers())
+
+        key = state_key(self.payload, self.target, self.component)
+        with self.state_store.lock(
+            key, self.deadline.cap(600, "the state lock")
+        ) as lock_lost:
+            fingerprint = self.fingerprint()
+            last_fingerprint, last_result = self.state_store.last_deployment(key)
+            if not force and last_fingerprint == fingerprint:
+                print(f"Configuration unchanged since the last deployment of {key}")
+                self.result = {**last_result, "cached": True}
+                return self.result
+
+            env = self.retrying("init", self.prepare_providers)
+            # The first init for a provider set creates the cached lock file
+            fingerprint = self.fingerprint()
+            phase, checkpoint = self.state_store.last_checkpoint(key)
+            if not resume or (checkpoint or {}).get("fingerprint") != fingerprint:
+                phase, checkpoint = None, None
+            self.state_store.checkpoint(key, "init", {"fingerprint": fingerprint})
+
+            if self.state_store.restore(key, self.directory):
+                print(f"Restored existing Terraform state for {key}")
+            try:
+                if phase == "apply":
+                    print(f"Resuming the deployment of {key} after apply")
+                    result = self.result = checkpoint["result"]
+                else:
+                    self.check_lock(key, lock_lost)
+                    result = self.retrying("apply", self.apply, env)
+                    self.check_lock(key, lock_lost)
+                    self.state_store.save(key, self.directory)
+                    self.state_store.checkpoint(
+                        key, "apply", {"fingerprint": fingerprint, "result": result}
+                    )
+                result["outputs"] = self.retrying("output", self.outputs, env)
+                result["fingerprint"] = fingerprint
+                result["retries"] = len(self.retries)
+                self.state_store.record_deployment(key, fingerprint, result)
+                self.state_store.checkpoint(key, None, None)
+                return result
+            except Exception:
+                self.state_store.record_deployment(key, None, None)
+                raise
+            finally:
+                # Keep partial state too, so a failed apply is not orphaned
+                self.save_state(key, lock_lost)
+                self.backend.account(self.directory)
+
+    def check_lock(self, key: str, lock_lost: threading.Event):
+        """Raise StateLockError if the state lock on key expired while held."""
+        if lock_lost.is_set():
+            raise StateLockError(f"Lost the state lock on {key}")
+
+    def save_state(self, key: str, lock_lost: threading.Event):
+        """
+        Store the workspace's state, unless the state lock was lost.
+
+        Another deployment may hold the lock by then, and its state must not
+        be overwritten with this workspace's.
+        """
+        if lock_lost.is_set():
+            print(f"Not saving the state of {key}: the state lock was lost")
+            return
+        self.state_store.save(key, self.directory)
+
+    def retrying(self, phase: str, action, *args):
+        """
+        Run action, retrying transient terraform failures with jittered backoff.
+
+        A retry whose backoff would outlast the job deadline is not attempted.
+
+        Args:
+            phase (str): Name of the step being retried, for logging
+            action (Callable): The step; raises TerraformError on failure
+
+        Returns:
+            The step's return value
+        """
+        attempt = 1
+        while True:
+            try:
+                return action(*args)
+            except TerraformError as e:
+                category = e.category
+                if (
+                    category is None
+                    or attempt >= self.retry_policy.max_attempts
+                    or len(self.retries) >= self.retry_policy.budget
+                ):
+                    raise
+                delay = self.retry_policy.delay(len(self.retries))
+                remaining = self.deadline.remaining()
+                if remaining is not None and delay >= remaining:
+                    raise
+                self.retries.append(
+                    {"phase": e.phase, "category": category, "delay": delay}
+                )
+                print(
+                    f"Transient {category} failure in terraform {e.phase}, "
+                    f"retrying {phase} in {delay:.1f}s "
+                    f"({self.retry_policy.budget - len(self.retries)} retries left)"
+                )
+                self.retry_policy.sleep(delay)
+                attempt += 1
+
+    def outputs(self, env: dict[str, str] = None) -> dict:
+        """Read the root module outputs (public_ip, tunnel_url, pretty_url, ...)."""
+        result = self.run(
+            "output",
+            ["terraform", "output", "-json"],
+            timeout=PHASE_TIMEOUTS["output"],
+            env=env,
+            keep_output=True,
+        )
+        if result.returncode != 0:
+            raise self.failure("output", result)
+        return {
+            name: output.get("value")
+            for name, output in json.loads(result.stdout or "{}").items()
+        }
+
+    def destroy(self):
+        """Destroy the resources recorded in the payload's state and drop the state."""
+        if not self.payload:
+            raise ValueError(
+                "Payload must be set before destroying. Call set_payload() first."
             )
-            print(f"Destroy STDERR: {stderr}")
-        else:
+
+        env = self.prepare_providers()
+        key = state_key(self.payload, self.target, self.component)
+        with self.state_store.lock(
+            key, self.deadline.cap(600, "the state lock")
+        ) as lock_lost:
+            if not self.state_store.restore(key, self.directory):
+                print(f"No Terraform state recorded for {key}, nothing to destroy")
+                return {"destroy_success": True, "destroyed": False}
+
+            self.check_lock(key, lock_lost)
+            print("Running terraform destroy...")
+            result = self.run(
+                "destroy",
+                ["terraform", "destroy", "-auto-approve", "-input=false"],
+                timeout=PHASE_TIMEOUTS["destroy"],
+                env=env,
+                resources=declared_resources(self.source()),
+            )
+            if result.returncode != 0:
+                self.save_state(key, lock_lost)
+                raise self.failure("destroy", result)
+
+            self.check_lock(key, lock_lost)
+            self.state_store.delete(key)
             print("Terraform destroy completed successfully!")
-            print(f"Destroy output: {stdout}")
+            return {"destroy_success": True, "destroyed": True}
 
+    def apply(self, env: dict[str, str] = None):
+        """
+        Write a saved plan, then apply exactly that plan.
+
+        The apply step reuses the plan's refresh instead of refreshing again,
+        and is skipped entirely when the plan has no changes.
+
+        Returns:
+            dict: Success flags, whether apply ran, and the plan summary
+        """
         # Run terraform plan (can take a few minutes depending on resources)
         print("Running terraform plan...")
-        stdout, stderr, returncode = execute_command(
-            "terraform plan", self.directory, timeout=300
+        result, _ = self.run_json(
+            "plan",
+            ["terraform", "plan", "-input=false", f"-out={PLAN_FILE}"],
+            timeout=PHASE_TIMEOUTS["plan"],
+            env=env,
+            resources=declared_resources(self.source()),
+        )
+
+        if result.returncode != 0:
+            raise self.failure("plan", result)
+
+        result = self.run(
+            "show",
+            ["terraform", "show", "-json", PLAN_FILE],
+            timeout=PHASE_TIMEOUTS["show"],
+            env=env,
+            keep_output=True,
         )
+        if result.returncode != 0:
+            raise self.failure("show", result)
+        plan_summary = summarize_plan(result.stdout)
 
-        if returncode != 0:
-            print(f"Terraform plan failed with return code: {returncode}")
-            print(f"STDERR: {stderr}")
-            print(f"STDOUT: {stdout}")
-            raise RuntimeError(f"Terraform plan failed: {stderr}")
+        print(
+            f"Terraform plan completed successfully! {plan_summary.add} to add, "
+            f"{plan_summary.change} to change, {plan_summary.destroy} to destroy."
+        )
 
-        print("Terraform plan completed successfully!")
-        print(f"Plan output: {stdout}")
+        self.result = {
+            "init_success": True,
+            "plan_success": True,
+            "applied": False,
+            "cached": False,
+            "plan": plan_summary.model_dump(),
+        }
+        if not plan_summary.has_changes:
+            print("No changes planned, skipping terraform apply.")
+            return self.result
 
         # Run terraform apply
         print("Running terraform apply...")
-        stdout, stderr, returncode = execute_command(
-            "terraform apply -auto-approve", self.directory, timeout=1200
+        result, timeline = self.run_json(
+            "apply",
+            ["terraform", "apply", "-input=false", PLAN_FILE],
+            timeout=PHASE_TIMEOUTS["apply"],
+            env=env,
+            total=len(plan_summary.resource_changes),
+            resources=len(plan_summary.resource_changes),
         )
+        self.result["parallelism"] = dict(self.widths)
+        self.result["resources"] = [t.model_dump() for t in timeline.resources]
+        self.result["critical_path"] = [
+            timing.address for timing in critical_path(timeline.resources)
+        ]
 
-        if returncode != 0:
-            print(f"Terraform apply failed with return code: {returncode}")
-            print(f"STDERR: {stderr}")
-            print(f"STDOUT: {stdout}")
-            raise RuntimeError(f"Terraform apply failed: {stderr}")
+        if result.returncode != 0:
+            raise self.failure("apply", result)
 
         print("Terraform apply completed successfully!")
-        print(f"Apply output: {stdout}")
 
-        return {"init_success": True, "plan_success": True, "plan_output": stdout}
+        self.result["applied"] = True
+        return self.result
 
     def cleanup(self):
         # Logic to clean up after deployment
+        forget_workspace(self.directory)
         shutil.rmtree(self.directory, ignore_errors=True)
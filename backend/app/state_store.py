@@ -0,0 +1,298 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Optional
+
+from .models.payload import Payload
+
+DEFAULT_STATE_DIR = Path(__file__).parents[1] / ".terraform_state"
+STATE_FILE = "terraform.tfstate"
+
+
+class StateLockError(RuntimeError):
+    """Raised when another deployment holds the state lock for too long."""
+
+
+def payload_account(payload: Payload) -> str:
+    """The cloud account a payload deploys into."""
+    if payload.oracle_cloud:
+        return payload.oracle_cloud.tenancy_ocid
+    return payload.cloudflare.cf_account_id
+
+
+def state_key(payload: Payload, target: str = None, component: str = None) -> str:
+    """
+    Identify a deployment's state by cloud account and instance name.
+
+    Each target of a fan-out deployment has its own state, keyed by the
+    target's name as well, and so does each component of a componentized
+    deployment.
+    """
+    key = f"{payload_account(payload)}/{payload.instance_name}"
+    if target:
+        key = f"{key}@{target}"
+    return f"{key}#{component}" if component else key
+
+
+def is_newer_state(candidate: bytes, stored: Optional[bytes]) -> bool:
+    """
+    Whether a state file continues the stored one: the same lineage and a
+    higher serial. Any state is newer than none; unreadable state is not.
+    """
+    if stored is None:
+        return True
+    try:
+        new, old = json.loads(candidate), json.loads(stored)
+        return new.get("lineage") == old.get("lineage") and int(
+            new.get("serial", 0)
+        ) > int(old.get("serial", 0))
+    except (ValueError, TypeError, AttributeError):
+        return False
+
+
+class StateStore:
+    """
+    Keeps Terraform state between jobs so redeploys are incremental.
+
+    Subclasses provide storage; callers hold lock() around restore(), the
+    terraform run and save() so two jobs never apply the same instance at
+    once.
+    """
+
+    def lock(self, key: str, timeout: float = 600):
+        """
+        Context manager holding the exclusive lock on key's state.
+
+        Yields an event that is set if the lock is lost while held; the holder
+        must not write key's state after that.
+        """
+        raise NotImplementedError
+
+    def read(self, key: str) -> Optional[bytes]:
+        """The stored state, or None if there is none."""
+        raise NotImplementedError
+
+    def restore(self, key: str, directory: Path) -> bool:
+        """Copy stored state into the workspace; returns False if there is none."""
+        raise NotImplementedError
+
+    def save(self, key: str, directory: Path):
+        """Store the workspace's state, if terraform wrote one."""
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def last_deployment(self, key: str) -> tuple[str, dict]:
+        """Fingerprint and result of the last successful deployment, or (None, None)."""
+        raise NotImplementedError
+
+    def record_deployment(self, key: str, fingerprint: str, result: dict):
+        """Remember a successful deployment; a None fingerprint forgets it."""
+        raise NotImplementedError
+
+    def last_checkpoint(self, key: str) -> tuple[str, dict]:
+        """Last phase a deployment of key completed, with its data, or (None, None)."""
+        raise NotImplementedError
+
+    def checkpoint(self, key: str, phase: str, data: dict):
+        """Record that a deployment completed phase; a None phase clears it."""
+        raise NotImplementedError
+
+
+class LocalStateStore(StateStore):
+    """
+    State store backed by a SQLite database on the local filesystem.
+
+    State files are kept as blobs together with the previous version, and
+    locks are rows that expire after lock_ttl seconds so a crashed worker
+    cannot block an instance forever. A holder renews its lock every
+    lock_ttl / 3 seconds, so a deployment that runs longer than lock_ttl
+    keeps it. Locks held by a process on this host that has exited are
+    broken right away.
+    """
+
+    def __init__(self, root: Path = None, lock_ttl: float = 3600):
+        self.root = Path(
+            root or os.environ.get("STACKABLE_STATE_DIR") or DEFAULT_STATE_DIR
+        )
+        self.lock_ttl = lock_ttl
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    def _connect(self) -> sqlite3.Connection:
+        self.root.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(
+            self.root / "state.db", timeout=30, isolation_level=None
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS states ("
+            "key TEXT PRIMARY KEY, state BLOB, previous BLOB, updated_at REAL)"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS locks ("
+            "key TEXT PRIMARY KEY, owner TEXT, acquired_at REAL)"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS deployments ("
+            "key TEXT PRIMARY KEY, fingerprint TEXT, result TEXT, updated_at REAL)"
+        )
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "key TEXT PRIMARY KEY, phase TEXT, data TEXT, updated_at REAL)"
+        )
+        return connection
+
+    def _holder_died(self, owner: str) -> bool:
+        """Whether a lock owner is a process on this host that no longer exists."""
+        host, pid, _ = owner.rsplit(":", 2)
+        if host != socket.gethostname():
+            return False
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except (PermissionError, ValueError):
+            pass
+        return False
+
+    def _renew(
+        self, key: str, lock_id: str, stop: threading.Event, lost: threading.Event
+    ):
+        """Keep a held lock from expiring until stop is set; set lost if it expired."""
+        with closing(self._connect()) as connection:
+            while not stop.wait(max(self.lock_ttl / 3, 0.1)):
+                renewed = connection.execute(
+                    "UPDATE locks SET acquired_at = ? WHERE key = ? AND owner = ?",
+                    (time.time(), key, lock_id),
+                ).rowcount
+                if not renewed:
+                    print(f"Lost the state lock on {key}")
+                    lost.set()
+                    return
+
+    @contextmanager
+    def lock(self, key: str, timeout: float = 600):
+        lock_id = f"{self.owner}:{uuid.uuid4().hex}"
+        deadline = time.monotonic() + timeout
+        connection = self._connect()
+        stop, lost, heartbeat = threading.Event(), threading.Event(), None
+        try:
+            while True:
+                now = time.time()
+                connection.execute("BEGIN IMMEDIATE")
+                connection.execute(
+                    "DELETE FROM locks WHERE key = ? AND acquired_at < ?",
+                    (key, now - self.lock_ttl),
+                )
+                holder = connection.execute(
+                    "SELECT owner FROM locks WHERE key = ?", (key,)
+                ).fetchone()
+                if holder and self._holder_died(holder[0]):
+                    connection.execute(
+                        "DELETE FROM locks WHERE key = ? AND owner = ?",
+                        (key, holder[0]),
+                    )
+                acquired = connection.execute(
+                    "INSERT OR IGNORE INTO locks VALUES (?, ?, ?)", (key, lock_id, now)
+                ).rowcount
+                connection.execute("COMMIT")
+                if acquired:
+                    break
+                if time.monotonic() >= deadline:
+                    raise StateLockError(f"Timed out waiting for state lock on {key}")
+                time.sleep(0.5)
+            heartbeat = threading.Thread(
+                target=self._renew,
+                args=(key, lock_id, stop, lost),
+                name=f"state-lock-{key}",
+                daemon=True,
+            )
+            heartbeat.start()
+            yield lost
+        finally:
+            if heartbeat:
+                stop.set()
+                heartbeat.join()
+            connection.execute(
+                "DELETE FROM locks WHERE key = ? AND owner = ?", (key, lock_id)
+            )
+            connection.close()
+
+    def read(self, key: str) -> Optional[bytes]:
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT state FROM states WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def restore(self, key: str, directory: Path) -> bool:
+        state = self.read(key)
+        if state is None:
+            return False
+        (directory / STATE_FILE).write_bytes(state)
+        return True
+
+    def save(self, key: str, directory: Path):
+        state_file = directory / STATE_FILE
+        if not state_file.exists():
+            return
+        with closing(self._connect()) as connection:
+            connection.execute(
+                "INSERT INTO states VALUES (?, ?, NULL, ?) ON CONFLICT(key) DO UPDATE "
+                "SET previous = states.state, state = excluded.state, "
+                "updated_at = excluded.updated_at "
+                # Saving the same state again must not overwrite the previous one
+                "WHERE states.state IS NOT excluded.state",
+                (key, state_file.read_bytes(), time.time()),
+            )
+
+    def delete(self, key: str):
+        with closing(self._connect()) as connection:
+            connection.execute("DELETE FROM states WHERE key = ?", (key,))
+            connection.execute("DELETE FROM deployments WHERE key = ?", (key,))
+            connection.execute("DELETE FROM checkpoints WHERE key = ?", (key,))
+
+    def last_deployment(self, key: str) -> tuple[str, dict]:
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT fingerprint, result FROM deployments WHERE key = ?", (key,)
+            ).fetchone()
+        if not row or row[0] is None:
+            return None, None
+        return row[0], json.loads(row[1])
+
+    def record_deployment(self, key: str, fingerprint: str, result: dict):
+        with closing(self._connect()) as connection:
+            if fingerprint is None:
+                connection.execute("DELETE FROM deployments WHERE key = ?", (key,))
+                return
+            connection.execute(
+                "INSERT OR REPLACE INTO deployments VALUES (?, ?, ?, ?)",
+                (key, fingerprint, json.dumps(result), time.time()),
+            )
+
+    def last_checkpoint(self, key: str) -> tuple[str, dict]:
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                "SELECT phase, data FROM checkpoints WHERE key = ?", (key,)
+            ).fetchone()
+        if not row:
+            return None, None
+        return row[0], json.loads(row[1])
+
+    def checkpoint(self, key: str, phase: str, data: dict):
+        with closing(self._connect()) as connection:
+            if phase is None:
+                connection.execute("DELETE FROM checkpoints WHERE key = ?", (key,))
+                return
+            connection.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?)",
+                (key, phase, json.dumps(data), time.time()),
+            )
@@ -0,0 +1,76 @@
+import os
+import subprocess
+import pytest
+from app.models.command_result import CommandResult
+from app.utils.parallelism import shared_controller
+
+
+@pytest.fixture(autouse=True)
+def instant_retries(monkeypatch):
+    """Retry transient terraform failures without backing off."""
+    monkeypatch.setenv("STACKABLE_RETRY_BASE_DELAY", "0")
+
+
+@pytest.fixture(autouse=True)
+def job_log_dir(tmp_path, monkeypatch):
+    """Write job logs under the test's temporary directory."""
+    monkeypatch.setenv("STACKABLE_LOG_DIR", str(tmp_path / "job_logs"))
+    return tmp_path / "job_logs"
+
+
+@pytest.fixture(autouse=True)
+def parallelism_controller():
+    """Start every test without throttling learned by earlier tests."""
+    shared_controller.cache_clear()
+    yield
+    shared_controller.cache_clear()
+
+
+@pytest.fixture
+def fake_execute(monkeypatch):
+    """
+    Route DeploymentService's terraform commands to a handler.
+
+    The handler gets the command as one string plus the working directory and
+    returns (stdout, stderr, returncode).
+    """
+
+    def install(handler):
+        def fake(argv, cwd, timeout=600, env=None, **kwargs):
+            argv = [str(arg) for arg in argv]
+            stdout, stderr, returncode = handler(" ".join(argv), cwd)
+            return CommandResult(
+                argv=argv, returncode=returncode, stdout=stdout, stderr=stderr
+            )
+
+        monkeypatch.setattr("app.service.execute", fake)
+
+    return install
+
+
+@pytest.fixture
+def fake_terraform(tmp_path, monkeypatch):
+    """Put a terraform stub on PATH that takes 0.1s per command and plans no changes."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    stub = bin_dir / "terraform"
+    stub.write_text(
+        "#!/bin/sh\nsleep 0.1\n"
+        'if [ "$1" = show ]; then echo \'{"resource_changes": []}\'; fi\n'
+    )
+    stub.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}:{os.environ['PATH']}")
+    monkeypatch.setattr(
+        "app.utils.provider_cache.DEFAULT_CACHE_DIR", tmp_path / "provider_cache"
+    )
+    monkeypatch.setattr("app.state_store.DEFAULT_STATE_DIR", tmp_path / "state")
+    return stub
+
+
+@pytest.fixture
+def ssh_key(tmp_path):
+    key = tmp_path / "id_rsa"
+    subprocess.run(
+        ["ssh-keygen", "-q", "-t", "ed25519", "-N", "", "-f", str(key)], check=True
+    )
+    return key
@@ -0,0 +1,102 @@
+import io
+import json
+import shutil
+from pathlib import Path
+import pytest
+from app.batch import parse_entry, run_batch
+from app.utils.make_directory import is_live, read_marker
+
+PAYLOAD = {
+    "oracle_cloud": {
+        "tenancy_ocid": "ocid1.tenancy.oc1..a",
+        "user_ocid": "ocid1.user.oc1..user",
+        "fingerprint": "aa:bb",
+        "region": "us-phoenix-1",
+        "compartment_ocid": "ocid1.compartment.oc1..c",
+    },
+    "cloudflare": {"cf_api_token": "t", "cf_account_id": "acct"},
+    "github": {
+        "github_token": "t",
+        "github_owner": "o",
+        "repo_name": "r",
+        "docker_image": "i",
+    },
+}
+PLAN_JSON = json.dumps(
+    {"resource_changes": [{"address": "r.a", "change": {"actions": ["create"]}}]}
+)
+
+
+def batch_lines() -> list[str]:
+    return [
+        json.dumps({**PAYLOAD, "instance_name": "vm1"}),
+        "{not json",
+        json.dumps({"payload": {**PAYLOAD, "github": {}}, "id": "broken"}),
+        "",
+        json.dumps({"payload": {**PAYLOAD, "instance_name": "vm2"}, "id": "cust-2"}),
+    ]
+
+
+def run(lines, **kwargs):
+    output = io.StringIO()
+    counts = run_batch(lines, output, workers=2, **kwargs)
+    results = [json.loads(line) for line in output.getvalue().splitlines()]
+    return counts, sorted(results, key=lambda result: result["line"])
+
+
+class TestBatch:
+
+    def test_parse_entry_applies_defaults(self, ssh_key):
+        entry = parse_entry(json.dumps(PAYLOAD), {"private_key_path": ssh_key})
+        assert entry.public_key_path == ssh_key and entry.payload.instance_name
+        with pytest.raises(ValueError):
+            parse_entry(json.dumps(PAYLOAD), {})
+
+    def test_render_only_reports_bad_lines_and_keeps_workspaces(self, ssh_key):
+        counts, results = run(batch_lines(), private_key_path=ssh_key)
+        try:
+            assert counts == {"rendered": 2, "invalid": 2}
+            assert [r["status"] for r in results] == [
+                "rendered",
+                "invalid",
+                "invalid",
+                "rendered",
+            ]
+            assert "github.github_token" in results[2]["error"]
+            assert results[3]["id"] == "cust-2"
+            for result in (results[0], results[3]):
+                assert (Path(result["directory"]) / "main.tf").exists()
+                # Left to the reaper, since nothing deploys them
+                assert "released_at" in read_marker(result["directory"])
+        finally:
+            for result in results:
+                if result.get("directory"):
+                    shutil.rmtree(result["directory"])
+
+    def test_deploy_with_concurrency_limit(
+        self, ssh_key, fake_execute, tmp_path, monkeypatch
+    ):
+        monkeypatch.setattr("app.state_store.DEFAULT_STATE_DIR", tmp_path / "state")
+        monkeypatch.setattr(
+            "app.utils.provider_cache.DEFAULT_CACHE_DIR", tmp_path / "cache"
+        )
+        live = []
+
+        def handler(command, cwd):
+            live.append(is_live(cwd, read_marker(cwd)))
+            return (
+                (PLAN_JSON if "show" in command else "{}") if "json" in command else "",
+                "",
+                0,
+            )
+
+        fake_execute(handler)
+        counts, results = run(
+            batch_lines(), private_key_path=ssh_key, deploy=True, max_concurrency=1
+        )
+
+        assert counts == {"deployed": 2, "invalid": 2}
+        # The reaper never sees a workspace as abandoned while it deploys
+        assert live and all(live)
+        deployed = [r for r in results if r["status"] == "deployed"]
+        assert all(r["result"]["applied"] and "directory" not in r for r in deployed)
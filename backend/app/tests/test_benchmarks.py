@@ -0,0 +1,24 @@
+from benchmarks.run import DEFAULT_PROFILE, compare, run_benchmarks
+
+
+class TestBenchmarks:
+
+    def test_run_benchmarks_smoke(self):
+        profile = {
+            name: {"latency": 0.01} for name in DEFAULT_PROFILE if name != "resources"
+        }
+        results = run_benchmarks(iterations=2, jobs=2, workers=[2], profile=profile)
+
+        assert results["render_ms_p50"] > 0
+        assert results["jobs_per_hour_2_workers"] > 0
+        assert results["cached_redeploy_ms_p50"] < results["run_job_s_p50"] * 1000
+
+    def test_compare_flags_regressions_in_both_directions(self):
+        baseline = {"run_job_s_p50": 1.0, "jobs_per_hour_4_workers": 1000}
+        slower = {"run_job_s_p50": 1.5, "jobs_per_hour_4_workers": 1000}
+        fewer_jobs = {"run_job_s_p50": 1.0, "jobs_per_hour_4_workers": 500}
+        faster = {"run_job_s_p50": 0.5, "jobs_per_hour_4_workers": 2000}
+
+        assert compare(slower, baseline, 0.25)[0].startswith("run_job_s_p50")
+        assert compare(fewer_jobs, baseline, 0.25)[0].startswith("jobs_per_hour")
+        assert compare(faster, baseline, 0.25) == []
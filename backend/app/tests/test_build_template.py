@@ -0,0 +1,51 @@
+import os
+import pytest
+from app.utils import build_template as bt
+
+
+@pytest.fixture
+def template_dir(tmp_path, monkeypatch):
+    """Point the registry at a scratch template directory."""
+    templates = tmp_path / "templates"
+    (templates / "providers").mkdir(parents=True)
+    (templates / "main.tf.j2").write_text('name = "{{ instance_name }}"')
+    (templates / "providers" / "oracle_template.tf.j2").write_text(
+        'region = "{{ region }}"'
+    )
+    monkeypatch.setattr(bt, "TEMPLATE_DIR", templates)
+    monkeypatch.setattr(bt, "BYTECODE_CACHE_DIR", tmp_path / "cache")
+    bt.get_environment.cache_clear()
+    yield templates
+    bt.get_environment.cache_clear()
+
+
+class TestBuildTemplate:
+
+    def test_environment_is_shared(self, template_dir):
+        """Repeated lookups reuse one environment and one compiled template."""
+        assert bt.get_environment() is bt.get_environment()
+        assert bt.build_template() is bt.build_template()
+        assert bt.build_template("oracle") is bt.build_template("oracle")
+
+    def test_renders_main_and_provider(self, template_dir):
+        """Main and provider templates resolve to the expected files."""
+        assert bt.build_template().render(instance_name="vm") == 'name = "vm"'
+        assert bt.build_template("oracle").render(region="r") == 'region = "r"'
+
+    def test_changed_template_is_reloaded(self, template_dir):
+        """Editing a template file invalidates the cached compile."""
+        first = bt.build_template()
+        main = template_dir / "main.tf.j2"
+        main.write_text('changed = "{{ instance_name }}"')
+        stat = main.stat()
+        os.utime(main, (stat.st_atime, stat.st_mtime + 10))
+
+        assert bt.build_template() is not first
+        assert bt.build_template().render(instance_name="vm") == 'changed = "vm"'
+
+    def test_precompile_writes_bytecode_cache(self, template_dir, tmp_path):
+        """Precompiling loads every template and fills the bytecode cache."""
+        names = bt.precompile_templates()
+
+        assert sorted(names) == ["main.tf.j2", "providers/oracle_template.tf.j2"]
+        assert len(list((tmp_path / "cache").iterdir())) == 2
@@ -0,0 +1,172 @@
+import json
+import pytest
+from app.components import (
+    COMPONENTS,
+    affected_components,
+    components_for,
+    context_keys,
+    deploy_components,
+    destroy_components,
+)
+from app.models.deployment_job import DeploymentJob
+from app.models.payload import Payload
+from app.scheduler import run_deployment
+from app.state_store import LocalStateStore, state_key
+from app.utils import make_directory as workspaces
+from app.utils.build_template import template_variables, undeclared_variables
+from app.tests.test_preflight import PAYLOAD
+
+OUTPUTS = {
+    "tunnel": {"tunnel_token": "token-1", "tunnel_url": "t.cfargotunnel.com"},
+    "network": {"subnet_id": "ocid1.subnet.oc1..aaaa"},
+    "instance": {"public_ip": "203.0.113.7"},
+    "github": {},
+}
+
+
+def update(**fields) -> Payload:
+    data = json.loads(json.dumps(PAYLOAD))
+    for path, value in fields.items():
+        section, _, name = path.partition("__")
+        if name:
+            data[section][name] = value
+        else:
+            data[section] = value
+    return Payload(**data)
+
+
+def test_components_read_only_their_inputs():
+    read = set()
+    for component in components_for("oracle"):
+        names = template_variables(component.template)
+        for provider in component.providers:
+            names |= template_variables(f"components/providers/{provider}.tf.j2")
+        assert names <= context_keys(component), component.name
+        read |= names
+    # Together they read everything the monolithic templates do
+    assert read == undeclared_variables() | undeclared_variables("oracle")
+
+
+def test_changes_reach_the_components_that_read_them():
+    payload = Payload(**PAYLOAD)
+    assert affected_components(payload, update(github__repo_name="other")) == ["github"]
+    assert affected_components(payload, update(github__docker_image="img:2")) == [
+        "instance",
+        "github",
+    ]
+    assert affected_components(payload, update(cloudflare__domain="a.io")) == [
+        "tunnel",
+        "instance",
+        "github",
+    ]
+    assert affected_components(
+        payload, update(oracle_cloud__region="eu-frankfurt-1")
+    ) == ["network", "instance", "github"]
+    assert affected_components(payload, update(parallelism=4)) == []
+    assert affected_components(payload, update(instance_name="vm2")) == list(COMPONENTS)
+    with pytest.raises(ValueError, match="vultr"):
+        components_for("vultr")
+
+
+@pytest.fixture
+def terraform(fake_terraform, fake_execute, tmp_path, monkeypatch):
+    """Fake terraform that answers each component's outputs and logs "command component"."""
+    monkeypatch.setattr(workspaces, "WORKSPACE_ROOT", tmp_path / "workspaces")
+    calls = {"commands": [], "tfvars": {}}
+
+    def fake_execute_command(command, cwd):
+        main_tf = (cwd / "main.tf").read_text()
+        name = next(
+            (
+                n
+                for n in ("tunnel", "network", "instance")
+                if OUTPUTS[n]
+                and all(f'output "{output}"' in main_tf for output in OUTPUTS[n])
+            ),
+            "github",
+        )
+        calls["commands"].append(f"{command.split()[1]} {name}")
+        if command.startswith(("terraform plan", "terraform destroy")):
+            calls["tfvars"][name] = json.loads(
+                (cwd / "terraform.tfvars.json").read_text()
+            )
+        if command.startswith("terraform show"):
+            changes = [{"address": "r.a", "change": {"actions": ["create"]}}]
+            return json.dumps({"resource_changes": changes}), "", 0
+        if command.startswith("terraform apply"):
+            (cwd / "terraform.tfstate").write_text("{}")
+        if command.startswith("terraform output"):
+            return (
+                json.dumps({k: {"value": v} for k, v in OUTPUTS[name].items()}),
+                "",
+                0,
+            )
+        return "", "", 0
+
+    fake_execute(fake_execute_command)
+    return calls
+
+
+def planned(calls) -> list[str]:
+    return [c.split()[1] for c in calls["commands"] if c.startswith("plan")]
+
+
+def test_updates_apply_only_the_components_they_reach(terraform, ssh_key, tmp_path):
+    result = deploy_components(
+        Payload(**PAYLOAD), ssh_key, ssh_key.with_suffix(".pub"), job_id="first"
+    )
+
+    assert planned(terraform) == ["tunnel", "network", "instance", "github"]
+    assert terraform["tfvars"]["instance"] == {
+        "tunnel_token": "token-1",
+        "subnet_id": "ocid1.subnet.oc1..aaaa",
+    }
+    assert terraform["tfvars"]["github"] == {"public_ip": "203.0.113.7"}
+    # The tunnel token reaches the instance but not the job's result
+    assert result["outputs"] == {
+        "tunnel_url": "t.cfargotunnel.com",
+        "subnet_id": "ocid1.subnet.oc1..aaaa",
+        "public_ip": "203.0.113.7",
+    }
+    assert "token-1" not in json.dumps(result)
+    assert result["components"]["instance"]["applied"]
+    assert not list((tmp_path / "workspaces").iterdir())
+
+    terraform["commands"].clear()
+    job = DeploymentJob(
+        payload=update(github__docker_image="ghcr.io/octo-org/app:2"),
+        private_key_path=ssh_key,
+        public_key_path=ssh_key.with_suffix(".pub"),
+        components=True,
+    )
+    result = run_deployment(job)
+
+    assert planned(terraform) == ["instance", "github"]
+    assert result["components"]["tunnel"]["cached"]
+    assert result["components"]["network"]["cached"]
+    assert terraform["tfvars"]["instance"]["tunnel_token"] == "token-1"
+    assert result["outputs"]["public_ip"] == "203.0.113.7"
+
+    payload = Payload(**PAYLOAD)
+    assert LocalStateStore().last_deployment(state_key(payload, component="tunnel"))[0]
+    assert LocalStateStore().last_deployment(state_key(payload))[0] is None
+
+
+def test_destroy_goes_in_reverse_with_the_last_outputs(terraform, ssh_key):
+    payload = Payload(**PAYLOAD)
+    deploy_components(payload, ssh_key, ssh_key.with_suffix(".pub"))
+    terraform["commands"].clear()
+    terraform["tfvars"].clear()
+
+    results = destroy_components(payload, ssh_key, ssh_key.with_suffix(".pub"))
+
+    destroyed = [c.split()[1] for c in terraform["commands"] if c.startswith("destroy")]
+    assert destroyed == ["github", "instance", "network", "tunnel"]
+    assert terraform["tfvars"]["github"] == {"public_ip": "203.0.113.7"}
+    assert terraform["tfvars"]["instance"]["subnet_id"] == "ocid1.subnet.oc1..aaaa"
+    assert all(result["destroyed"] for result in results.values())
+    store = LocalStateStore()
+    assert store.last_deployment(state_key(payload, component="network")) == (
+        None,
+        None,
+    )
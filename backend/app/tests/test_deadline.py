@@ -0,0 +1,135 @@
+import asyncio
+import sys
+import threading
+import time
+import pytest
+from app.models.deployment_job import DeploymentJob
+from app.models.payload import Payload
+from app.scheduler import run_deployment
+from app.service import DeploymentCancelled, DeploymentService
+from app.state_store import LocalStateStore, state_key
+from app.utils import make_directory as workspaces
+from app.utils.deadline import Deadline, DeadlineExceeded
+from app.utils.execute_command import run_command
+from app.utils.provider_cache import ProviderCache
+from app.utils.retry import TerraformError
+from app.tests.test_preflight import PAYLOAD
+
+# Exits on SIGINT like terraform does, after recording that it was interrupted
+INTERRUPTIBLE = (
+    "import signal, sys, time\n"
+    "def stop(*_):\n"
+    "    print('interrupted', flush=True)\n"
+    "    sys.exit(130)\n"
+    "signal.signal(signal.SIGINT, stop)\n"
+    "print('started', flush=True)\n"
+    "time.sleep(30)\n"
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestDeadline:
+
+    def test_splits_remaining_time_across_phases_ahead(self):
+        clock = Clock()
+        deadline = Deadline(870, clock=clock)
+
+        # plan, show, apply and output weigh 300 + 120 + 1200 + 120
+        assert deadline.timeout("plan", 300) == 150
+        clock.now += 30
+        assert deadline.timeout("apply", 1200) == pytest.approx(840 * 1200 / 1320)
+        assert deadline.timeout("destroy", 600) == 600
+        clock.now += 840
+        assert deadline.expired
+        with pytest.raises(DeadlineExceeded, match="870s passed before terraform"):
+            deadline.timeout("output", 120)
+
+    def test_no_limit_keeps_phase_timeouts(self, monkeypatch):
+        monkeypatch.delenv("STACKABLE_JOB_DEADLINE", raising=False)
+        deadline = Deadline()
+        assert deadline.remaining() is None and not deadline.expired
+        assert deadline.timeout("apply", 1200) == 1200
+        monkeypatch.setenv("STACKABLE_JOB_DEADLINE", "60")
+        assert Deadline().seconds == 60
+
+
+def test_cancel_event_interrupts_then_kills(tmp_path):
+    """A set cancel event sends SIGINT to the running command."""
+    cancel = threading.Event()
+    threading.Timer(0.5, cancel.set).start()
+    started = time.monotonic()
+
+    result = asyncio.run(
+        run_command(
+            [sys.executable, "-c", INTERRUPTIBLE],
+            tmp_path,
+            kill_grace=5,
+            cancel_event=cancel,
+        )
+    )
+
+    assert result.cancelled and not result.timed_out
+    assert result.stdout == "started\ninterrupted"
+    assert result.returncode == 130
+    assert time.monotonic() - started < 3
+
+
+def test_cancelling_a_running_phase(tmp_path):
+    cancel = threading.Event()
+    service = DeploymentService(
+        tmp_path,
+        provider_cache=ProviderCache(tmp_path / "cache"),
+        cancel_event=cancel,
+    )
+    threading.Timer(0.3, cancel.set).start()
+
+    with pytest.raises(DeploymentCancelled, match="during terraform plan"):
+        service.run("plan", [sys.executable, "-c", INTERRUPTIBLE], timeout=300)
+    assert service.instrumentation.phases[-1].phase == "plan"
+
+
+def test_last_phase_runs_into_the_deadline(tmp_path):
+    service = DeploymentService(
+        tmp_path,
+        provider_cache=ProviderCache(tmp_path / "cache"),
+        deadline=Deadline(0.5),
+    )
+    with pytest.raises(DeadlineExceeded, match="0.5s passed during terraform output"):
+        service.run("output", [sys.executable, "-c", INTERRUPTIBLE], timeout=120)
+
+
+def test_deadline_releases_lock_and_workspace(
+    fake_terraform, ssh_key, tmp_path, monkeypatch
+):
+    """A phase cut short by its share of the deadline leaves nothing held behind."""
+    fake_terraform.write_text(
+        "#!/bin/sh\n"
+        'if [ "$1" = plan ]; then exec python3 -c "$SLOW_PLAN"; fi\n'
+        'if [ "$1" = show ]; then echo \'{"resource_changes": []}\'; fi\n'
+    )
+    monkeypatch.setenv("SLOW_PLAN", INTERRUPTIBLE)
+    monkeypatch.setattr(workspaces, "WORKSPACE_ROOT", tmp_path / "workspaces")
+    payload = Payload(**PAYLOAD)
+    job = DeploymentJob(
+        payload=payload,
+        private_key_path=ssh_key,
+        public_key_path=ssh_key.with_suffix(".pub"),
+        deadline_seconds=2,
+    )
+    started = time.monotonic()
+
+    with pytest.raises(TerraformError, match="plan failed: Command timed out"):
+        run_deployment(job)
+
+    # plan gets 300 / 1740 of what init left, not the whole job's time
+    assert time.monotonic() - started < 2
+    assert not any((tmp_path / "workspaces").iterdir())
+    with LocalStateStore().lock(state_key(payload), timeout=0):
+        pass
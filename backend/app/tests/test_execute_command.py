@@ -0,0 +1,144 @@
+import asyncio
+import os
+import sys
+import pytest
+from app.utils.execute_command import (
+    STREAM_LIMIT,
+    CallbackSink,
+    execute_command,
+    run_command,
+)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    with open(f"/proc/{pid}/stat") as f:
+        return f.read().split()[2] != "Z"
+
+
+class TestRunCommand:
+
+    def test_streams_lines_to_sinks(self, tmp_path):
+        """Each line reaches the sinks as it is produced, tagged by stream."""
+        seen = []
+        script = "import sys\nfor i in range(3):\n    print(i, flush=True)\nprint('err', file=sys.stderr)"
+
+        result = asyncio.run(
+            run_command(
+                [sys.executable, "-c", script],
+                tmp_path,
+                sinks=[CallbackSink(lambda stream, line: seen.append((stream, line)))],
+            )
+        )
+
+        assert result.returncode == 0
+        assert [line for stream, line in seen if stream == "stdout"] == ["0", "1", "2"]
+        assert ("stderr", "err") in seen
+
+    def test_tail_is_bounded(self, tmp_path):
+        """Only the last tail_lines lines are retained on the result."""
+        script = "for i in range(1000): print(i)"
+        result = asyncio.run(
+            run_command([sys.executable, "-c", script], tmp_path, tail_lines=3)
+        )
+        assert result.stdout == "997\n998\n999"
+
+    def test_lines_longer_than_the_stream_limit_are_kept(self, tmp_path):
+        """A line over STREAM_LIMIT arrives in pieces, without losing a byte."""
+        seen = []
+        script = f"print('x' * {3 * STREAM_LIMIT + 5}); print('end')"
+
+        result = asyncio.run(
+            run_command(
+                [sys.executable, "-c", script],
+                tmp_path,
+                sinks=[CallbackSink(lambda stream, line: seen.append(line))],
+            )
+        )
+
+        assert result.returncode == 0
+        assert "".join(seen[:-1]) == "x" * (3 * STREAM_LIMIT + 5)
+        assert len(seen) > 2 and seen[-1] == "end"
+        assert result.stdout_bytes == 3 * STREAM_LIMIT + 5 + len("\nend\n")
+
+    def test_long_line_is_not_followed_by_an_empty_line(self, tmp_path):
+        """The newline ending a long line does not arrive as a line of its own."""
+        seen = []
+        script = f"import sys; sys.stdout.write('x' * {STREAM_LIMIT + 10} + '\\n' + 'done\\n')"
+
+        result = asyncio.run(
+            run_command(
+                [sys.executable, "-c", script],
+                tmp_path,
+                sinks=[CallbackSink(lambda stream, line: seen.append(line))],
+            )
+        )
+
+        assert result.returncode == 0
+        assert "".join(seen[:-1]) == "x" * (STREAM_LIMIT + 10)
+        assert "" not in seen and seen[-1] == "done"
+
+    def test_slow_sink_applies_backpressure(self, tmp_path):
+        """A one-slot queue still delivers every line, in order."""
+        seen = []
+
+        async def slow(stream, line):
+            await asyncio.sleep(0)
+            seen.append(line)
+
+        script = "for i in range(200): print(i)"
+        asyncio.run(
+            run_command(
+                [sys.executable, "-c", script],
+                tmp_path,
+                sinks=[CallbackSink(slow)],
+                queue_size=1,
+            )
+        )
+        assert seen == [str(i) for i in range(200)]
+
+    def test_timeout_kills_process_group(self, tmp_path):
+        """Children of the command are killed along with it on timeout."""
+        pid_file = tmp_path / "child.pid"
+        command = ["sh", "-c", f"sleep 30 & echo $! > {pid_file}; wait"]
+
+        result = asyncio.run(run_command(command, tmp_path, timeout=0.5, kill_grace=1))
+
+        assert result.timed_out
+        assert not _alive(int(pid_file.read_text()))
+
+    def test_cancellation_kills_process_group(self, tmp_path):
+        """Cancelling the awaiting task terminates the command's process group."""
+        pid_file = tmp_path / "child.pid"
+        command = ["sh", "-c", f"sleep 30 & echo $! > {pid_file}; wait"]
+
+        async def cancel_soon():
+            task = asyncio.ensure_future(run_command(command, tmp_path, kill_grace=1))
+            while not pid_file.exists() or not pid_file.read_text():
+                await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel_soon())
+        assert not _alive(int(pid_file.read_text()))
+
+
+class TestExecuteCommand:
+
+    def test_returns_full_output(self, tmp_path):
+        stdout, stderr, returncode = execute_command("echo hello", tmp_path)
+        assert (stdout, stderr, returncode) == ("hello", "", 0)
+
+    def test_missing_binary(self, tmp_path):
+        stdout, stderr, returncode = execute_command("no-such-binary-xyz", tmp_path)
+        assert returncode == 1
+        assert "no-such-binary-xyz" in stderr
+
+    def test_timeout(self, tmp_path):
+        _, stderr, returncode = execute_command("sleep 5", tmp_path, timeout=0.2)
+        assert returncode == 1
+        assert stderr == "Command timed out after 0.2 seconds"
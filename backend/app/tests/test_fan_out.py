@@ -0,0 +1,228 @@
+import json
+import threading
+import pytest
+from app.fan_out import check_targets, deploy_targets, fan_out_summary
+from app.models.deploy_target import DeployTarget
+from app.models.deployment_job import DeploymentJob
+from app.models.fan_out_result import FanOutResult
+from app.models.payload import Payload
+from app.models.target_result import TargetResult
+from app.scheduler import run_deployment
+from app.service import DeploymentCancelled
+from app.state_store import LocalStateStore, state_key
+from app.utils import make_directory as workspaces
+from app.utils.job_log import JobLog
+from app.utils.provider_cache import LOCK_FILE
+from app.tests.test_preflight import PAYLOAD
+
+PROVIDER = ".terraform/providers/registry.terraform.io/hashicorp/random/provider"
+
+
+@pytest.fixture
+def commands(fake_terraform, tmp_path, monkeypatch):
+    """
+    Terraform stub that logs "command region component", fails plans in
+    ap-tokyo-1 and keeps the GitHub component's variables in github.tfvars.json.
+    """
+    log = tmp_path / "commands.log"
+    fake_terraform.write_text(
+        "#!/bin/sh\n"
+        "region=$(sed -n 's/^ *region *= \"\\(.*\\)\"/\\1/p' main.tf)\n"
+        "component=network\n"
+        "grep -q oci_core_instance main.tf && component=instance\n"
+        "grep -q cloudflare_zero_trust main.tf && component=tunnel\n"
+        "grep -q github_actions_secret main.tf && component=github\n"
+        f'echo "$1 ${{region:--}} $component" >> {log}\n'
+        'if [ "$1" = init ]; then\n'
+        f"  mkdir -p $(dirname {PROVIDER}) && echo binary > {PROVIDER}\n"
+        f"  echo '# pinned' > {LOCK_FILE}\n"
+        "fi\n"
+        'if [ "$1" = plan ] && [ "$region" = ap-tokyo-1 ]; then\n'
+        "  echo 'Error: region unavailable' >&2; exit 1\n"
+        "fi\n"
+        'if [ "$1" = plan ] && [ $component = github ]; then\n'
+        f"  cp terraform.tfvars.json {tmp_path / 'github.tfvars.json'}\n"
+        "fi\n"
+        'if [ "$1" = show ]; then echo \'{"resource_changes": []}\'; fi\n'
+        'if [ "$1" = output ]; then case $component in\n'
+        '  tunnel) echo \'{"tunnel_token": {"value": "token"}, "tunnel_url": {"value": "t"}}\' ;;\n'
+        '  network) echo "{\\"subnet_id\\": {\\"value\\": \\"subnet-$region\\"}}" ;;\n'
+        '  instance) echo "{\\"public_ip\\": {\\"value\\": \\"ip-$region\\"}}" ;;\n'
+        "  *) echo '{}' ;;\n"
+        "esac; fi\n"
+    )
+    monkeypatch.setattr(workspaces, "WORKSPACE_ROOT", tmp_path / "workspaces")
+    log.touch()
+    return lambda: [line.split() for line in log.read_text().splitlines()]
+
+
+def fan_out(ssh_key, targets, **options):
+    return deploy_targets(
+        Payload(**PAYLOAD),
+        targets,
+        ssh_key,
+        ssh_key.with_suffix(".pub"),
+        **options,
+    )
+
+
+def test_targets_deploy_in_parallel_with_their_own_state(commands, ssh_key, tmp_path):
+    targets = [
+        DeployTarget(region="eu-frankfurt-1"),
+        DeployTarget(region="ap-tokyo-1"),
+        DeployTarget(region="eu-frankfurt-x", name="bad"),
+        DeployTarget(
+            region="us-ashburn-1",
+            name="dr",
+            compartment_ocid="ocid1.compartment.oc1..cccc",
+        ),
+    ]
+    finished = []
+
+    results = fan_out(
+        ssh_key,
+        targets,
+        job_id="job",
+        on_result=finished.append,
+        job_log=JobLog("job", tmp_path),
+    )
+
+    assert [(r.target, r.status) for r in results.targets] == [
+        ("eu-frankfurt-1", "deployed"),
+        ("ap-tokyo-1", "failed"),
+        ("bad", "invalid"),
+        ("dr", "deployed"),
+    ]
+    assert sorted(r.target for r in finished) == sorted(
+        r.target for r in results.targets
+    )
+    assert finished[0].target == "bad"
+    assert "region unavailable" in results.targets[1].error
+    assert results.targets[3].result["outputs"] == {
+        "subnet_id": "subnet-us-ashburn-1",
+        "public_ip": "ip-us-ashburn-1",
+    }
+    assert results.error is None
+
+    # The tunnel and the GitHub secrets are deployed once, for every region
+    plans = sorted(tuple(c[1:]) for c in commands() if c[0] == "plan")
+    assert plans == [
+        ("-", "github"),
+        ("-", "tunnel"),
+        ("ap-tokyo-1", "network"),
+        ("eu-frankfurt-1", "instance"),
+        ("eu-frankfurt-1", "network"),
+        ("us-ashburn-1", "instance"),
+        ("us-ashburn-1", "network"),
+    ]
+    deploy_hosts = json.loads((tmp_path / "github.tfvars.json").read_text())
+    assert deploy_hosts == {"public_ip": "ip-eu-frankfurt-1,ip-us-ashburn-1"}
+    assert set(results.shared) == {"tunnel", "github"}
+    assert results.outputs == {"tunnel_url": "t"}
+    # One init per set of providers; the rest linked the cached providers
+    assert [command for command, *_ in commands()].count("init") == 3
+
+    store = LocalStateStore()
+    payload = Payload(**PAYLOAD)
+    assert store.last_deployment(state_key(payload, "dr", component="instance"))[0]
+    assert store.last_deployment(state_key(payload, "eu-frankfurt-1", "network"))[0]
+    assert store.last_deployment(state_key(payload, component="tunnel"))[0]
+    assert store.last_deployment(state_key(payload, component="github"))[0]
+    assert (
+        store.last_deployment(state_key(payload, "dr", component="tunnel"))[0] is None
+    )
+    assert not list((tmp_path / "workspaces").iterdir())
+
+    log = JobLog.open("job", tmp_path).read(0).decode()
+    assert "[ap-tokyo-1/network] Error: region unavailable" in log
+
+
+def test_a_failed_shared_component_stops_every_target(commands, ssh_key):
+    targets = [
+        DeployTarget(region="eu-frankfurt-1"),
+        DeployTarget(region="us-ashburn-1"),
+    ]
+    cancel_event = threading.Event()
+    cancel_event.set()
+
+    results = fan_out(ssh_key, targets, cancel_event=cancel_event)
+
+    assert [r.status for r in results.targets] == ["cancelled", "cancelled"]
+    assert "Shared component tunnel" in results.error
+    assert commands() == []
+    with pytest.raises(DeploymentCancelled):
+        fan_out_summary(results)
+
+
+def test_targets_render_their_region_and_compartment(ssh_key):
+    payload = DeployTarget(
+        region="eu-frankfurt-1", compartment_ocid="ocid1.compartment.oc1..cccc"
+    ).payload_for(Payload(**PAYLOAD))
+    assert payload.oracle_cloud.region == "eu-frankfurt-1"
+    assert payload.oracle_cloud.compartment_ocid == "ocid1.compartment.oc1..cccc"
+    assert payload.oracle_cloud.tenancy_ocid == PAYLOAD["oracle_cloud"]["tenancy_ocid"]
+    assert Payload(**PAYLOAD).oracle_cloud.region == "us-phoenix-1"
+
+
+def test_invalid_target_lists_are_rejected():
+    payload = Payload(**PAYLOAD)
+    with pytest.raises(ValueError, match="at least one"):
+        check_targets(payload, [])
+    with pytest.raises(ValueError, match="eu-frankfurt-1"):
+        check_targets(
+            payload,
+            [
+                DeployTarget(region="eu-frankfurt-1"),
+                DeployTarget(region="eu-frankfurt-1"),
+            ],
+        )
+    with pytest.raises(ValueError, match="oracle_cloud"):
+        check_targets(
+            payload.model_copy(update={"oracle_cloud": None}),
+            [DeployTarget(region="eu-frankfurt-1")],
+        )
+    with pytest.raises(ValueError):
+        DeployTarget(region="eu-frankfurt-1", name="../escape")
+
+
+def test_jobs_with_targets_fan_out(commands, ssh_key):
+    job = DeploymentJob(
+        payload=Payload(**PAYLOAD),
+        private_key_path=ssh_key,
+        public_key_path=ssh_key.with_suffix(".pub"),
+        targets=[
+            DeployTarget(region="eu-frankfurt-1"),
+            DeployTarget(region="ap-tokyo-1"),
+        ],
+    )
+    finished = []
+
+    result = run_deployment(job, on_target=finished.append)
+
+    assert (result["deployed"], result["failed"]) == (1, 1)
+    assert result["targets"]["ap-tokyo-1"]["status"] == "failed"
+    assert len(finished) == 2
+
+    job.targets = [DeployTarget(region="ap-tokyo-1")]
+    with pytest.raises(RuntimeError, match="Every target failed"):
+        run_deployment(job)
+
+
+def test_summary_of_cancelled_targets_is_a_cancellation():
+    with pytest.raises(DeploymentCancelled):
+        fan_out_summary(
+            FanOutResult(
+                targets=[
+                    TargetResult(
+                        target="a", region="a", status="cancelled", error="stop"
+                    )
+                ]
+            )
+        )
+    with pytest.raises(RuntimeError, match="github"):
+        fan_out_summary(
+            FanOutResult(
+                targets=[TargetResult(target="a", region="a", status="deployed")],
+                error="Shared component github: bad token",
+            )
+        )
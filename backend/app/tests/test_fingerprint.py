@@ -0,0 +1,123 @@
+import json
+from pathlib import Path
+import pytest
+from app.service import DeploymentService
+from app.state_store import LocalStateStore
+from app.utils.fingerprint import deployment_fingerprint
+from app.utils.provider_cache import ProviderCache
+from app.models.payload import Payload
+from app.models.cloudflare_vars import CloudflareVars
+from app.models.github_vars import GithubVars
+
+PLAN_JSON = json.dumps(
+    {"resource_changes": [{"address": "r.a", "change": {"actions": ["create"]}}]}
+)
+OUTPUTS_JSON = json.dumps(
+    {
+        "public_ip": {"value": "203.0.113.7"},
+        "tunnel_url": {"value": "abc.cfargotunnel.com"},
+        "pretty_url": {"value": "api.example.com"},
+    }
+)
+
+
+@pytest.fixture
+def payload():
+    return Payload(
+        cloudflare=CloudflareVars(cf_api_token="t", cf_account_id="acct"),
+        github=GithubVars(
+            github_token="t", github_owner="o", repo_name="r", docker_image="i"
+        ),
+    )
+
+
+@pytest.fixture
+def terraform(fake_execute):
+    """Fake terraform that records commands and can be told to fail apply."""
+    calls = {"commands": [], "fail_apply": False}
+
+    def fake_execute_command(command, cwd):
+        calls["commands"].append(command)
+        if command.startswith("terraform init"):
+            (Path(cwd) / ".terraform.lock.hcl").write_text("# lock\n")
+        if command.startswith("terraform show"):
+            return PLAN_JSON, "", 0
+        if command.startswith("terraform output"):
+            return OUTPUTS_JSON, "", 0
+        if command.startswith("terraform apply") and calls["fail_apply"]:
+            return "", "Error: 502 Bad Gateway", 1
+        return "", "", 0
+
+    fake_execute(fake_execute_command)
+    return calls
+
+
+class TestFingerprint:
+
+    def test_independent_of_workspace_path(self, tmp_path):
+        for name in ("a", "b"):
+            (tmp_path / name).mkdir()
+            (tmp_path / name / "main.tf").write_text("resource {}")
+            (tmp_path / name / "id_rsa.pub").write_text("ssh-ed25519 AAAA")
+        assert deployment_fingerprint(tmp_path / "a") == deployment_fingerprint(
+            tmp_path / "b"
+        )
+
+    def test_changes_with_content_and_lock_file(self, tmp_path):
+        (tmp_path / "main.tf").write_text("resource {}")
+        lock = tmp_path / "pins.hcl"
+        lock.write_text("version = 1")
+        base = deployment_fingerprint(tmp_path, lock)
+
+        lock.write_text("version = 2")
+        assert deployment_fingerprint(tmp_path, lock) != base
+        (tmp_path / "provider.tf").write_text("x")
+        assert deployment_fingerprint(tmp_path) != deployment_fingerprint(
+            tmp_path, lock
+        )
+
+
+class TestNoOpDeploy:
+
+    def deploy(self, tmp_path, payload, name, content="resource {}", **kwargs):
+        directory = tmp_path / name
+        directory.mkdir()
+        (directory / "main.tf").write_text(content)
+        svc = DeploymentService(
+            directory,
+            provider_cache=ProviderCache(tmp_path / "cache"),
+            state_store=LocalStateStore(tmp_path / "state"),
+        )
+        svc.payload = payload
+        return svc.deploy(**kwargs)
+
+    def test_identical_resubmit_returns_cached_outputs(
+        self, tmp_path, payload, terraform
+    ):
+        first = self.deploy(tmp_path, payload, "job1")
+        count = len(terraform["commands"])
+        second = self.deploy(tmp_path, payload, "job2")
+
+        assert len(terraform["commands"]) == count
+        assert second["cached"] is True and first["cached"] is False
+        assert second["outputs"] == {
+            "public_ip": "203.0.113.7",
+            "tunnel_url": "abc.cfargotunnel.com",
+            "pretty_url": "api.example.com",
+        }
+
+    def test_force_and_changed_config_redeploy(self, tmp_path, payload, terraform):
+        self.deploy(tmp_path, payload, "job1")
+
+        assert self.deploy(tmp_path, payload, "job2", force=True)["cached"] is False
+        changed = self.deploy(tmp_path, payload, "job3", content="resource { x }")
+        assert changed["cached"] is False
+
+    def test_failed_deploy_is_not_cached(self, tmp_path, payload, terraform):
+        self.deploy(tmp_path, payload, "job1")
+        terraform["fail_apply"] = True
+        with pytest.raises(RuntimeError):
+            self.deploy(tmp_path, payload, "job2", content="resource { x }")
+        terraform["fail_apply"] = False
+
+        assert self.deploy(tmp_path, payload, "job3")["cached"] is False
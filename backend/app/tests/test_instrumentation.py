@@ -0,0 +1,113 @@
+import json
+import sys
+import urllib.request
+from app.handler import run_job
+from app.models.phase_metrics import PhaseMetrics
+from app.utils.execute_command import execute
+from app.utils.instrumentation import Instrumentation, JsonLinesSink, PrometheusSink
+
+
+def metrics(phase="apply", **kwargs) -> PhaseMetrics:
+    values = {"job_id": "job", "phase": phase, "started_at": 0, "duration_seconds": 2}
+    return PhaseMetrics(**{**values, **kwargs})
+
+
+class TestCommandUsage:
+
+    def test_reports_cpu_memory_and_output_bytes(self, tmp_path):
+        script = (
+            "import time\n"
+            "block = bytearray(64 * 1024 * 1024)\n"
+            "end = time.process_time() + 0.8\n"
+            "while time.process_time() < end: pass\n"
+            "print('x' * 99)"
+        )
+        result = execute([sys.executable, "-c", script], tmp_path)
+
+        assert result.stdout_bytes == 100
+        assert result.stderr_bytes == 0
+        assert result.cpu_seconds >= 0.3
+        assert result.peak_rss_bytes >= 64 * 1024 * 1024
+
+
+class TestSinks:
+
+    def test_json_lines_sink(self, tmp_path):
+        sink = JsonLinesSink(tmp_path / "events.jsonl")
+        instrumentation = Instrumentation("job", sinks=[sink])
+        with instrumentation.phase("render"):
+            pass
+        instrumentation.emit(metrics(returncode=0))
+
+        lines = (tmp_path / "events.jsonl").read_text().splitlines()
+        assert [json.loads(line)["phase"] for line in lines] == ["render", "apply"]
+        assert len(instrumentation.phases) == 2
+
+    def test_prometheus_histograms_aggregate_jobs(self):
+        sink = PrometheusSink()
+        sink.emit(metrics(returncode=0, cpu_seconds=3, stdout_bytes=10))
+        sink.emit(metrics(duration_seconds=400, returncode=1))
+
+        text = sink.render()
+        assert 'stackable_phase_duration_seconds_bucket{phase="apply",le="5"} 1' in text
+        assert (
+            'stackable_phase_duration_seconds_bucket{phase="apply",le="+Inf"} 2' in text
+        )
+        assert 'stackable_phase_duration_seconds_sum{phase="apply"} 402.0' in text
+        assert 'stackable_phase_cpu_seconds_count{phase="apply"} 1' in text
+        assert 'stackable_phase_total{phase="apply",success="false"} 1' in text
+        assert (
+            'stackable_phase_output_bytes_total{phase="apply",stream="stdout"} 10'
+            in text
+        )
+
+    def test_prometheus_endpoint(self):
+        sink = PrometheusSink()
+        sink.emit(metrics())
+        server = sink.serve(port=0, host="127.0.0.1")
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            body = urllib.request.urlopen(url).read().decode()
+        finally:
+            server.shutdown()
+        assert body == sink.render()
+
+
+def test_run_job_returns_phase_metrics(fake_terraform, ssh_key, tmp_path):
+    payload = tmp_path / "payload.json"
+    payload.write_text(
+        json.dumps(
+            {
+                "oracle_cloud": {
+                    "tenancy_ocid": "ocid1.tenancy.oc1..a",
+                    "user_ocid": "ocid1.user.oc1..a",
+                    "fingerprint": "aa:bb",
+                    "region": "us-phoenix-1",
+                    "compartment_ocid": "ocid1.compartment.oc1..a",
+                },
+                "cloudflare": {"cf_api_token": "t", "cf_account_id": "a"},
+                "github": {
+                    "github_token": "t",
+                    "github_owner": "o",
+                    "repo_name": "r",
+                    "docker_image": "i",
+                },
+            }
+        )
+    )
+
+    service, phases = run_job(ssh_key, ssh_key.with_suffix(".pub"), payload, "oracle")
+    service.cleanup()
+
+    assert [p.phase for p in phases] == [
+        "render",
+        "materialize",
+        "preflight",
+        "init",
+        "mirror",
+        "plan",
+        "show",
+        "output",
+    ]
+    init = phases[3]
+    assert init.returncode == 0 and init.duration_seconds >= 0.1
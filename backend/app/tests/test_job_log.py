@@ -0,0 +1,75 @@
+import asyncio
+import gzip
+import os
+import time
+import pytest
+from app.service import DeploymentService
+from app.utils.execute_command import TailSink, last_lines
+from app.utils.job_log import JobLog, remove_old_logs
+from app.utils.provider_cache import ProviderCache
+from app.utils.retry import TerraformError
+
+
+class TestJobLog:
+
+    def test_chunks_are_one_gzip_stream_with_ranges(self, tmp_path):
+        log = JobLog("job", tmp_path, chunk_bytes=100)
+        lines = [f"plan line {i:03}" for i in range(30)]
+        for line in lines:
+            log.write("plan", line)
+        log.write("apply", "applied")
+        log.write("plan", "replanned")
+
+        text = ("\n".join(lines) + "\napplied\nreplanned\n").encode()
+        assert log.size == len(text)
+        assert log.read() == text
+        assert log.read(95, 130) == text[95:130]
+        assert [phase for phase, _, _ in log.phases()] == ["plan", "apply", "plan"]
+
+        log.flush()
+        assert gzip.decompress(log.path.read_bytes()) == text
+        assert len(log.chunks) > 3
+        reopened = JobLog.open("job", tmp_path)
+        assert reopened.read(len(text) - 10) == text[-10:]
+        assert JobLog.open("missing", tmp_path) is None
+
+    def test_old_logs_are_removed(self, tmp_path):
+        for job_id in ("old", "new"):
+            log = JobLog(job_id, tmp_path)
+            log.write("plan", "planned")
+            log.flush()
+        week_ago = time.time() - 7 * 86400
+        os.utime(tmp_path / "old.log.gz", (week_ago, week_ago))
+
+        assert remove_old_logs(86400, tmp_path) == 1
+        assert JobLog.open("old", tmp_path) is None
+        assert not (tmp_path / "old.log.index.json").exists()
+        assert JobLog.open("new", tmp_path).read() == b"planned\n"
+
+    def test_tail_is_bounded_by_lines_and_bytes(self):
+        tail = TailSink(max_lines=5, max_bytes=20)
+
+        async def feed():
+            for i in range(100):
+                await tail.write("stderr", f"line {i}")
+            await tail.write("stdout", "x" * 50)
+
+        asyncio.run(feed())
+        assert tail.text("stderr") == "line 98\nline 99"
+        assert tail.text("stdout") == "x" * 20
+        assert last_lines("a\nb\nc", 2) == "... (1 earlier lines)\nb\nc"
+
+
+def test_failure_message_carries_only_the_tail(tmp_path, fake_execute, job_log_dir):
+    noise = "\n".join(f"2024/01/01 [DEBUG] step {i}" for i in range(5000))
+    fake_execute(lambda command, cwd: ("", f"{noise}\nError: 403 Forbidden", 1))
+    service = DeploymentService(
+        tmp_path, provider_cache=ProviderCache(tmp_path / "cache")
+    )
+
+    with pytest.raises(TerraformError) as error:
+        service.apply()
+
+    message = str(error.value)
+    assert message.endswith("Error: 403 Forbidden") and len(message.splitlines()) <= 22
+    assert service.job_log.path.parent == job_log_dir
@@ -0,0 +1,223 @@
+import json
+import threading
+import time
+from pathlib import Path
+from contextlib import closing
+import pytest
+from app.job_queue import (
+    IdempotencyConflictError,
+    JobQueue,
+    LeaseLostError,
+    QueueWorker,
+)
+from app.models.deployment_job import DeploymentJob
+from app.models.payload import Payload
+from app.models.oracle_cloud_config import OCIVars
+from app.models.cloudflare_vars import CloudflareVars
+from app.models.github_vars import GithubVars
+from app.state_store import LocalStateStore, state_key
+
+PLAN_JSON = json.dumps(
+    {"resource_changes": [{"address": "r.a", "change": {"actions": ["create"]}}]}
+)
+
+
+def make_job(ssh_key, name="web", **kwargs) -> DeploymentJob:
+    return DeploymentJob(
+        payload=Payload(
+            oracle_cloud=OCIVars(
+                tenancy_ocid="ocid1.tenancy.oc1..a",
+                user_ocid="ocid1.user.oc1..user",
+                fingerprint="aa:bb",
+                region="us-phoenix-1",
+                compartment_ocid="ocid1.compartment.oc1..c",
+            ),
+            cloudflare=CloudflareVars(cf_api_token="t", cf_account_id="acct"),
+            github=GithubVars(
+                github_token="t", github_owner="o", repo_name="r", docker_image="i"
+            ),
+            instance_name=name,
+        ),
+        private_key_path=ssh_key,
+        public_key_path=ssh_key.with_suffix(".pub"),
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def job_queue(tmp_path):
+    return JobQueue(tmp_path / "queue", lease_seconds=60)
+
+
+class TestJobQueue:
+
+    def test_idempotency_key_collapses_duplicates(self, job_queue, ssh_key):
+        first = job_queue.enqueue(make_job(ssh_key), idempotency_key="abc")
+        second = job_queue.enqueue(make_job(ssh_key), idempotency_key="abc")
+
+        assert first == second
+        assert job_queue.counts() == {"queued": 1}
+        with pytest.raises(IdempotencyConflictError):
+            job_queue.enqueue(make_job(ssh_key, name="other"), idempotency_key="abc")
+
+    def test_concurrent_enqueues_share_commits(self, job_queue, ssh_key):
+        results = []
+
+        def submit(index):
+            job = make_job(ssh_key, name=f"vm{index % 50}")
+            try:
+                results.append(job_queue.enqueue(job, f"key{index % 100}"))
+            except IdempotencyConflictError:
+                results.append(None)
+
+        threads = [threading.Thread(target=submit, args=(i,)) for i in range(200)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Every key is submitted twice with the same payload
+        assert None not in results and len(set(results)) == 100
+        assert job_queue.counts() == {"queued": 100}
+
+    def test_expired_lease_is_reclaimed_with_phase_and_workspace(
+        self, tmp_path, ssh_key
+    ):
+        job_queue = JobQueue(tmp_path / "queue", lease_seconds=0.2, max_attempts=2)
+        job_id = job_queue.enqueue(make_job(ssh_key))
+
+        claimed = job_queue.claim("worker-a")
+        job_queue.record_phase(job_id, "worker-a", "plan", workspace=tmp_path)
+        assert job_queue.claim("worker-b") is None
+        time.sleep(0.3)
+
+        reclaimed = job_queue.claim("worker-b")
+        assert (claimed.attempts, reclaimed.attempts) == (1, 2)
+        assert reclaimed.phase == "plan" and reclaimed.workspace == str(tmp_path)
+        with pytest.raises(LeaseLostError):
+            job_queue.heartbeat(job_id, "worker-a")
+
+        time.sleep(0.3)
+        assert job_queue.claim("worker-c") is None
+        abandoned = job_queue.get(job_id)
+        assert abandoned.state == "failed" and "2 attempts" in abandoned.error
+
+    def test_worker_resumes_interrupted_apply(
+        self, tmp_path, ssh_key, fake_execute, monkeypatch
+    ):
+        monkeypatch.setattr("app.state_store.DEFAULT_STATE_DIR", tmp_path / "state")
+        monkeypatch.setattr(
+            "app.utils.provider_cache.DEFAULT_CACHE_DIR", tmp_path / "cache"
+        )
+        fake_execute(
+            lambda command, cwd: (
+                (PLAN_JSON if "show" in command else "{}") if "json" in command else "",
+                "",
+                0,
+            )
+        )
+        job_queue = JobQueue(tmp_path / "queue", lease_seconds=0.1)
+        job = make_job(ssh_key)
+        job_queue.enqueue(job)
+
+        # A worker that died half-way through apply
+        workspace = tmp_path / "workspace"
+        workspace.mkdir()
+        (workspace / "terraform.tfstate").write_text('{"serial": 7}')
+        job_queue.claim("dead-worker")
+        job_queue.record_phase(job.job_id, "dead-worker", "apply", workspace=workspace)
+        time.sleep(0.2)
+
+        assert QueueWorker(job_queue, "worker-b").run_once() is True
+        finished = job_queue.get(job.job_id)
+        assert finished.state == "succeeded" and finished.result["applied"] is True
+        assert not workspace.exists()
+        restored = tmp_path / "restored"
+        restored.mkdir()
+        LocalStateStore().restore(state_key(job.payload), restored)
+        assert (restored / "terraform.tfstate").read_text() == '{"serial": 7}'
+
+        phases = [phase for attempt, phase, _ in job_queue.phases(job.job_id)]
+        assert phases[:4] == ["queued", "claimed", "apply", "claimed"]
+        assert phases[-5:] == ["plan", "show", "apply", "output", "succeeded"]
+
+    def test_recovered_state_is_saved_under_the_state_lock(
+        self, tmp_path, ssh_key, fake_execute, monkeypatch
+    ):
+        monkeypatch.setattr("app.state_store.DEFAULT_STATE_DIR", tmp_path / "state")
+        monkeypatch.setattr(
+            "app.utils.provider_cache.DEFAULT_CACHE_DIR", tmp_path / "cache"
+        )
+        fake_execute(lambda command, cwd: ("{}" if "json" in command else "", "", 0))
+        job_queue = JobQueue(tmp_path / "queue", lease_seconds=0.1)
+        job = make_job(ssh_key)
+        job_queue.enqueue(job)
+        workspace = tmp_path / "workspace"
+        workspace.mkdir()
+        (workspace / "terraform.tfstate").write_text('{"serial": 7}')
+        job_queue.claim("dead-worker")
+        job_queue.record_phase(job.job_id, "dead-worker", "apply", workspace=workspace)
+        time.sleep(0.2)
+
+        store, key = LocalStateStore(), state_key(job.payload)
+        worker = threading.Thread(target=QueueWorker(job_queue, "worker-b").run_once)
+        with store.lock(key):
+            worker.start()
+            time.sleep(0.3)
+            # Another deployment holds the lock; the recovered state waits for it
+            assert not store.restore(key, tmp_path)
+        worker.join(10)
+
+        assert job_queue.get(job.job_id).state == "succeeded"
+        assert store.restore(key, tmp_path)
+
+    def test_stale_recovered_state_does_not_replace_newer_state(
+        self, tmp_path, ssh_key, fake_execute, monkeypatch
+    ):
+        monkeypatch.setattr("app.state_store.DEFAULT_STATE_DIR", tmp_path / "state")
+        monkeypatch.setattr(
+            "app.utils.provider_cache.DEFAULT_CACHE_DIR", tmp_path / "cache"
+        )
+        applied = []
+
+        def handler(command, cwd):
+            if "apply" in command:
+                applied.append((Path(cwd) / "terraform.tfstate").read_text())
+            if "json" in command:
+                return (PLAN_JSON if "show" in command else "{}", "", 0)
+            return ("", "", 0)
+
+        fake_execute(handler)
+        job_queue = JobQueue(tmp_path / "queue", lease_seconds=0.1)
+        job = make_job(ssh_key)
+        job_queue.enqueue(job)
+        workspace = tmp_path / "workspace"
+        workspace.mkdir()
+        (workspace / "terraform.tfstate").write_text('{"lineage": "a", "serial": 7}')
+        job_queue.claim("dead-worker")
+        job_queue.record_phase(job.job_id, "dead-worker", "apply", workspace=workspace)
+        time.sleep(0.2)
+
+        # Another deployment of the instance finished since the worker died
+        store, key = LocalStateStore(), state_key(job.payload)
+        newer = tmp_path / "newer"
+        newer.mkdir()
+        (newer / "terraform.tfstate").write_text('{"lineage": "a", "serial": 9}')
+        store.save(key, newer)
+
+        assert QueueWorker(job_queue, "worker-b").run_once() is True
+        assert applied == ['{"lineage": "a", "serial": 9}']
+        assert store.read(key) == b'{"lineage": "a", "serial": 9}'
+
+    def test_lost_lease_is_not_marked_failed(self, tmp_path, ssh_key):
+        job_queue = JobQueue(tmp_path / "queue")
+        job_id = job_queue.enqueue(make_job(ssh_key))
+
+        def runner(queue, claimed, owner, lease_lost):
+            with closing(queue._connect()) as connection:
+                connection.execute("UPDATE jobs SET lease_owner = 'worker-b'")
+            queue.record_phase(job_id, owner, "plan")
+
+        assert QueueWorker(job_queue, "worker-a", runner=runner).run_once()
+        taken_over = job_queue.get(job_id)
+        assert (taken_over.state, taken_over.lease_owner) == ("running", "worker-b")
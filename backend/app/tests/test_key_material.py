@@ -0,0 +1,153 @@
+import base64
+import subprocess
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from app.utils import key_material as km
+from app.utils.file_extraction import decode_file, read_file
+from app.utils.key_material import KeyMaterialService, derive_public_key
+
+
+def ssh_keygen(tmp_path, name, *args):
+    path = tmp_path / name
+    subprocess.run(
+        ["ssh-keygen", "-q", "-N", "", "-C", "me@host", "-f", str(path), *args],
+        check=True,
+    )
+    return path
+
+
+def ssh_keygen_public(path) -> str:
+    """The public key ssh-keygen derives, without the comment of OpenSSH keys."""
+    output = subprocess.run(
+        ["ssh-keygen", "-y", "-f", str(path)], capture_output=True, text=True
+    ).stdout
+    return " ".join(output.split()[:2])
+
+
+@pytest.fixture(autouse=True)
+def no_subprocess(monkeypatch):
+    """Supported formats must never fork ssh-keygen."""
+    real_run = subprocess.run
+
+    def guarded_run(args, *a, **kw):
+        if args[:2] == ["ssh-keygen", "-y"] and kw.get("check"):
+            raise AssertionError("ssh-keygen fallback used")
+        return real_run(args, *a, **kw)
+
+    monkeypatch.setattr(km.subprocess, "run", guarded_run)
+
+
+class TestDerivePublicKey:
+
+    @pytest.mark.parametrize(
+        "args",
+        [
+            ["-t", "rsa", "-b", "2048", "-m", "PEM"],
+            ["-t", "rsa", "-b", "2048", "-m", "PKCS8"],
+            ["-t", "rsa", "-b", "2048"],
+            ["-t", "ed25519"],
+        ],
+        ids=["rsa-pkcs1", "rsa-pkcs8", "rsa-openssh", "ed25519-openssh"],
+    )
+    def test_matches_ssh_keygen(self, tmp_path, args):
+        key = ssh_keygen(tmp_path, "key", *args)
+        assert derive_public_key(key.read_text()) == ssh_keygen_public(key)
+
+    def test_ed25519_rfc8032_vector(self):
+        seed = bytes.fromhex(
+            "9d61b19deffd5a60ba844af492ec2cc44449c5697b326919703bac031cae7f60"
+        )
+        pem = Ed25519PrivateKey.from_private_bytes(seed).private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        blob = base64.b64decode(derive_public_key(pem.decode()).split()[1])
+        assert blob[-32:].hex() == (
+            "d75a980182b10ab7d54bfed3c964073a0ee172f3daa62325af021a68f707511a"
+        )
+
+    def test_ed25519_pkcs8(self, tmp_path):
+        key = tmp_path / "ed.pem"
+        subprocess.run(
+            ["openssl", "genpkey", "-algorithm", "ed25519", "-out", str(key)],
+            check=True,
+        )
+        der = subprocess.run(
+            ["openssl", "pkey", "-in", str(key), "-pubout", "-outform", "DER"],
+            capture_output=True,
+            check=True,
+        ).stdout
+
+        key_type, blob = derive_public_key(key.read_text()).split()
+        assert key_type == "ssh-ed25519"
+        assert base64.b64decode(blob).endswith(der[-32:])
+
+    def test_encrypted_keys_are_left_to_ssh_keygen(self, tmp_path):
+        key = tmp_path / "key"
+        subprocess.run(
+            ["ssh-keygen", "-q", "-t", "ed25519", "-N", "secret", "-f", str(key)],
+            check=True,
+        )
+        with pytest.raises(km.UnsupportedKeyError, match="Encrypted"):
+            derive_public_key(key.read_text())
+
+    def test_oci_key_with_trailer(self, tmp_path):
+        """OCI console keys carry an OCI_API_KEY line after the PEM block."""
+        key = ssh_keygen(tmp_path, "key", "-t", "rsa", "-b", "2048", "-m", "PKCS8")
+        with_trailer = tmp_path / "oci.pem"
+        with_trailer.write_text(key.read_text() + "OCI_API_KEY\n")
+
+        assert decode_file(with_trailer) == ssh_keygen_public(key)
+        assert read_file(with_trailer).endswith("-----END PRIVATE KEY-----")
+
+
+class TestKeyMaterialService:
+
+    def test_loads_each_key_once(self, tmp_path, monkeypatch):
+        key = ssh_keygen(tmp_path, "key", "-t", "ed25519")
+        service = KeyMaterialService()
+        reads = []
+        real_read_text = km.Path.read_text
+        monkeypatch.setattr(
+            km.Path,
+            "read_text",
+            lambda self, *a: reads.append(self) or real_read_text(self, *a),
+        )
+
+        first = service.load(key)
+        assert service.load(key) is first
+        assert first.public_key is first.public_key
+        assert len(reads) == 1
+
+    def test_same_content_shares_material(self, tmp_path):
+        key = ssh_keygen(tmp_path, "key", "-t", "ed25519")
+        copy = tmp_path / "copy"
+        copy.write_text(key.read_text())
+        service = KeyMaterialService()
+
+        assert service.load(key) is service.load(copy)
+
+    def test_changed_file_is_reloaded(self, tmp_path):
+        key = ssh_keygen(tmp_path, "key", "-t", "ed25519")
+        service = KeyMaterialService()
+        before = service.load(key).public_key
+        key.unlink()
+        ssh_keygen(tmp_path, "key", "-t", "ed25519")
+
+        assert service.load(key).public_key != before
+
+    def test_lru_eviction(self, tmp_path):
+        service = KeyMaterialService(max_entries=2)
+        keys = [ssh_keygen(tmp_path, f"k{i}", "-t", "ed25519") for i in range(3)]
+        first = service.load(keys[0])
+        service.load(keys[1])
+        service.load(keys[2])
+
+        assert len(service._by_content) == 2
+        assert service.load(keys[0]) is not first
+
+    def test_missing_key_raises(self, tmp_path):
+        with pytest.raises(RuntimeError, match="Failed to read key content"):
+            decode_file(tmp_path / "missing")
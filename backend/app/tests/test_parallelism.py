@@ -0,0 +1,114 @@
+import json
+from app.models.payload import Payload
+from app.service import DeploymentService
+from app.state_store import LocalStateStore
+from app.utils.build_template import template_source
+from app.utils.parallelism import ParallelismController, declared_resources
+from app.utils.provider_cache import ProviderCache
+from app.tests.test_preflight import PAYLOAD
+
+
+def run(controller, resources, account="acct", throttled=False, override=None):
+    with controller.slot(resources, account, override) as slot:
+        slot.throttled = throttled
+    return slot.width
+
+
+class TestParallelismController:
+
+    def test_width_follows_resources_and_host_load(self):
+        controller = ParallelismController(budget=40, max_width=32)
+        assert run(controller, 3) == 3
+        assert run(controller, 100) == 32
+        assert run(controller, 0) == 1
+        with controller.slot(5, "a"), controller.slot(5, "b"), controller.slot(5, "c"):
+            # Four commands running share the budget of 40
+            assert run(controller, 100) == 10
+        assert run(controller, 100, override=4) == 4
+
+    def test_throttling_halves_the_account_limit_then_recovers(self):
+        controller = ParallelismController(budget=40, max_width=32, probe_after=3)
+        assert run(controller, 30, throttled=True) == 30
+        assert controller.limit("acct") == 15
+        assert run(controller, 30, account="other") == 30
+
+        assert run(controller, 30) == 15
+        assert controller.limit("acct") == 16
+        # Concurrent commands split the limit
+        with controller.slot(30, "acct") as first:
+            assert first.width == 16
+            assert run(controller, 30) == 8
+
+        for _ in range(30):
+            run(controller, 30)
+        assert controller.limit("acct") is None
+
+    def test_one_decrease_per_round_of_throttled_commands(self):
+        controller = ParallelismController(budget=40, max_width=10)
+        with controller.slot(10, "acct") as first, controller.slot(
+            10, "acct"
+        ) as second:
+            first.throttled = second.throttled = True
+        # Both saw the same limit, so only one of them halves it, from 20 walkers
+        assert controller.limit("acct") == 10
+        run(controller, 10, throttled=True)
+        assert controller.limit("acct") == 5
+
+    def test_limit_stays_below_the_throttled_level_until_probing(self):
+        controller = ParallelismController(budget=100, max_width=32, probe_after=50)
+        run(controller, 20, throttled=True)
+        for _ in range(30):
+            run(controller, 32)
+        assert controller.limit("acct") == 19
+
+
+def test_declared_resources_counts_resource_blocks():
+    assert declared_resources(template_source()) == template_source().count(
+        '\nresource "'
+    )
+    assert declared_resources('data "x" "y" {}\n  resource "a" "b" {}') == 1
+
+
+def test_deploy_widens_to_the_plan_and_backs_off_when_throttled(tmp_path, fake_execute):
+    commands = []
+
+    def fake_execute_command(command, cwd):
+        commands.append(command)
+        if command.startswith("terraform show"):
+            changes = [
+                {"address": f"r.r{i}", "change": {"actions": ["create"]}}
+                for i in range(12)
+            ]
+            return json.dumps({"resource_changes": changes}), "", 0
+        if command.startswith("terraform apply"):
+            return "", "Error: 429 Too Many Requests, retrying", 0
+        return "", "", 0
+
+    fake_execute(fake_execute_command)
+    controller = ParallelismController(budget=40, max_width=32)
+    payload = Payload(**PAYLOAD)
+
+    def deploy(job, **options):
+        service = DeploymentService(
+            tmp_path / job,
+            provider_cache=ProviderCache(tmp_path / "cache"),
+            state_store=LocalStateStore(tmp_path / "state"),
+            parallelism_controller=controller,
+            **options,
+        )
+        (tmp_path / job).mkdir()
+        (tmp_path / job / "main.tf").write_text('resource "a" "b" {}\n' * 3)
+        service.payload = payload
+        return service.deploy(force=True)
+
+    result = deploy("first")
+    assert result["parallelism"] == {"plan": 3, "apply": 12}
+    assert "terraform apply -parallelism=12 -json -input=false tfplan" in commands
+    assert controller.limit(PAYLOAD["oracle_cloud"]["tenancy_ocid"]) == 6
+
+    # The clean plan raised the limit by one
+    assert deploy("second")["parallelism"] == {"plan": 3, "apply": 7}
+    assert deploy("fixed", parallelism=20)["parallelism"] == {"plan": 20, "apply": 20}
+
+    payload.parallelism = 2
+    assert deploy("payload")["parallelism"] == {"plan": 2, "apply": 2}
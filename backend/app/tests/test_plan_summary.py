@@ -0,0 +1,88 @@
+import json
+from app.service import DeploymentService
+from app.utils.plan_summary import summarize_plan
+from app.utils.provider_cache import ProviderCache
+
+
+def plan_json(*actions, outputs=None) -> str:
+    return json.dumps(
+        {
+            "resource_changes": [
+                {"address": f"r.n{i}", "change": {"actions": list(a)}}
+                for i, a in enumerate(actions)
+            ],
+            "output_changes": outputs or {},
+        }
+    )
+
+
+class TestSummarizePlan:
+
+    def test_counts_actions(self):
+        summary = summarize_plan(
+            plan_json(
+                ["create"],
+                ["update"],
+                ["delete"],
+                ["delete", "create"],
+                ["no-op"],
+                ["read"],
+            )
+        )
+
+        assert (summary.add, summary.change, summary.destroy) == (2, 1, 2)
+        assert [c.address for c in summary.resource_changes] == [
+            "r.n0",
+            "r.n1",
+            "r.n2",
+            "r.n3",
+        ]
+        assert summary.has_changes
+
+    def test_empty_plan(self):
+        summary = summarize_plan(
+            plan_json(["no-op"], outputs={"public_ip": {"actions": ["no-op"]}})
+        )
+        assert not summary.has_changes
+
+    def test_output_only_change(self):
+        summary = summarize_plan(plan_json(outputs={"ip": {"actions": ["update"]}}))
+        assert summary.has_changes
+
+
+class TestSavedPlanDeploy:
+
+    def run_deploy(self, tmp_path, fake_execute, plan):
+        commands = []
+
+        def fake_execute_command(command, cwd):
+            commands.append(command)
+            if command.startswith("terraform show"):
+                return plan, "", 0
+            return "", "", 0
+
+        fake_execute(fake_execute_command)
+        svc = DeploymentService(tmp_path, provider_cache=ProviderCache(tmp_path / "c"))
+        return svc.deploy(), commands
+
+    def test_applies_saved_plan(self, tmp_path, fake_execute):
+        result, commands = self.run_deploy(
+            tmp_path, fake_execute, plan_json(["create"], ["update"])
+        )
+
+        # No resources declared to plan; two planned changes to apply
+        assert (
+            "terraform plan -parallelism=1 -json -input=false -out=tfplan" in commands
+        )
+        assert (
+            commands[-1] == "terraform apply -parallelism=2 -json -input=false tfplan"
+        )
+        assert result["applied"] is True
+        assert (result["plan"]["add"], result["plan"]["change"]) == (1, 1)
+
+    def test_empty_plan_skips_apply(self, tmp_path, fake_execute):
+        result, commands = self.run_deploy(tmp_path, fake_execute, plan_json())
+
+        assert not any(c.startswith("terraform apply") for c in commands)
+        assert result["applied"] is False
+        assert result["plan"]["resource_changes"] == []
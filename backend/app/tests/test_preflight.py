@@ -0,0 +1,133 @@
+import json
+import pytest
+from app.service import DeploymentService
+from app.utils.preflight import PreflightError, template_problems, validate_problems
+from app.utils.provider_cache import ProviderCache
+from app.models.command_result import CommandResult
+from app.models.payload import Payload
+
+PAYLOAD = {
+    "oracle_cloud": {
+        "tenancy_ocid": "ocid1.tenancy.oc1..aaaa",
+        "user_ocid": "ocid1.user.oc1..bbbb",
+        "fingerprint": "12:34:ab:cd",
+        "region": "us-phoenix-1",
+        "compartment_ocid": "ocid1.tenancy.oc1..aaaa",
+    },
+    "cloudflare": {"cf_api_token": "t", "cf_account_id": "acct"},
+    "github": {
+        "github_token": "t",
+        "github_owner": "octo-org",
+        "repo_name": "app.web",
+        "docker_image": "ghcr.io/octo-org/app",
+    },
+}
+
+
+def make_service(tmp_path) -> DeploymentService:
+    return DeploymentService(tmp_path, provider_cache=ProviderCache(tmp_path / "cache"))
+
+
+class TestPayloadPreflight:
+
+    def test_valid_payload_has_no_problems(self):
+        assert Payload(**PAYLOAD).preflight("oracle") == []
+
+    def test_every_problem_is_listed(self):
+        payload = Payload(
+            **{
+                **PAYLOAD,
+                "oracle_cloud": {
+                    **PAYLOAD["oracle_cloud"],
+                    "tenancy_ocid": "tenancy",
+                    "user_ocid": "ocid1.group.oc1..bbbb",
+                    "region": "Phoenix",
+                },
+                "cloudflare": {
+                    "cf_api_token": "t",
+                    "cf_account_id": "acct",
+                    "domain": "example.com",
+                },
+            }
+        )
+
+        assert payload.preflight() == [
+            "oracle_cloud.tenancy_ocid: 'tenancy' is not an OCID",
+            "oracle_cloud.user_ocid: expected a user OCID, got group",
+            "oracle_cloud.region: 'Phoenix' is not an OCI region",
+            "cloudflare.cf_zone_id: required when domain is set",
+        ]
+
+    def test_provider_needs_its_section(self):
+        payload = Payload(**{**PAYLOAD, "oracle_cloud": None})
+        assert payload.preflight("oracle") == [
+            "oracle_cloud: required by the oracle provider"
+        ]
+
+
+class TestServicePreflight:
+
+    def test_render_failure_lists_every_undefined_variable(self, tmp_path, ssh_key):
+        service = make_service(tmp_path)
+        with pytest.raises(PreflightError) as error:
+            service.set_payload(
+                Payload(**{**PAYLOAD, "oracle_cloud": None}), ssh_key, ssh_key, "oracle"
+            )
+
+        problems = error.value.problems
+        assert problems[0] == "oracle_cloud: required by the oracle provider"
+        assert "main.tf.j2: undefined variable 'tenancy_ocid'" in problems
+        assert "main.tf.j2: undefined variable 'region'" in problems
+
+    def test_strict_render_catches_missing_attributes(self, tmp_path, ssh_key):
+        service = make_service(tmp_path)
+        service.set_payload(Payload(**PAYLOAD), ssh_key, ssh_key, "oracle")
+        context = {**service.context, "flex": {}}
+
+        assert template_problems(context, "oracle") == [
+            "providers/oracle_template.tf.j2: 'dict object' has no attribute 'shape'"
+        ]
+        assert template_problems(context, "vultr")[-1] == (
+            "provider: no template for 'vultr'"
+        )
+
+    def test_validate_runs_terraform_validate(self, tmp_path, ssh_key, fake_execute):
+        commands = []
+        diagnostics = {
+            "valid": False,
+            "diagnostics": [
+                {
+                    "severity": "warning",
+                    "summary": "Deprecated attribute",
+                },
+                {
+                    "severity": "error",
+                    "summary": "Unsupported argument",
+                    "detail": 'An argument named "shap" is not expected here.',
+                    "range": {"filename": "main.tf", "start": {"line": 12}},
+                },
+            ],
+        }
+
+        def handler(command, cwd):
+            commands.append(command)
+            if "validate" in command:
+                return json.dumps(diagnostics), "", 1
+            return "", "", 0
+
+        fake_execute(handler)
+        service = make_service(tmp_path)
+        files = service.set_payload(Payload(**PAYLOAD), ssh_key, ssh_key, "oracle")
+        service.write_workspace(dict(zip(["main.tf", "provider.tf"], files)), ssh_key)
+
+        service.preflight()
+        assert commands == []
+        with pytest.raises(PreflightError, match=r"main.tf:12: Unsupported argument"):
+            service.preflight(validate=True)
+        assert commands[-1] == "terraform validate -json -no-color"
+
+    def test_validate_without_json_reports_stderr(self):
+        result = CommandResult(
+            argv=["terraform"], returncode=1, stdout="", stderr="boom\n"
+        )
+        assert validate_problems(result) == ["terraform validate failed: boom"]
@@ -0,0 +1,168 @@
+import threading
+import time
+import pytest
+from pathlib import Path
+from app.service import DeploymentService
+from app.utils.provider_cache import LOCK_FILE, ProviderCache, required_providers
+
+TEMPLATE_DIR = Path(__file__).parents[2] / "terraform_templates"
+PLAN_JSON = '{"resource_changes": [{"address": "random_id.a", "change": {"actions": ["create"]}}]}'
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ProviderCache(tmp_path / "cache")
+
+
+@pytest.fixture
+def initialized_workspace(tmp_path):
+    """A workspace that looks like terraform init already ran in it."""
+    workspace = tmp_path / "tfjob-a"
+    plugin = workspace / ".terraform" / "providers" / "registry.terraform.io"
+    plugin = plugin / "hashicorp" / "random" / "3.6.0" / "linux_amd64"
+    plugin.mkdir(parents=True)
+    (plugin / "terraform-provider-random").write_text("binary")
+    (workspace / LOCK_FILE).write_text(
+        'provider "registry.terraform.io/hashicorp/random" {}'
+    )
+    return workspace
+
+
+class TestProviderCache:
+
+    def test_required_providers_from_main_template(self):
+        """The provider set is read from the rendered required_providers block."""
+        providers = required_providers((TEMPLATE_DIR / "main.tf.j2").read_text())
+
+        assert providers == {
+            "registry.terraform.io/oracle/oci": "~> 5.0",
+            "registry.terraform.io/cloudflare/cloudflare": "~> 4.0",
+            "registry.terraform.io/integrations/github": "~> 6.0",
+            "registry.terraform.io/hashicorp/random": "~> 3.0",
+        }
+
+    def test_provider_key_ignores_order(self, cache):
+        a = cache.provider_key({"x/a": "1", "x/b": "2"})
+        b = cache.provider_key({"x/b": "2", "x/a": "1"})
+        assert a == b
+        assert a != cache.provider_key({"x/a": "1"})
+
+    def test_restore_cold_cache(self, cache, tmp_path):
+        """Nothing is restored before a provider set has been stored."""
+        workspace = tmp_path / "tfjob-b"
+        workspace.mkdir()
+        assert cache.restore(workspace, "key") is False
+        assert not (workspace / LOCK_FILE).exists()
+
+    def test_store_and_restore_hard_links(self, cache, initialized_workspace, tmp_path):
+        """A stored workspace is linked into new workspaces with the same providers."""
+        cache.store(initialized_workspace, "key")
+        workspace = tmp_path / "tfjob-b"
+        workspace.mkdir()
+
+        assert cache.restore(workspace, "key") is True
+        assert (workspace / LOCK_FILE).read_text().startswith("provider")
+        binary = next((workspace / ".terraform").rglob("terraform-provider-random"))
+        original = next(
+            (initialized_workspace / ".terraform").rglob("terraform-provider-random")
+        )
+        assert binary.stat().st_ino == original.stat().st_ino
+
+    def test_cli_config_uses_mirror(self, cache):
+        """Mirrored providers are installed from the filesystem mirror only."""
+        (cache.mirror_dir / "registry.terraform.io" / "hashicorp" / "random").mkdir(
+            parents=True
+        )
+        env = cache.env()
+        config = Path(env["TF_CLI_CONFIG_FILE"]).read_text()
+
+        assert env["TF_PLUGIN_CACHE_DIR"] == str(cache.plugin_dir)
+        assert "filesystem_mirror" in config
+        assert '"registry.terraform.io/hashicorp/random"' in config
+        assert cache.is_mirrored({"registry.terraform.io/hashicorp/random": "~> 3.0"})
+
+    def test_cli_config_is_replaced_only_when_it_changes(self, cache):
+        """Readers of the config never see it rewritten in place."""
+        config = Path(cache.env()["TF_CLI_CONFIG_FILE"])
+        before = config.stat()
+        cache.env()
+        assert config.stat().st_ino == before.st_ino
+        assert config.stat().st_mtime_ns == before.st_mtime_ns
+
+        (cache.mirror_dir / "registry.terraform.io" / "hashicorp" / "random").mkdir(
+            parents=True
+        )
+        cache.env()
+        assert config.stat().st_ino != before.st_ino
+        assert "filesystem_mirror" in config.read_text()
+        assert not list(cache.root.glob(".terraformrc.*"))
+
+
+class TestDeployProviderCache:
+
+    def test_second_deploy_skips_init(self, tmp_path, cache, fake_execute):
+        """A warm provider set skips terraform init entirely."""
+        commands = []
+
+        def fake_execute_command(command, cwd):
+            commands.append(command.split()[1])
+            if command.startswith("terraform init"):
+                (cwd / ".terraform" / "providers").mkdir(parents=True)
+                (cwd / LOCK_FILE).write_text("lock")
+            if command.startswith("terraform show"):
+                return PLAN_JSON, "", 0
+            return "", "", 0
+
+        fake_execute(fake_execute_command)
+        main_tf = (TEMPLATE_DIR / "main.tf.j2").read_text()
+        for name in ("first", "second"):
+            workspace = tmp_path / name
+            workspace.mkdir()
+            (workspace / "main.tf").write_text(main_tf)
+            DeploymentService(directory=workspace, provider_cache=cache).deploy()
+
+        assert commands.count("init") == 1
+        assert commands.count("providers") == 1
+        assert commands.count("apply") == 2
+
+    def test_concurrent_cold_inits_run_one_at_a_time(
+        self, tmp_path, cache, fake_execute
+    ):
+        """Jobs missing the same provider set wait for one init, then link it."""
+        inits = []
+        running = threading.Semaphore(1)
+
+        def fake_execute_command(command, cwd):
+            if command.startswith("terraform init"):
+                assert running.acquire(blocking=False), "inits overlapped"
+                time.sleep(0.2)
+                (cwd / ".terraform" / "providers").mkdir(parents=True)
+                (cwd / LOCK_FILE).write_text("lock")
+                inits.append(cwd.name)
+                running.release()
+            return "", "", 0
+
+        fake_execute(fake_execute_command)
+        main_tf = (TEMPLATE_DIR / "main.tf.j2").read_text()
+        services = []
+        for name in "abcd":
+            (tmp_path / name).mkdir()
+            (tmp_path / name / "main.tf").write_text(main_tf)
+            services.append(DeploymentService(tmp_path / name, provider_cache=cache))
+        errors = []
+
+        def prepare(service):
+            try:
+                service.prepare_providers()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=prepare, args=(s,)) for s in services]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert len(inits) == 1
+        assert all((tmp_path / name / ".terraform").is_dir() for name in "abcd")
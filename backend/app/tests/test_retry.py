@@ -0,0 +1,134 @@
+import json
+import pytest
+from app.service import DeploymentService
+from app.state_store import LocalStateStore
+from app.utils.provider_cache import ProviderCache
+from app.utils.retry import RetryPolicy, TerraformError, classify_failure
+from app.models.payload import Payload
+from app.models.cloudflare_vars import CloudflareVars
+from app.models.github_vars import GithubVars
+
+PLAN_JSON = json.dumps(
+    {"resource_changes": [{"address": "r.a", "change": {"actions": ["create"]}}]}
+)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalStateStore(tmp_path / "state")
+
+
+def make_service(tmp_path, store, name="job", **kwargs):
+    directory = tmp_path / name
+    directory.mkdir()
+    (directory / "main.tf").write_text("")
+    service = DeploymentService(
+        directory,
+        provider_cache=ProviderCache(tmp_path / "cache"),
+        state_store=store,
+        **kwargs,
+    )
+    service.payload = Payload(
+        cloudflare=CloudflareVars(cf_api_token="t", cf_account_id="acct"),
+        github=GithubVars(
+            github_token="t", github_owner="o", repo_name="r", docker_image="i"
+        ),
+        instance_name="web",
+    )
+    return service
+
+
+def flaky(commands, failures):
+    """A terraform handler whose commands fail once per entry in failures."""
+    failures = dict(failures)
+
+    def handler(command, cwd):
+        commands.append(command)
+        for prefix, stderr in list(failures.items()):
+            if command.startswith(prefix):
+                del failures[prefix]
+                return "", stderr, 1
+        if command.startswith("terraform show"):
+            return PLAN_JSON, "", 0
+        if command.startswith("terraform output"):
+            return "{}", "", 0
+        return "", "", 0
+
+    return handler
+
+
+class TestClassifyFailure:
+
+    @pytest.mark.parametrize(
+        "output, category",
+        [
+            ("Error: 429 Too Many Requests", "rate_limit"),
+            ("Error: 503 Service Unavailable", "server_error"),
+            ("Error acquiring the state lock", "lock"),
+            ("read tcp: connection reset by peer", "network"),
+            ("Error: 401 Unauthorized (also saw a 502)", None),
+            ('Error: Reference to undeclared resource "x"', None),
+        ],
+    )
+    def test_categories(self, output, category):
+        assert classify_failure(output) == category
+
+    def test_delay_is_capped_full_jitter(self):
+        policy = RetryPolicy(base_delay=1, max_delay=4)
+        assert all(0 <= policy.delay(10) <= 4 for _ in range(100))
+
+
+class TestRetries:
+
+    def test_transient_apply_failure_is_retried_from_plan(
+        self, tmp_path, store, fake_execute
+    ):
+        commands = []
+        fake_execute(
+            flaky(commands, {"terraform apply": "Error: 429 Too Many Requests"})
+        )
+        result = make_service(tmp_path, store).deploy()
+
+        assert result["applied"] is True and result["retries"] == 1
+        assert [c.split()[1] for c in commands].count("plan") == 2
+        assert [c.split()[1] for c in commands].count("init") == 1
+
+    def test_permanent_failure_is_not_retried(self, tmp_path, store, fake_execute):
+        commands = []
+        fake_execute(flaky(commands, {"terraform plan": "Error: 403 Forbidden"}))
+
+        with pytest.raises(TerraformError) as error:
+            make_service(tmp_path, store).deploy()
+        assert error.value.phase == "plan" and error.value.category is None
+        assert [c.split()[1] for c in commands].count("plan") == 1
+
+    def test_retry_budget_is_shared_by_phases(self, tmp_path, store, fake_execute):
+        commands = []
+        fake_execute(
+            flaky(
+                commands,
+                {
+                    "terraform init": "Error: 502 Bad Gateway",
+                    "terraform plan": "Error: 502 Bad Gateway",
+                },
+            )
+        )
+        service = make_service(tmp_path, store, retry_policy=RetryPolicy(budget=1))
+
+        with pytest.raises(TerraformError, match="plan failed"):
+            service.deploy()
+        assert [retry["phase"] for retry in service.retries] == ["init"]
+
+    def test_resume_skips_applied_phases(self, tmp_path, store, fake_execute):
+        commands = []
+        fake_execute(flaky(commands, {"terraform output": "Error: 403 Forbidden"}))
+        with pytest.raises(TerraformError):
+            make_service(tmp_path, store, "job1").deploy()
+        assert store.last_checkpoint("acct/web")[0] == "apply"
+
+        commands.clear()
+        result = make_service(tmp_path, store, "job2").deploy(resume=True)
+
+        assert result["applied"] is True
+        assert [c.split()[1] for c in commands] == ["init", "output"]
+        assert store.last_checkpoint("acct/web") == (None, None)
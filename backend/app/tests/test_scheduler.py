@@ -0,0 +1,156 @@
+import asyncio
+import threading
+import time
+from app.scheduler import JobScheduler
+from app.models.deployment_job import DeploymentJob
+from app.models.payload import Payload
+from app.models.oracle_cloud_config import OCIVars
+from app.models.cloudflare_vars import CloudflareVars
+from app.models.github_vars import GithubVars
+
+
+def make_job(tenancy="ocid1.tenancy.oc1..a", **kwargs) -> DeploymentJob:
+    payload = Payload(
+        oracle_cloud=OCIVars(
+            tenancy_ocid=tenancy,
+            user_ocid="ocid1.user.oc1..user",
+            fingerprint="aa:bb",
+            region="us-phoenix-1",
+            compartment_ocid="ocid1.compartment.oc1..c",
+        ),
+        cloudflare=CloudflareVars(cf_api_token="t", cf_account_id="a"),
+        github=GithubVars(
+            github_token="t", github_owner="o", repo_name="r", docker_image="i"
+        ),
+    )
+    return DeploymentJob(
+        payload=payload,
+        private_key_path=kwargs.pop("private_key_path", "id_rsa"),
+        public_key_path=kwargs.pop("public_key_path", "id_rsa.pub"),
+        **kwargs,
+    )
+
+
+class Recorder:
+    """Runner that sleeps briefly and records start order and peak concurrency."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.started = []
+        self.active = {}
+        self.peak = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, job):
+        keys = ["total", job.account]
+        with self.lock:
+            self.started.append(job.job_id)
+            for key in keys:
+                self.active[key] = self.active.get(key, 0) + 1
+                self.peak[key] = max(self.peak.get(key, 0), self.active[key])
+        time.sleep(self.delay)
+        with self.lock:
+            for key in keys:
+                self.active[key] -= 1
+        return {"job_id": job.job_id}
+
+
+class TestJobScheduler:
+
+    def test_respects_global_and_account_caps(self):
+        recorder = Recorder()
+        scheduler = JobScheduler(max_concurrency=3, account_limit=1, runner=recorder)
+        jobs = [make_job(tenancy=f"t{i % 2}") for i in range(6)] + [
+            make_job(tenancy=f"t{i}") for i in range(2, 6)
+        ]
+
+        results = asyncio.run(scheduler.run_all(jobs))
+
+        assert [r["job_id"] for r in results] == [job.job_id for job in jobs]
+        assert recorder.peak["total"] == 3
+        assert recorder.peak["oracle:t0"] == 1
+        assert scheduler.stats().completed == len(jobs)
+
+    def test_priority_order(self):
+        recorder = Recorder(delay=0)
+        scheduler = JobScheduler(max_concurrency=1, runner=recorder)
+        jobs = [make_job(priority=p, job_id=f"p{p}") for p in (5, 1, 3)]
+
+        async def run():
+            blocker = scheduler.submit(make_job(job_id="blocker"))
+            await asyncio.gather(blocker, scheduler.run_all(jobs))
+
+        asyncio.run(run())
+        assert recorder.started == ["blocker", "p1", "p3", "p5"]
+
+    def test_job_at_its_account_limit_does_not_block_the_tenant(self):
+        recorder = Recorder()
+        scheduler = JobScheduler(max_concurrency=2, account_limit=1, runner=recorder)
+        jobs = [
+            make_job(tenancy="t0", job_id="first"),
+            make_job(tenancy="t0", job_id="second"),
+            make_job(tenancy="t1", job_id="other"),
+        ]
+
+        asyncio.run(scheduler.run_all(jobs))
+        assert recorder.started == ["first", "other", "second"]
+        stats = scheduler.stats()
+        assert stats.max_wait_seconds >= recorder.delay
+        assert 0 < stats.average_wait_seconds < stats.max_wait_seconds
+
+    def test_fair_share_between_tenants(self):
+        """A tenant that queued later is not stuck behind another tenant's backlog."""
+        recorder = Recorder(delay=0)
+        scheduler = JobScheduler(max_concurrency=1, runner=recorder)
+        jobs = [make_job(tenant="a", job_id=f"a{i}") for i in range(3)]
+        jobs += [make_job(tenant="b", job_id="b0")]
+
+        asyncio.run(scheduler.run_all(jobs))
+        assert recorder.started.index("b0") <= 1
+
+    def test_failures_are_isolated_and_counted(self):
+        def runner(job):
+            if job.job_id == "bad":
+                raise RuntimeError("Terraform apply failed")
+            return {}
+
+        scheduler = JobScheduler(max_concurrency=2, runner=runner)
+        results = asyncio.run(
+            scheduler.run_all([make_job(job_id="bad"), make_job(job_id="good")])
+        )
+
+        assert isinstance(results[0], RuntimeError)
+        assert results[1] == {}
+        stats = scheduler.stats()
+        assert (stats.completed, stats.failed, stats.running, stats.queued) == (
+            1,
+            1,
+            0,
+            0,
+        )
+
+
+def test_throughput_against_fake_terraform(fake_terraform, ssh_key):
+    """Concurrent jobs overlap: eight jobs on four workers take about two job-times."""
+    scheduler = JobScheduler(max_concurrency=4)
+    jobs = [
+        make_job(
+            tenancy=f"ocid1.tenancy.oc1..t{i}",
+            tenant=f"tenant{i % 3}",
+            private_key_path=ssh_key,
+            public_key_path=ssh_key.with_suffix(".pub"),
+        )
+        for i in range(8)
+    ]
+
+    started = time.monotonic()
+    results = asyncio.run(scheduler.run_all(jobs))
+    elapsed = time.monotonic() - started
+    scheduler.shutdown()
+
+    assert all(result["init_success"] for result in results)
+    stats = scheduler.stats()
+    assert stats.completed == 8
+    assert stats.jobs_per_hour > 0
+    # Each job runs init, mirror, plan and show at 0.1s; serially this would take 3.2s
+    assert elapsed < 2.5
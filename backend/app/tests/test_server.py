@@ -0,0 +1,220 @@
+import asyncio
+import json
+import threading
+import pytest
+from server.jobs import JobManager
+from server.main import APIServer, is_loopback
+
+PAYLOAD = {
+    "cloudflare": {"cf_api_token": "t", "cf_account_id": "acct"},
+    "github": {
+        "github_token": "t",
+        "github_owner": "o",
+        "repo_name": "r",
+        "docker_image": "i",
+    },
+}
+
+
+async def http(port, method, path, body=None, headers=""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    data = json.dumps(body).encode() if body is not None else b""
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: test\r\nConnection: close\r\n{headers}"
+        f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+    )
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b"\r\n\r\n")
+    status = int(head.split()[1])
+    if b"text/event-stream" in head or b"text/plain" in head:
+        return status, body.decode()
+    return status, json.loads(body)
+
+
+def parse_events(stream: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in stream.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def runner(monkeypatch):
+    """Replace run_deployment; the job blocks until release is set."""
+    control = {"release": threading.Event(), "jobs": []}
+
+    def fake_run_deployment(
+        job, sinks, instrumentation, cancel_event, job_log, pool, on_target
+    ):
+        control["jobs"].append(job)
+        with instrumentation.phase("render"):
+            pass
+        for sink in [*sinks, job_log.sink("apply")]:
+            asyncio.run(sink.write("stdout", f"Applying {job.payload.instance_name}"))
+        control["release"].wait(5)
+        if cancel_event.is_set():
+            from app.service import DeploymentCancelled
+
+            raise DeploymentCancelled("Deployment cancelled before terraform apply")
+        return {"applied": True, "outputs": {"public_ip": "203.0.113.7"}}
+
+    monkeypatch.setattr("server.jobs.run_deployment", fake_run_deployment)
+    return control
+
+
+def serve(tmp_path, scenario, max_concurrency=1, token=None, retention=1000):
+    async def main():
+        manager = JobManager(
+            max_concurrency, key_dir=tmp_path / "keys", retention=retention
+        )
+        server = APIServer(manager, token=token)
+        _, port = await server.start("127.0.0.1", 0)
+        try:
+            return await scenario(port, server)
+        finally:
+            await server.close()
+
+    return asyncio.run(main())
+
+
+class TestServer:
+
+    def test_submit_stream_and_result(self, tmp_path, runner, ssh_key):
+        async def scenario(port, server):
+            body = {"payload": PAYLOAD, "private_key": ssh_key.read_text()}
+            status, submitted = await http(port, "POST", "/jobs", body)
+            assert status == 202
+            job_id = submitted["job_id"]
+
+            streams = [
+                asyncio.ensure_future(http(port, "GET", f"/jobs/{job_id}/events"))
+                for _ in range(50)
+            ]
+            await asyncio.sleep(0.2)
+            assert (await http(port, "GET", f"/jobs/{job_id}/result"))[0] == 409
+            runner["release"].set()
+            results = await asyncio.gather(*streams)
+
+            events = parse_events(results[0][1])
+            assert [e for e in events if e[0] == "log"] == [
+                ("log", {"stream": "stdout", "line": "Applying backend-vm"})
+            ]
+            assert events[-1] == ("state", {"state": "succeeded", "error": None})
+            assert all(result == results[0] for result in results)
+
+            status, job = await http(port, "GET", f"/jobs/{job_id}")
+            assert job["state"] == "succeeded" and job["phases"] == ["render"]
+            status, result = await http(port, "GET", f"/jobs/{job_id}/result")
+            assert result["outputs"] == {"public_ip": "203.0.113.7"}
+            assert not list((tmp_path / "keys").iterdir())
+
+            log_url = f"/jobs/{job_id}/log"
+            assert await http(port, "GET", log_url) == (200, "Applying backend-vm\n")
+            assert await http(port, "GET", log_url, headers="Range: bytes=9-\r\n") == (
+                206,
+                "backend-vm\n",
+            )
+            assert (await http(port, "GET", f"{log_url}?phase=plan"))[0] == 404
+
+        serve(tmp_path, scenario)
+
+    def test_cancel_queued_and_running_jobs(self, tmp_path, runner, ssh_key):
+        async def scenario(port, server):
+            body = {"payload": PAYLOAD, "private_key": ssh_key.read_text()}
+            running = (await http(port, "POST", "/jobs", body))[1]["job_id"]
+            queued = (await http(port, "POST", "/jobs", body))[1]["job_id"]
+            await asyncio.sleep(0.2)
+
+            status, job = await http(port, "POST", f"/jobs/{queued}/cancel")
+            assert status == 202 and job["state"] == "cancelled"
+            await http(port, "POST", f"/jobs/{running}/cancel")
+            runner["release"].set()
+            await http(port, "GET", f"/jobs/{running}/events")
+
+            job = (await http(port, "GET", f"/jobs/{running}"))[1]
+            assert job["state"] == "cancelled"
+            assert "before terraform apply" in job["error"]
+            assert len(runner["jobs"]) == 1
+
+        serve(tmp_path, scenario)
+
+    def test_resume_after_last_event_id(self, tmp_path, runner, ssh_key):
+        async def scenario(port, server):
+            runner["release"].set()
+            body = {"payload": PAYLOAD, "private_key": ssh_key.read_text()}
+            job_id = (await http(port, "POST", "/jobs", body))[1]["job_id"]
+            full = parse_events((await http(port, "GET", f"/jobs/{job_id}/events"))[1])
+            resumed = parse_events(
+                (
+                    await http(
+                        port,
+                        "GET",
+                        f"/jobs/{job_id}/events",
+                        headers="Last-Event-ID: 1\r\n",
+                    )
+                )[1]
+            )
+            assert resumed == full[2:]
+
+        serve(tmp_path, scenario)
+
+    def test_errors(self, tmp_path, runner, ssh_key):
+        async def scenario(port, server):
+            status, error = await http(port, "POST", "/jobs", {"payload": {}})
+            assert status == 422
+            assert {tuple(e["loc"]) for e in error["detail"]} >= {("private_key",)}
+            body = {"payload": PAYLOAD, "private_key": "not a key"}
+            assert (await http(port, "POST", "/jobs", body))[0] == 422
+            body = {
+                "payload": PAYLOAD,
+                "private_key": ssh_key.read_text(),
+                "provider": "vultr",
+                "components": True,
+            }
+            assert (await http(port, "POST", "/jobs", body))[0] == 422
+            assert (await http(port, "GET", "/jobs/missing"))[0] == 404
+            assert (await http(port, "DELETE", "/jobs"))[0] == 405
+            assert (await http(port, "GET", "/health"))[1] == {"status": "ok"}
+
+        serve(tmp_path, scenario)
+
+    def test_pruned_jobs_lose_their_logs(self, tmp_path, runner, ssh_key):
+        async def scenario(port, server):
+            runner["release"].set()
+            body = {"payload": PAYLOAD, "private_key": ssh_key.read_text()}
+            first = (await http(port, "POST", "/jobs", body))[1]["job_id"]
+            log = server.manager.jobs[first].log
+            await http(port, "GET", f"/jobs/{first}/events")
+            log.flush()
+            assert log.path.exists()
+
+            second = (await http(port, "POST", "/jobs", body))[1]["job_id"]
+            await http(port, "GET", f"/jobs/{second}/events")
+            assert first not in server.manager.jobs
+            assert not log.path.exists() and not log.index_path.exists()
+            assert server.manager.jobs[second].log.size
+
+        serve(tmp_path, scenario, retention=1)
+
+    def test_token_guards_every_route_but_health(self, tmp_path, runner, ssh_key):
+        async def scenario(port, server):
+            body = {"payload": PAYLOAD, "private_key": ssh_key.read_text()}
+            assert (await http(port, "POST", "/jobs", body))[0] == 401
+            wrong = "Authorization: Bearer other\r\n"
+            assert (await http(port, "GET", "/jobs", headers=wrong))[0] == 401
+            right = "Authorization: Bearer s3cret\r\n"
+            assert (await http(port, "GET", "/jobs", headers=right)) == (200, [])
+            assert (await http(port, "GET", "/health"))[0] == 200
+            assert not runner["jobs"]
+
+        serve(tmp_path, scenario, token="s3cret")
+
+    def test_only_loopback_without_a_token(self, tmp_path):
+        server = APIServer(JobManager(1, key_dir=tmp_path / "keys"))
+        with pytest.raises(ValueError, match="STACKABLE_API_TOKEN"):
+            asyncio.run(server.start("0.0.0.0", 0))
+        server.manager.shutdown()
+        assert is_loopback("localhost") and is_loopback("::1")
+        assert not is_loopback("10.0.0.5")
@@ -0,0 +1,261 @@
+import json
+import re
+import socket
+import subprocess
+import threading
+import time
+from contextlib import closing
+import pytest
+from pathlib import Path
+from app.service import DeploymentService
+from app.state_store import LocalStateStore, StateLockError, is_newer_state, state_key
+from app.utils.provider_cache import ProviderCache
+from app.models.payload import Payload
+from app.models.cloudflare_vars import CloudflareVars
+from app.models.github_vars import GithubVars
+from app.tests.test_preflight import PAYLOAD
+
+RESOURCE_BLOCK = re.compile(r'^resource "(\w+)" "([\w-]+)" \{(.*?)^\}', re.M | re.S)
+PLAN_JSON = '{"resource_changes": [{"address": "random_id.a", "change": {"actions": ["create"]}}]}'
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalStateStore(tmp_path / "state")
+
+
+@pytest.fixture
+def payload():
+    return Payload(
+        cloudflare=CloudflareVars(cf_api_token="t", cf_account_id="acct"),
+        github=GithubVars(
+            github_token="t", github_owner="o", repo_name="r", docker_image="i"
+        ),
+        instance_name="web",
+    )
+
+
+class TestLocalStateStore:
+
+    def test_state_key(self, payload):
+        assert state_key(payload) == "acct/web"
+
+    def test_save_and_restore(self, store, tmp_path):
+        source, target = tmp_path / "a", tmp_path / "b"
+        source.mkdir()
+        target.mkdir()
+
+        assert store.restore("k", target) is False
+        (source / "terraform.tfstate").write_text('{"serial": 1}')
+        store.save("k", source)
+
+        assert store.restore("k", target) is True
+        assert (target / "terraform.tfstate").read_text() == '{"serial": 1}'
+
+    def test_is_newer_state(self):
+        stored = b'{"lineage": "a", "serial": 3}'
+        assert is_newer_state(b'{"lineage": "a", "serial": 4}', stored)
+        assert not is_newer_state(b'{"lineage": "a", "serial": 3}', stored)
+        assert not is_newer_state(b'{"lineage": "b", "serial": 9}', stored)
+        assert not is_newer_state(b"not json", stored)
+        assert is_newer_state(b'{"serial": 1}', None)
+
+    def test_lock_is_exclusive(self, store):
+        with store.lock("k"):
+            with pytest.raises(StateLockError):
+                with store.lock("k", timeout=0):
+                    pass
+            with store.lock("other", timeout=0):
+                pass
+        with store.lock("k", timeout=0):
+            pass
+
+    def test_lock_of_exited_process_is_broken(self, store):
+        process = subprocess.Popen(["true"])
+        process.wait()
+        with closing(store._connect()) as connection:
+            connection.execute(
+                "INSERT INTO locks VALUES ('k', ?, ?)",
+                (f"{socket.gethostname()}:{process.pid}:abc", time.time()),
+            )
+
+        with store.lock("k", timeout=0):
+            pass
+
+    def test_waiter_gets_lock_after_release(self, store):
+        order = []
+
+        def wait_for_lock():
+            with store.lock("k", timeout=5):
+                order.append("waiter")
+
+        with store.lock("k"):
+            waiter = threading.Thread(target=wait_for_lock)
+            waiter.start()
+            order.append("holder")
+        waiter.join()
+        assert order == ["holder", "waiter"]
+
+    def test_held_lock_is_renewed_past_its_ttl(self, tmp_path):
+        holder = LocalStateStore(tmp_path / "state", lock_ttl=0.3)
+        other = LocalStateStore(tmp_path / "state", lock_ttl=0.3)
+        with holder.lock("k"):
+            time.sleep(0.8)
+            with pytest.raises(StateLockError):
+                with other.lock("k", timeout=0):
+                    pass
+        with other.lock("k", timeout=0):
+            pass
+
+    def test_lost_lock_is_signalled(self, tmp_path):
+        store = LocalStateStore(tmp_path / "state", lock_ttl=0.3)
+        with store.lock("k") as lost:
+            assert not lost.is_set()
+            with closing(store._connect()) as connection:
+                connection.execute("DELETE FROM locks")
+            assert lost.wait(5)
+
+    def test_stale_lock_expires(self, tmp_path):
+        crashed = LocalStateStore(tmp_path / "state", lock_ttl=0)
+        crashed.lock("k").__enter__()
+        with crashed.lock("k", timeout=0):
+            pass
+
+
+class TestDeployWithState:
+
+    @pytest.fixture
+    def commands(self, fake_execute):
+        commands = []
+
+        def fake_execute_command(command, cwd):
+            commands.append(command)
+            if command.startswith("terraform apply"):
+                state = cwd / "terraform.tfstate"
+                serial = int(state.read_text()) if state.exists() else 0
+                state.write_text(str(serial + 1))
+            if command.startswith("terraform show"):
+                return PLAN_JSON, "", 0
+            return "", "", 0
+
+        fake_execute(fake_execute_command)
+        return commands
+
+    def make_service(self, tmp_path, store, payload, name):
+        directory = tmp_path / name
+        directory.mkdir()
+        (directory / "main.tf").write_text("")
+        svc = DeploymentService(
+            directory,
+            provider_cache=ProviderCache(tmp_path / "cache"),
+            state_store=store,
+        )
+        svc.payload = payload
+        return svc
+
+    def test_redeploy_reuses_state_without_destroy(
+        self, tmp_path, store, payload, commands
+    ):
+        self.make_service(tmp_path, store, payload, "job1").deploy()
+        second = self.make_service(tmp_path, store, payload, "job2")
+        second.deploy(force=True)
+
+        assert not any("destroy" in command for command in commands)
+        assert (second.directory / "terraform.tfstate").read_text() == "2"
+
+    def test_deploy_keeps_the_state_before_it(self, tmp_path, store, payload, commands):
+        self.make_service(tmp_path, store, payload, "job1").deploy()
+        self.make_service(tmp_path, store, payload, "job2").deploy(force=True)
+
+        with closing(store._connect()) as connection:
+            state, previous = connection.execute(
+                "SELECT state, previous FROM states WHERE key = 'acct/web'"
+            ).fetchone()
+        assert (state, previous) == (b"2", b"1")
+
+    def test_deploy_that_lost_its_lock_does_not_save_state(
+        self, tmp_path, payload, commands, monkeypatch
+    ):
+        store = LocalStateStore(tmp_path / "state", lock_ttl=0.3)
+        svc = self.make_service(tmp_path, store, payload, "job1")
+        apply = svc.apply
+
+        def slow_apply(env=None):
+            # The lock expires and another deployment takes it over
+            with closing(store._connect()) as connection:
+                connection.execute("DELETE FROM locks")
+            time.sleep(0.5)
+            return apply(env)
+
+        monkeypatch.setattr(svc, "apply", slow_apply)
+        with pytest.raises(StateLockError):
+            svc.deploy()
+        assert store.read("acct/web") is None
+        assert store.last_deployment("acct/web") == (None, None)
+
+    def test_destroy_is_explicit(self, tmp_path, store, payload, commands):
+        self.make_service(tmp_path, store, payload, "job1").deploy()
+        result = self.make_service(tmp_path, store, payload, "job2").destroy()
+
+        assert result == {"destroy_success": True, "destroyed": True}
+        assert "terraform destroy -parallelism=1 -auto-approve -input=false" in commands
+        assert store.restore("acct/web", Path(tmp_path / "job1")) is False
+
+
+def test_second_deploy_of_the_stack_destroys_nothing(
+    tmp_path, store, ssh_key, fake_execute
+):
+    """
+    Plan like terraform would against the stored state, counting out
+    find-or-create resources once their lookup finds what the first
+    apply created.
+    """
+    plans = []
+
+    def fake_execute_command(command, cwd):
+        state = cwd / "terraform.tfstate"
+        applied = set(json.loads(state.read_text())) if state.exists() else set()
+        declared = set()
+        for kind, name, body in RESOURCE_BLOCK.findall(
+            "\n".join(path.read_text() for path in cwd.glob("*.tf"))
+        ):
+            if applied and re.search(r"count\s*=\s*length\(data\.", body):
+                continue
+            declared.add(f"{kind}.{name}")
+        if command.startswith("terraform plan"):
+            plans.append(
+                [
+                    {"address": a, "change": {"actions": ["create"]}}
+                    for a in declared - applied
+                ]
+                + [
+                    {"address": a, "change": {"actions": ["delete"]}}
+                    for a in applied - declared
+                ]
+            )
+        if command.startswith("terraform show"):
+            return json.dumps({"resource_changes": plans[-1]}), "", 0
+        if command.startswith("terraform apply"):
+            state.write_text(json.dumps(sorted(declared)))
+        return "", "", 0
+
+    fake_execute(fake_execute_command)
+    payload = Payload(**PAYLOAD)
+    results = []
+    for job in ("first", "second"):
+        service = DeploymentService(
+            tmp_path / job,
+            provider_cache=ProviderCache(tmp_path / "cache"),
+            state_store=store,
+        )
+        main_tf, provider_tf = service.set_payload(
+            payload, ssh_key, ssh_key.with_suffix(".pub"), "oracle"
+        )
+        service.write_workspace(
+            {"main.tf": main_tf, "provider.tf": provider_tf}, ssh_key
+        )
+        results.append(service.deploy(force=True))
+
+    assert "oci_core_vcn.vcn" in {change["address"] for change in plans[0]}
+    assert results[1]["plan"]["destroy"] == 0
+    assert plans[1] == []
@@ -0,0 +1,167 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+from app.models.command_result import CommandResult
+from app.models.resource_timing import ResourceTiming
+from app.service import DeploymentService
+from app.utils.instrumentation import CriticalPathSink, Instrumentation, PrometheusSink
+from app.utils.provider_cache import ProviderCache
+from app.utils.terraform_events import ResourceTimeline, critical_path, resource_name
+
+PLAN_JSON = json.dumps(
+    {
+        "resource_changes": [
+            {"address": address, "change": {"actions": ["create"]}}
+            for address in ("oci_core_instance.vm", "github_actions_secret.a[0]")
+        ]
+    }
+)
+
+
+def event(kind: str, address: str, at: float, **hook) -> str:
+    return json.dumps(
+        {
+            "@timestamp": datetime.fromtimestamp(at, timezone.utc).isoformat(),
+            "type": kind,
+            "hook": {
+                "resource": {"addr": address, "resource_type": address.split(".")[0]},
+                **hook,
+            },
+        }
+    )
+
+
+def timing(address: str, started: float, duration: float, job="job") -> ResourceTiming:
+    return ResourceTiming(
+        job_id=job,
+        phase="apply",
+        address=address,
+        resource_type=address.split(".")[0],
+        action="create",
+        started_at=started,
+        duration_seconds=duration,
+    )
+
+
+class TestResourceTimeline:
+
+    def test_parses_resources_progress_and_errors(self):
+        instrumentation = Instrumentation("job", sinks=[])
+        timeline = ResourceTimeline("apply", instrumentation, total=2)
+        lines = [
+            ("stdout", '{"type": "version", "terraform": "1.9.0"}'),
+            ("stdout", event("apply_start", "r.a", 100.0, action="create")),
+            ("stdout", "not json"),
+            ("stdout", event("apply_start", "r.b", 100.5, action="update")),
+            ("stdout", event("apply_complete", "r.a", 102.25, action="create")),
+            ("stdout", event("apply_errored", "r.b", 103.0, action="update")),
+            (
+                "stdout",
+                json.dumps(
+                    {
+                        "type": "diagnostic",
+                        "diagnostic": {"severity": "error", "summary": "429"},
+                    }
+                ),
+            ),
+        ]
+
+        async def feed():
+            for stream, line in lines:
+                await timeline.write(stream, line)
+
+        asyncio.run(feed())
+
+        a, b = timeline.resources
+        assert (a.address, a.action, a.duration_seconds) == ("r.a", "create", 2.25)
+        assert (b.status, b.duration_seconds) == ("errored", 2.5)
+        assert [(r.completed, r.total) for r in timeline.resources] == [(1, 2), (2, 2)]
+        assert instrumentation.resources == timeline.resources
+        assert timeline.errors == ["Error: 429"]
+
+
+class TestCriticalPath:
+
+    def test_follows_the_chain_that_finished_last(self):
+        vcn = timing("oci_core_vcn.net", 0, 5)
+        instance = timing("oci_core_instance.vm", 5.01, 60)
+        tunnel = timing("cloudflare_tunnel.t", 0, 3)
+        secrets = [timing(f"github_actions_secret.s[{i}]", 0, 2) for i in range(3)]
+        ssh_secret = timing("github_actions_secret.ssh", 65.02, 1)
+
+        path = critical_path([vcn, tunnel, *secrets, instance, ssh_secret])
+
+        assert [r.address for r in path] == [
+            "oci_core_vcn.net",
+            "oci_core_instance.vm",
+            "github_actions_secret.ssh",
+        ]
+        assert critical_path([]) == []
+        assert resource_name("github_actions_secret.s[2]") == "github_actions_secret.s"
+
+    def test_sink_ranks_resources_across_jobs(self):
+        sink = CriticalPathSink(max_jobs=2)
+        for job, instance_seconds in (("old", 1000), ("a", 60), ("b", 90)):
+            sink.emit_resource(timing("oci_core_instance.vm", 0, instance_seconds, job))
+            for i in range(7):
+                sink.emit_resource(timing(f"github_actions_secret.s[{i}]", 0, 2, job))
+
+        top, secrets = sink.summary()
+        assert (top.resource, top.jobs, top.critical_jobs) == (
+            "oci_core_instance.vm",
+            2,
+            2,
+        )
+        assert top.critical_seconds == 150 and top.p95_seconds == 90
+        assert (secrets.jobs, secrets.critical_jobs, secrets.p50_seconds) == (2, 0, 2)
+
+    def test_prometheus_exposes_resource_durations(self):
+        sink = PrometheusSink()
+        sink.emit_resource(timing("oci_core_instance.vm", 0, 42))
+        assert (
+            'stackable_resource_duration_seconds_sum{phase="apply",'
+            'resource_type="oci_core_instance",action="create"} 42.0'
+        ) in sink.render()
+
+
+def test_apply_records_timeline_and_critical_path(tmp_path, monkeypatch):
+    def fake(argv, cwd, timeout=600, env=None, sinks=(), **kwargs):
+        argv = [str(arg) for arg in argv]
+        stdout = ""
+        if argv[1] == "show":
+            stdout = PLAN_JSON
+        elif argv[1] == "apply":
+            assert argv[2:4] == ["-parallelism=2", "-json"]
+            stdout = "\n".join(
+                [
+                    event("apply_start", "oci_core_instance.vm", 10, action="create"),
+                    event("apply_complete", "oci_core_instance.vm", 70),
+                    event("apply_start", "github_actions_secret.a[0]", 70.01),
+                    event("apply_complete", "github_actions_secret.a[0]", 71),
+                ]
+            )
+
+        async def stream():
+            for line in stdout.splitlines():
+                for sink in sinks:
+                    await sink.write("stdout", line)
+
+        asyncio.run(stream())
+        return CommandResult(argv=argv, returncode=0, stdout=stdout)
+
+    monkeypatch.setattr("app.service.execute", fake)
+    service = DeploymentService(
+        tmp_path, provider_cache=ProviderCache(tmp_path / "cache")
+    )
+    result = service.apply()
+
+    assert [r["address"] for r in result["resources"]] == [
+        "oci_core_instance.vm",
+        "github_actions_secret.a[0]",
+    ]
+    assert result["resources"][0]["duration_seconds"] == 60
+    assert result["resources"][1]["completed"] == result["resources"][1]["total"] == 2
+    assert result["critical_path"] == [
+        "oci_core_instance.vm",
+        "github_actions_secret.a[0]",
+    ]
@@ -0,0 +1,72 @@
+import stat
+from pathlib import Path
+from app.service import DeploymentService
+from app.utils.workspace import MANIFEST_FILE, materialize_workspace
+
+
+def mode(path: Path) -> int:
+    return stat.S_IMODE(path.stat().st_mode)
+
+
+class TestMaterializeWorkspace:
+
+    def test_writes_all_artifacts_with_modes(self, tmp_path):
+        manifest = materialize_workspace(
+            tmp_path / "ws",
+            {"main.tf": ("resource {}", 0o644), "id_rsa": (b"secret", 0o600)},
+        )
+
+        assert sorted(manifest.written) == ["id_rsa", "main.tf"]
+        assert manifest.bytes_written == len("resource {}") + len("secret")
+        assert (tmp_path / "ws" / "main.tf").read_text() == "resource {}"
+        assert mode(tmp_path / "ws" / "id_rsa") == 0o600
+        assert mode(tmp_path / "ws" / "main.tf") == 0o644
+        assert not [p for p in (tmp_path / "ws").iterdir() if ".main.tf." in p.name]
+
+    def test_reused_workspace_skips_unchanged_files(self, tmp_path):
+        directory = tmp_path / "ws"
+        materialize_workspace(directory, {"a.tf": ("a", 0o644), "b.tf": ("b", 0o644)})
+        manifest = materialize_workspace(
+            directory, {"a.tf": ("a", 0o644), "b.tf": ("changed", 0o644)}
+        )
+
+        assert manifest.unchanged == ["a.tf"]
+        assert manifest.written == ["b.tf"]
+        assert (directory / "b.tf").read_text() == "changed"
+
+    def test_externally_modified_file_is_rewritten(self, tmp_path):
+        directory = tmp_path / "ws"
+        materialize_workspace(directory, {"a.tf": ("a", 0o644)})
+        (directory / "a.tf").write_text("tampered")
+
+        assert materialize_workspace(directory, {"a.tf": ("a", 0o644)}).written == [
+            "a.tf"
+        ]
+        assert (directory / "a.tf").read_text() == "a"
+        assert (directory / MANIFEST_FILE).exists()
+
+
+def test_write_workspace_single_pass(tmp_path, monkeypatch):
+    """Both tf files and both keys are written with one key derivation."""
+    calls = []
+    monkeypatch.setattr(
+        "app.service.decode_file", lambda path: calls.append(path) or "ssh-ed25519 AAAA"
+    )
+    monkeypatch.setattr("app.service.read_file", lambda path: "PRIVATE")
+    svc = DeploymentService(directory=tmp_path)
+    svc.payload = object()
+
+    manifest = svc.write_workspace(
+        {"main.tf": "main", "provider.tf": "provider"}, Path("key"), tfvars={"a": 1}
+    )
+
+    assert len(calls) == 1
+    assert sorted(manifest.written) == [
+        "id_rsa",
+        "id_rsa.pub",
+        "main.tf",
+        "provider.tf",
+        "terraform.tfvars.json",
+    ]
+    assert (tmp_path / "id_rsa.pub").read_text() == "ssh-ed25519 AAAA"
+    assert mode(tmp_path / "id_rsa") == 0o600
@@ -0,0 +1,103 @@
+import os
+import pytest
+from app.service import DeploymentService
+from app.utils import make_directory as workspaces
+from app.utils.provider_cache import ProviderCache
+from app.utils.workspace_backend import MemoryBackend, WorkspaceBackend, get_backend
+
+PROVIDER = ".terraform/providers/registry.terraform.io/hashicorp/random/provider"
+
+
+@pytest.fixture
+def disk_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(workspaces, "WORKSPACE_ROOT", tmp_path / "disk")
+    return tmp_path / "disk"
+
+
+class TestMemoryBackend:
+
+    def test_falls_back_to_disk_over_budget(self, tmp_path, disk_root):
+        backend = MemoryBackend(tmp_path / "shm", budget_bytes=3 * 2**20)
+        backend.job_bytes = 2**20
+
+        first, second = backend.make_directory("a"), backend.make_directory("b")
+        (first / "terraform.tfstate").write_bytes(os.urandom(2**20 + 4096))
+        backend.account(first)
+        third = backend.make_directory("c")
+
+        assert first.parent == second.parent == tmp_path / "shm"
+        assert third.parent == disk_root and backend.fallbacks == 1
+        assert workspaces.read_marker(third)["job_id"] == "c"
+        assert backend.symlink_providers(first)
+        assert not backend.symlink_providers(third)
+
+    def test_usage_is_tracked_without_walking_workspaces(
+        self, tmp_path, disk_root, monkeypatch
+    ):
+        backend = MemoryBackend(tmp_path / "shm", budget_bytes=2**30)
+        backend.job_bytes = 2**20
+        left_over = backend.make_directory("old")
+        backend = MemoryBackend(tmp_path / "shm", budget_bytes=2**30)
+        backend.job_bytes = 2**20
+        first = backend.make_directory("a")
+        walked = []
+        monkeypatch.setattr(
+            "app.utils.workspace_backend.disk_usage",
+            lambda path: walked.append(path) or 3 * 2**20,
+        )
+
+        second = backend.make_directory("b")
+        # The left-over workspace was measured once; new ones reserve a job each
+        assert walked == [] and backend.used_bytes() == 3 * 2**20
+        backend.account(second)
+        backend.job_bytes = 2**20
+        assert backend.used_bytes() == 2**20 + 2**20 + 3 * 2**20
+        workspaces.remove_workspace(left_over)
+        assert backend.used_bytes() == 2**20 + 3 * 2**20
+        assert first.is_dir() and walked == [second]
+
+    def test_account_learns_the_job_size(self, tmp_path, disk_root):
+        backend = MemoryBackend(tmp_path / "shm", budget_bytes=2**30)
+        directory = backend.make_directory()
+        (directory / "tfplan").write_bytes(os.urandom(8 * 2**20))
+
+        assert backend.account(directory) >= 8 * 2**20
+        assert backend.job_bytes >= 8 * 2**20
+        assert backend.account(WorkspaceBackend().make_directory()) < 2**20
+        assert backend.job_bytes >= 8 * 2**20
+
+    def test_named_backends_are_shared(self, monkeypatch):
+        monkeypatch.setenv("STACKABLE_WORKSPACE_BACKEND", "memory")
+        assert get_backend() is get_backend("memory")
+        assert isinstance(get_backend("disk"), WorkspaceBackend)
+        with pytest.raises(ValueError):
+            get_backend("nfs")
+
+
+def test_memory_workspaces_symlink_providers(
+    fake_terraform, ssh_key, tmp_path, disk_root
+):
+    fake_terraform.write_text(
+        "#!/bin/sh\n"
+        'if [ "$1" = init ]; then\n'
+        f"  mkdir -p $(dirname {PROVIDER}) && head -c 65536 /dev/urandom > {PROVIDER}\n"
+        "  echo '# pinned' > .terraform.lock.hcl\n"
+        "fi\n"
+    )
+    backend = MemoryBackend(tmp_path / "shm", budget_bytes=2**30)
+    cache = ProviderCache(tmp_path / "cache")
+    services = [DeploymentService(provider_cache=cache, backend=backend) for _ in "ab"]
+    for service in services:
+        (service.directory / "main.tf").write_text(
+            "terraform {\n  required_providers {\n    random = {\n"
+            '      source  = "hashicorp/random"\n      version = "~> 3.0"\n'
+            "    }\n  }\n}\n"
+        )
+        service.prepare_providers()
+
+    cold, warm = (service.directory for service in services)
+    assert cold.parent == warm.parent == tmp_path / "shm"
+    assert not (cold / PROVIDER).is_symlink()
+    assert (warm / PROVIDER).is_symlink()
+    assert (warm / PROVIDER).resolve().is_relative_to(cache.root)
+    assert backend.account(warm) < 65536
@@ -0,0 +1,115 @@
+import time
+import pytest
+from app.models.deployment_job import DeploymentJob
+from app.models.payload import Payload
+from app.scheduler import run_deployment
+from app.utils import make_directory as workspaces
+from app.utils.provider_cache import LOCK_FILE, ProviderCache
+from app.utils.workspace_pool import WorkspacePool, template_providers, versions_tf
+from app.tests.test_preflight import PAYLOAD
+
+PROVIDER = ".terraform/providers/registry.terraform.io/hashicorp/random/provider"
+
+
+@pytest.fixture
+def commands(fake_terraform, tmp_path, monkeypatch):
+    """Terraform stub whose init installs a provider and writes the lock file."""
+    log = tmp_path / "commands.log"
+    fake_terraform.write_text(
+        "#!/bin/sh\n"
+        f'echo "$1" >> {log}\n'
+        'if [ "$1" = init ]; then\n'
+        f"  mkdir -p $(dirname {PROVIDER}) && echo binary > {PROVIDER}\n"
+        f"  echo '# pinned' > {LOCK_FILE}\n"
+        "fi\n"
+        'if [ "$1" = show ]; then echo \'{"resource_changes": []}\'; fi\n'
+    )
+    monkeypatch.setattr(workspaces, "WORKSPACE_ROOT", tmp_path / "workspaces")
+    log.touch()
+    return lambda: log.read_text().split()
+
+
+def make_job(ssh_key) -> DeploymentJob:
+    return DeploymentJob(
+        payload=Payload(**PAYLOAD),
+        private_key_path=ssh_key,
+        public_key_path=ssh_key.with_suffix(".pub"),
+    )
+
+
+class TestWorkspacePool:
+
+    def test_warm_workspaces_skip_init(self, commands):
+        pool = WorkspacePool(min_size=1, max_size=2)
+        assert pool.refill() == 1
+        assert commands() == ["init", "providers"]
+
+        directory = pool.checkout("oracle", "job")
+        assert not (directory / "versions.tf").exists()
+        assert (directory / PROVIDER).exists() and (directory / LOCK_FILE).exists()
+        assert workspaces.read_marker(directory)["job_id"] == "job"
+
+        # The next warm workspace is linked from the provider cache
+        assert pool.refill() == 1
+        assert commands() == ["init", "providers"]
+
+    def test_successful_jobs_return_scrubbed_workspaces(self, commands, ssh_key):
+        pool = WorkspacePool(min_size=1, max_size=2)
+        pool.refill()
+        directory = pool._ready["oracle"][0]
+
+        run_deployment(make_job(ssh_key), pool=pool)
+
+        assert "init" not in commands()[2:]
+        assert list(pool._ready["oracle"]) == [directory]
+        assert sorted(path.name for path in directory.iterdir()) == sorted(
+            [".terraform", LOCK_FILE, ".stackable-providers", workspaces.MARKER_FILE]
+        )
+        ((hits, reused),) = [(s.hits, s.reused) for s in pool.stats()]
+        assert (hits, reused) == (1, 1)
+
+    def test_failed_jobs_discard_their_workspace(self, commands, ssh_key):
+        pool = WorkspacePool(min_size=1)
+        pool.refill()
+        directory = pool._ready["oracle"][0]
+        job = make_job(ssh_key)
+        job.private_key_path = ssh_key.with_name("missing")
+
+        with pytest.raises(Exception):
+            run_deployment(job, pool=pool)
+        assert not directory.exists() and not pool._ready["oracle"]
+
+    def test_target_follows_arrival_rate(self, commands):
+        pool = WorkspacePool(min_size=1, max_size=4, window=60)
+        pool._warm_seconds["oracle"] = 20
+        assert pool.target("oracle") == 1
+        for _ in range(6):
+            pool.checkout("oracle")
+        # 6 per minute while one workspace takes 20s to warm
+        assert pool.target("oracle") == 1 + 2
+        for _ in range(30):
+            pool.checkout("oracle")
+        assert pool.target("oracle") == 4
+
+    def test_background_refill_and_stop(self, commands):
+        pool = WorkspacePool(min_size=2, max_size=2).start()
+        try:
+            deadline = time.monotonic() + 5
+            while len(pool._ready["oracle"]) < 2 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            taken = pool.checkout("oracle")
+            while len(pool._ready["oracle"]) < 2 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            assert len(pool._ready["oracle"]) == 2
+            pooled = list(pool._ready["oracle"])
+        finally:
+            pool.stop()
+        assert taken.exists() and not any(d.exists() for d in pooled)
+
+
+def test_versions_tf_declares_the_template_providers():
+    providers = template_providers("oracle")
+    assert providers["registry.terraform.io/oracle/oci"] == "~> 5.0"
+    text = versions_tf(providers)
+    assert 'oci = {\n      source  = "registry.terraform.io/oracle/oci"' in text
+    assert ProviderCache().provider_key(providers)
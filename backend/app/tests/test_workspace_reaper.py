@@ -0,0 +1,126 @@
+import json
+import os
+import socket
+import subprocess
+import time
+import pytest
+from app.utils import make_directory as workspaces
+from app.utils.make_directory import (
+    claim_workspace,
+    make_directory,
+    read_marker,
+    release_workspace,
+    remove_workspace,
+)
+from app.utils.workspace_reaper import WorkspaceReaper, disk_usage
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    root = tmp_path / "workspaces"
+    monkeypatch.setattr(workspaces, "WORKSPACE_ROOT", root)
+    return root
+
+
+def fill(directory, size: int, age: float = 0):
+    (directory / "blob").write_bytes(os.urandom(size))
+    modified = time.time() - age
+    os.utime(directory, (modified, modified))
+
+
+class TestWorkspaceReaper:
+
+    def test_released_and_orphaned_workspaces_expire(self, root):
+        live = make_directory("live")
+        released = make_directory("released")
+        release_workspace(released, keep_for=0)
+        kept = make_directory("kept")
+        release_workspace(kept, keep_for=600)
+        leaked = make_directory("leaked")
+        workspaces._live.pop(str(leaked))
+        for directory in (live, leaked):
+            fill(directory, 4096, age=7200)
+
+        report = WorkspaceReaper(root, ttl=3600).sweep()
+
+        assert (report.scanned, report.live, report.deleted) == (4, 1, 2)
+        assert report.reclaimed_bytes >= 4096
+        assert live.exists() and kept.exists()
+        assert not released.exists() and not leaked.exists()
+        assert read_marker(kept)["job_id"] == "kept"
+
+    def test_dead_owner_is_not_live(self, root):
+        process = subprocess.Popen(["true"])
+        process.wait()
+        directory = make_directory("crashed")
+        marker = read_marker(directory)
+        marker["owner"] = f"{socket.gethostname()}:{process.pid}"
+        (directory / workspaces.MARKER_FILE).write_text(json.dumps(marker))
+        fill(directory, 1024, age=120)
+
+        assert WorkspaceReaper(root, ttl=60).sweep().deleted == 1
+
+    def test_other_hosts_workspaces_expire_after_the_ttl(self, root):
+        stale, active = make_directory("stale"), make_directory("active")
+        hours_ago = time.time() - 7200
+        for directory in (stale, active):
+            marker = read_marker(directory)
+            marker.update(owner="other-host:1", claimed_at=hours_ago)
+            (directory / workspaces.MARKER_FILE).write_text(json.dumps(marker))
+            os.utime(directory / workspaces.MARKER_FILE, (hours_ago, hours_ago))
+            (directory / "terraform.tfstate").write_text("{}")
+            os.utime(directory, (hours_ago, hours_ago))
+        # A long apply keeps rewriting its state without touching the directory
+        os.utime(stale / "terraform.tfstate", (hours_ago, hours_ago))
+
+        report = WorkspaceReaper(root, ttl=3600).sweep()
+
+        assert (report.live, report.deleted) == (1, 1)
+        assert active.exists() and not stale.exists()
+
+    def test_quota_evicts_oldest_first_but_never_live(self, root):
+        live = make_directory("live")
+        fill(live, 300_000, age=500)
+        old, new = make_directory("old"), make_directory("new")
+        for directory, age in ((old, 300), (new, 100)):
+            release_workspace(directory)
+            fill(directory, 300_000, age=age)
+
+        report = WorkspaceReaper(root, ttl=3600, quota_bytes=700_000).sweep()
+
+        assert (report.deleted, report.evicted) == (1, 1)
+        assert live.exists() and new.exists() and not old.exists()
+        assert report.remaining_bytes <= 700_000
+
+    def test_reclaimed_lease_keeps_the_new_claim(self, root):
+        directory = make_directory("job")
+        claim_workspace(directory, "job")
+        claim = read_marker(directory)["claim"]
+        workspaces._live[str(directory)] = "lost-lease"
+
+        release_workspace(directory)
+        assert read_marker(directory)["claim"] == claim
+        assert "released_at" not in read_marker(directory)
+
+    def test_fresh_unmarked_directories_are_skipped(self, root):
+        root.mkdir()
+        (root / "tfjob-new").mkdir()
+        old = root / "tfjob-old"
+        old.mkdir()
+        fill(old, 10, age=7200)
+
+        report = WorkspaceReaper(root, ttl=3600, quota_bytes=0).sweep()
+        assert (root / "tfjob-new").exists() and not old.exists()
+        assert report.deleted == 1
+
+    def test_hard_linked_files_free_nothing(self, tmp_path):
+        (tmp_path / "provider").write_bytes(os.urandom(8192))
+        (tmp_path / "own").write_bytes(os.urandom(8192))
+        workspace = tmp_path / "w"
+        workspace.mkdir()
+        os.link(tmp_path / "provider", workspace / "provider")
+        os.replace(tmp_path / "own", workspace / "own")
+
+        assert 8192 <= disk_usage(workspace) < 16384
+        remove_workspace(workspace)
+        assert not workspace.exists()
@@ -1,14 +1,105 @@
+import os
+from functools import lru_cache
 from pathlib import Path
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    StrictUndefined,
+    Template,
+    Undefined,
+    meta,
+)
 
+TEMPLATE_DIR = Path(__file__).parents[2] / "terraform_templates"
+BYTECODE_CACHE_DIR = Path(
+    os.environ.get(
+        "STACKABLE_TEMPLATE_CACHE", Path(__file__).parents[2] / ".template_cache"
+    )
+)
 
-def build_template(provider_name: str = None) -> Environment:
-    """Builds the template."""
+
+def template_name(provider_name: str = None) -> str:
+    """Returns the template path for a provider, or the main template."""
     if provider_name:
-        template = f"providers/{provider_name}_template.tf.j2"
-    else:
-        template = "main.tf.j2"
+        return f"providers/{provider_name}_template.tf.j2"
+    return "main.tf.j2"
+
+
+@lru_cache(maxsize=None)
+def get_environment(strict: bool = False) -> Environment:
+    """
+    Returns the process-wide template environment.
+
+    A strict environment raises on undefined variables instead of rendering
+    them as empty strings; preflight checks render with it.
+
+    Compiled templates are kept in the environment's in-memory cache and their
+    bytecode is written to BYTECODE_CACHE_DIR so new processes start warm.
+    With auto_reload on (the default), a changed template file is picked up on
+    the next lookup; set STACKABLE_TEMPLATE_AUTO_RELOAD=0 in images where the
+    templates never change to skip the per-lookup mtime check.
+    """
+    BYTECODE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
     return Environment(
-        loader=FileSystemLoader(Path(__file__).parents[2] / "terraform_templates"),
+        loader=FileSystemLoader(TEMPLATE_DIR),
         autoescape=False,
-    ).get_template(template)
+        bytecode_cache=FileSystemBytecodeCache(str(BYTECODE_CACHE_DIR)),
+        auto_reload=os.environ.get("STACKABLE_TEMPLATE_AUTO_RELOAD", "1") != "0",
+        cache_size=-1,
+        undefined=StrictUndefined if strict else Undefined,
+    )
+
+
+def build_template(provider_name: str = None, strict: bool = False) -> Template:
+    """Builds the template."""
+    return get_environment(strict).get_template(template_name(provider_name))
+
+
+def template_source(provider_name: str = None) -> str:
+    """The template's unrendered text."""
+    environment = get_environment()
+    source, _, _ = environment.loader.get_source(
+        environment, template_name(provider_name)
+    )
+    return source
+
+
+def undeclared_variables(provider_name: str = None) -> set[str]:
+    """Names the template expects in its render context."""
+    return template_variables(template_name(provider_name))
+
+
+def template_variables(name: str) -> set[str]:
+    """
+    Names a template and the templates it includes read from the context.
+
+    Includes whose name is only known at render time are not followed.
+    """
+    environment = get_environment()
+    source, _, _ = environment.loader.get_source(environment, name)
+    parsed = environment.parse(source)
+    names = meta.find_undeclared_variables(parsed)
+    for included in meta.find_referenced_templates(parsed):
+        if included:
+            names |= template_variables(included)
+    return names
+
+
+def precompile_templates() -> list[str]:
+    """
+    Compile every template under terraform_templates/ into the bytecode cache.
+
+    Run at image build time (python -m app.utils.build_template) so the first
+    job in a fresh container does not pay for parsing and compiling.
+    """
+    environment = get_environment()
+    names = environment.list_templates(extensions=["j2"])
+    for name in names:
+        environment.get_template(name)
+    return names
+
+
+if __name__ == "__main__":
+    for name in precompile_templates():
+        print(f"Compiled {name}")
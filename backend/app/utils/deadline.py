@@ -0,0 +1,91 @@
+import os
+import time
+from typing import Callable, Optional
+
+# Longest each terraform command may run, and its weight when a job deadline
+# is shared out between the phases still ahead
+PHASE_TIMEOUTS = {
+    "validate": 120,
+    "init": 120,
+    "mirror": 600,
+    "plan": 300,
+    "show": 120,
+    "apply": 1200,
+    "output": 120,
+    "destroy": 600,
+}
+# Order of a deployment's commands; destroy runs on its own
+PHASE_ORDER = ("validate", "init", "mirror", "plan", "show", "apply", "output")
+
+
+class DeadlineExceeded(RuntimeError):
+    """Raised when a job runs out of time before or during a terraform command."""
+
+
+class Deadline:
+    """
+    End-to-end time limit of a job, shared out across its remaining phases.
+
+    Each command gets its usual timeout, or less when the job would otherwise
+    overrun: the time left is split between the current phase and the phases
+    after it in proportion to their usual timeouts. Time a phase does not use
+    goes to the phases after it. Without a limit (the default unless
+    STACKABLE_JOB_DEADLINE is set), commands get their usual timeouts.
+    """
+
+    def __init__(
+        self, seconds: float = None, clock: Callable[[], float] = time.monotonic
+    ):
+        if seconds is None and os.environ.get("STACKABLE_JOB_DEADLINE"):
+            seconds = float(os.environ["STACKABLE_JOB_DEADLINE"])
+        self.seconds = seconds
+        self.clock = clock
+        self.expires_at = None if seconds is None else clock() + seconds
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None without a limit."""
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - self.clock(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() == 0
+
+    def cap(self, seconds: float, what: str) -> float:
+        """
+        Limit a wait to the time left.
+
+        Raises:
+            DeadlineExceeded: When no time is left for what
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return seconds
+        if remaining == 0:
+            raise DeadlineExceeded(
+                f"Job deadline of {self.seconds:g}s passed before {what}"
+            )
+        return min(seconds, remaining)
+
+    def timeout(self, phase: str, default: float) -> float:
+        """
+        Seconds a phase's command may run.
+
+        Args:
+            phase (str): The phase about to run
+            default (float): Its usual timeout
+
+        Raises:
+            DeadlineExceeded: When no time is left for the phase
+        """
+        self.cap(default, f"terraform {phase}")
+        if self.expires_at is None:
+            return default
+        if phase in PHASE_ORDER:
+            ahead = PHASE_ORDER[PHASE_ORDER.index(phase) :]
+        else:
+            ahead = (phase,)
+        weight = PHASE_TIMEOUTS.get(phase, default)
+        total = sum(PHASE_TIMEOUTS.get(name, default) for name in ahead)
+        return min(default, self.remaining() * weight / total)
@@ -1,35 +1,408 @@
-import subprocess
+import asyncio
+import inspect
+import os
+import shlex
+import signal
 import logging
+import threading
+import time
+from collections import deque
 from pathlib import Path
+from typing import Callable, Optional, Sequence, Union
+
+from app.models.command_result import CommandResult
+
+STREAM_LIMIT = 1024 * 1024
+KILL_GRACE_SECONDS = 10
+SAMPLE_INTERVAL_SECONDS = 0.5
+CANCEL_POLL_SECONDS = 0.2
+PROC = Path("/proc")
+
+
+class OutputSink:
+    """Receives command output one line at a time, without the trailing newline."""
+
+    async def write(self, stream: str, line: str):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class TailSink(OutputSink):
+    """
+    Keeps the last lines of each stream, as a fixed-size ring buffer.
+
+    At most max_lines lines and about max_bytes characters are kept per
+    stream; None lifts the limit.
+    """
+
+    def __init__(self, max_lines: Optional[int] = 200, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.lines = {
+            "stdout": deque(maxlen=max_lines),
+            "stderr": deque(maxlen=max_lines),
+        }
+        self.sizes = {"stdout": 0, "stderr": 0}
+
+    async def write(self, stream: str, line: str):
+        lines = self.lines[stream]
+        if lines.maxlen is not None and len(lines) == lines.maxlen:
+            self.sizes[stream] -= len(lines[0]) + 1
+        if self.max_bytes is not None:
+            line = line[-self.max_bytes :]
+        lines.append(line)
+        self.sizes[stream] += len(line) + 1
+        if self.max_bytes is not None:
+            while self.sizes[stream] > self.max_bytes and len(lines) > 1:
+                self.sizes[stream] -= len(lines.popleft()) + 1
+
+    def text(self, stream: str) -> str:
+        return "\n".join(self.lines[stream])
+
+
+def last_lines(text: str, count: int = 20) -> str:
+    """The end of some command output, for error messages."""
+    lines = text.strip().splitlines()
+    if len(lines) <= count:
+        return "\n".join(lines)
+    return "\n".join([f"... ({len(lines) - count} earlier lines)", *lines[-count:]])
+
+
+class CallbackSink(OutputSink):
+    """Forwards each line to a plain function or coroutine function."""
+
+    def __init__(self, callback: Callable[[str, str], object]):
+        self.callback = callback
+
+    async def write(self, stream: str, line: str):
+        result = self.callback(stream, line)
+        if inspect.isawaitable(result):
+            await result
+
+
+class PrefixSink(OutputSink):
+    """Forwards each line to another sink with a prefix, e.g. a target's name."""
+
+    def __init__(self, sink: OutputSink, prefix: str):
+        self.sink = sink
+        self.prefix = prefix
+
+    async def write(self, stream: str, line: str):
+        await self.sink.write(stream, self.prefix + line)
+
+    async def close(self):
+        await self.sink.close()
+
+
+def kill_process_group(pid: int, sig: int = signal.SIGKILL):
+    """Signal every process in the group led by pid, ignoring exited groups."""
+    try:
+        os.killpg(pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def terminate(process: asyncio.subprocess.Process, grace: float):
+    """
+    Interrupt the process group, then kill it if it outlives the grace period.
+
+    SIGINT lets terraform stop gracefully: it finishes the operations in
+    flight, writes state and releases its lock. Whatever is left of the
+    group once the leader exits or the grace period ends is killed.
+    """
+    kill_process_group(process.pid, signal.SIGINT)
+    try:
+        await asyncio.wait_for(process.wait(), grace)
+    except asyncio.TimeoutError:
+        pass
+    kill_process_group(process.pid, signal.SIGKILL)
+    await process.wait()
+
+
+def _process_tree(pid: int) -> list[int]:
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        try:
+            for task in (PROC / str(current) / "task").iterdir():
+                pending.extend(int(c) for c in (task / "children").read_text().split())
+        except OSError:
+            continue
+    return pids
+
+
+def sample_usage(pid: int) -> Optional[tuple[float, int]]:
+    """
+    CPU seconds and resident bytes of a process and all of its descendants.
+
+    Reaped descendants are included through their parents' cutime/cstime.
+    Returns None where /proc is not available.
+    """
+    if not PROC.is_dir():
+        return None
+    ticks, pages = 0, 0
+    for member in _process_tree(pid):
+        try:
+            stat = (PROC / str(member) / "stat").read_text()
+        except OSError:
+            continue
+        fields = stat.rsplit(")", 1)[1].split()
+        ticks += sum(int(value) for value in fields[11:15])
+        pages += int(fields[21])
+    return ticks / os.sysconf("SC_CLK_TCK"), pages * os.sysconf("SC_PAGE_SIZE")
+
+
+async def _sample(process: asyncio.subprocess.Process, usage: dict):
+    """
+    Track CPU time and peak memory of a running command's process tree.
+
+    Sampled from /proc rather than taken from rusage. asyncio's child
+    watcher reaps the process itself, so its os.wait4() rusage never reaches
+    us. getrusage(RUSAGE_CHILDREN) is per process: the scheduler runs
+    several commands at once, so its deltas would mix them up, and its
+    ru_maxrss is the largest child this process ever had, which a delta
+    cannot isolate. Each sample reads a few small /proc files per process
+    in the tree. The cost: CPU time used in the last interval before exit
+    is missed, and a peak between samples can be missed.
+    """
+    while process.returncode is None:
+        sample = sample_usage(process.pid)
+        if sample is None:
+            return
+        if process.returncode is None and sample[1]:
+            usage["cpu_seconds"] = max(usage["cpu_seconds"] or 0, sample[0])
+            usage["peak_rss_bytes"] = max(usage["peak_rss_bytes"] or 0, sample[1])
+        await asyncio.sleep(SAMPLE_INTERVAL_SECONDS)
+
+
+async def _watch(cancel_event: threading.Event):
+    """Return once the event is set; threading events cannot be awaited."""
+    while not cancel_event.is_set():
+        await asyncio.sleep(CANCEL_POLL_SECONDS)
+
+
+async def _pump(
+    name: str, pipe: asyncio.StreamReader, queue: asyncio.Queue, usage: dict
+):
+    """
+    Read a pipe line by line into the queue; a full queue pauses the child.
+
+    A line longer than STREAM_LIMIT is passed on in pieces of about the limit.
+    """
+    overrun = False
+    while True:
+        piece = False
+        try:
+            raw = await pipe.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            # End of the stream, after a last line without a newline
+            raw = e.partial
+        except asyncio.LimitOverrunError as e:
+            # readline would drop the buffered bytes here; take them as a piece
+            raw = await pipe.readexactly(e.consumed)
+            piece = True
+        if not raw:
+            return
+        usage[f"{name}_bytes"] += len(raw)
+        line = raw.decode("utf-8", errors="replace").rstrip("\r\n")
+        # Skip the bare newline that ends a line already passed on in pieces
+        if line or piece or not overrun:
+            await queue.put((name, line))
+        overrun = piece
+
+
+async def _dispatch(queue: asyncio.Queue, sinks: Sequence[OutputSink]):
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        for sink in sinks:
+            await sink.write(*item)
+
+
+async def run_command(
+    argv: Union[Sequence[str], str],
+    cwd: Path,
+    timeout: float = 600,
+    env: dict[str, str] = None,
+    sinks: Sequence[OutputSink] = (),
+    tail_lines: Optional[int] = 200,
+    tail_bytes: Optional[int] = None,
+    queue_size: int = 1000,
+    kill_grace: float = KILL_GRACE_SECONDS,
+    cancel_event: threading.Event = None,
+) -> CommandResult:
+    """
+    Run a command without a shell and stream its output to sinks.
+
+    Output is read line by line into a queue of queue_size lines; when sinks
+    fall behind, reading stops and the child blocks on its pipe instead of
+    output piling up in memory. The command runs in its own process group,
+    and the whole group is terminated on timeout, when cancel_event is set
+    (from any thread) or when the awaiting task is cancelled.
+
+    Args:
+        argv (Sequence[str] | str): Program and arguments; a string is split with shlex
+        cwd (Path): Working directory
+        timeout (float): Seconds before the process group is terminated
+        env (Optional[dict[str, str]]): Extra environment variables
+        sinks (Sequence[OutputSink]): Receivers for each output line
+        tail_lines (Optional[int]): Lines per stream kept on the result
+        tail_bytes (Optional[int]): Characters per stream kept on the result
+        queue_size (int): Lines buffered between the pipes and the sinks
+        kill_grace (float): Seconds between SIGINT and SIGKILL
+        cancel_event (Optional[threading.Event]): Stops the command when set
+
+    Returns:
+        CommandResult: Exit status, output tails and timing
+    """
+    if isinstance(argv, str):
+        argv = shlex.split(argv)
+    argv = [str(arg) for arg in argv]
+    tail = TailSink(tail_lines, tail_bytes)
+    started = time.monotonic()
+
+    process = await asyncio.create_subprocess_exec(
+        *argv,
+        cwd=str(cwd),
+        env={**os.environ, **env} if env else None,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+        limit=STREAM_LIMIT,
+    )
+    usage = {
+        "cpu_seconds": None,
+        "peak_rss_bytes": None,
+        "stdout_bytes": 0,
+        "stderr_bytes": 0,
+    }
+    sampler = asyncio.ensure_future(_sample(process, usage))
+    queue = asyncio.Queue(maxsize=queue_size)
+    dispatcher = asyncio.ensure_future(_dispatch(queue, [tail, *sinks]))
+    waiter = asyncio.gather(
+        _pump("stdout", process.stdout, queue, usage),
+        _pump("stderr", process.stderr, queue, usage),
+        process.wait(),
+    )
+    watcher = asyncio.ensure_future(_watch(cancel_event)) if cancel_event else None
+    timed_out = cancelled = False
+
+    try:
+        done, _ = await asyncio.wait(
+            [waiter, watcher] if watcher else [waiter],
+            timeout=timeout,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        if waiter not in done:
+            if watcher in done:
+                cancelled = True
+                logging.error(f"Command cancelled: {shlex.join(argv)}")
+            else:
+                timed_out = True
+                logging.error(
+                    f"Command timed out after {timeout} seconds: {shlex.join(argv)}"
+                )
+            await terminate(process, kill_grace)
+    except asyncio.CancelledError:
+        await asyncio.shield(terminate(process, kill_grace))
+        # The group is dead; let the pipes reach EOF so their transports close
+        await asyncio.wait([waiter], timeout=1)
+        waiter.cancel()
+        # A cancelled gather ends with a CancelledError nobody else will read
+        waiter.add_done_callback(
+            lambda future: future.cancelled() or future.exception()
+        )
+        dispatcher.cancel()
+        raise
+    finally:
+        sampler.cancel()
+        if watcher:
+            watcher.cancel()
+        if process.returncode is None:
+            kill_process_group(process.pid)
+            await process.wait()
+
+    await waiter
+    await queue.put(None)
+    await dispatcher
+    for sink in sinks:
+        await sink.close()
+
+    return CommandResult(
+        argv=argv,
+        returncode=process.returncode,
+        stdout=tail.text("stdout"),
+        stderr=tail.text("stderr"),
+        duration_seconds=time.monotonic() - started,
+        timed_out=timed_out,
+        cancelled=cancelled,
+        **usage,
+    )
+
+
+def execute(
+    command: Union[Sequence[str], str],
+    cwd: Path,
+    timeout: float = 600,
+    env: dict[str, str] = None,
+    sinks: Sequence[OutputSink] = (),
+    tail_lines: Optional[int] = None,
+    tail_bytes: Optional[int] = None,
+    kill_grace: float = KILL_GRACE_SECONDS,
+    cancel_event: threading.Event = None,
+) -> CommandResult:
+    """
+    Run a command to completion from synchronous code.
+
+    Same as run_command, but keeps the full output by default. A command that
+    cannot be started is reported as a failed result instead of raising.
+    """
+    try:
+        return asyncio.run(
+            run_command(
+                command,
+                cwd,
+                timeout,
+                env,
+                sinks,
+                tail_lines=tail_lines,
+                tail_bytes=tail_bytes,
+                kill_grace=kill_grace,
+                cancel_event=cancel_event,
+            )
+        )
+    except OSError as e:
+        argv = shlex.split(command) if isinstance(command, str) else list(command)
+        logging.error(f"Error executing command '{shlex.join(argv)}': {str(e)}")
+        return CommandResult(argv=argv, returncode=1, stderr=str(e))
 
 
 def execute_command(
-    command: str, cwd: Path, timeout: int = 600
+    command: str, cwd: Path, timeout: int = 600, env: dict[str, str] = None
 ) -> tuple[str, str, int]:
     """
     Execute a command in the terminal.
 
+    Thin synchronous wrapper around run_command that keeps the full output.
+
     Args:
         command (str): The command to execute
         cwd (Optional[Path]): The current working directory to execute the command in
         timeout (int): Timeout in seconds (default: 600 seconds / 10 minutes)
+        env (Optional[dict[str, str]]): Extra environment variables for the command
 
     Returns:
         tuple[str, str, int]: A tuple containing (stdout, stderr, return_code)
     """
     try:
-        result = subprocess.run(
-            command,
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-            cwd=str(cwd),
-        )
+        result = execute(command, cwd, timeout, env)
+        if result.timed_out:
+            return "", f"Command timed out after {timeout} seconds", 1
         return result.stdout, result.stderr, result.returncode
-    except subprocess.TimeoutExpired:
-        logging.error(f"Command timed out after {timeout} seconds: {command}")
-        return "", f"Command timed out after {timeout} seconds", 1
     except Exception as e:
         logging.error(f"Error executing command '{command}': {str(e)}")
         return "", str(e), 1
@@ -0,0 +1,25 @@
+import hashlib
+from pathlib import Path
+
+
+def deployment_fingerprint(directory: Path, lock_file: Path = None) -> str:
+    """
+    Content hash of everything that determines a deployment's outcome.
+
+    Covers the rendered Terraform files, their variables, the deploy public
+    key and the pinned provider versions from the lock file, so a retried job
+    with identical inputs gets the same fingerprint regardless of its
+    workspace path.
+    """
+    digest = hashlib.sha256()
+    paths = sorted(directory.glob("*.tf")) + [
+        directory / "terraform.tfvars.json",
+        directory / "id_rsa.pub",
+    ]
+    if lock_file:
+        paths.append(lock_file)
+    for path in paths:
+        if path.exists():
+            digest.update(path.name.encode() + b"\0")
+            digest.update(hashlib.sha256(path.read_bytes()).digest())
+    return digest.hexdigest()
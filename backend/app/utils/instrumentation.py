@@ -0,0 +1,271 @@
+import bisect
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from app.models.command_result import CommandResult
+from app.models.phase_metrics import PhaseMetrics
+from app.models.resource_latency import ResourceLatency
+from app.models.resource_timing import ResourceTiming
+from app.utils.terraform_events import critical_path, resource_name
+
+DURATION_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800)
+CPU_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600)
+RSS_BUCKETS = tuple(2**power for power in range(24, 34))  # 16 MiB .. 8 GiB
+
+
+class MetricsSink:
+    """Receives a PhaseMetrics event for every finished phase."""
+
+    def emit(self, metrics: PhaseMetrics):
+        raise NotImplementedError
+
+    def emit_resource(self, timing: ResourceTiming):
+        """Receives each resource terraform finishes; ignored unless overridden."""
+
+
+class JsonLinesSink(MetricsSink):
+    """Appends each event as one JSON line to a file."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def emit(self, metrics: PhaseMetrics):
+        line = metrics.model_dump_json() + "\n"
+        with self._lock, open(self.path, "a") as f:
+            f.write(line)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def exposition(self, name: str, labels: str) -> list[str]:
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {self.total}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class PrometheusSink(MetricsSink):
+    """
+    Aggregates phase events across jobs into Prometheus histograms.
+
+    render() returns the text exposition format; serve() exposes it on
+    /metrics from a background thread.
+    """
+
+    HISTOGRAMS = {
+        "stackable_phase_duration_seconds": ("duration_seconds", DURATION_BUCKETS),
+        "stackable_phase_cpu_seconds": ("cpu_seconds", CPU_BUCKETS),
+        "stackable_phase_peak_rss_bytes": ("peak_rss_bytes", RSS_BUCKETS),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._resource_histograms = {}
+        self._results = defaultdict(int)
+        self._output_bytes = defaultdict(int)
+
+    def emit(self, metrics: PhaseMetrics):
+        with self._lock:
+            for name, (field, buckets) in self.HISTOGRAMS.items():
+                value = getattr(metrics, field)
+                if value is not None:
+                    key = (name, metrics.phase)
+                    if key not in self._histograms:
+                        self._histograms[key] = Histogram(buckets)
+                    self._histograms[key].observe(value)
+            status = "none" if metrics.returncode is None else metrics.returncode == 0
+            self._results[metrics.phase, str(status).lower()] += 1
+            self._output_bytes[metrics.phase, "stdout"] += metrics.stdout_bytes
+            self._output_bytes[metrics.phase, "stderr"] += metrics.stderr_bytes
+
+    def emit_resource(self, timing: ResourceTiming):
+        key = (timing.phase, timing.resource_type, timing.action)
+        with self._lock:
+            if key not in self._resource_histograms:
+                self._resource_histograms[key] = Histogram(DURATION_BUCKETS)
+            self._resource_histograms[key].observe(timing.duration_seconds)
+
+    def render(self) -> str:
+        with self._lock:
+            lines = []
+            for name in self.HISTOGRAMS:
+                lines.append(f"# TYPE {name} histogram")
+                for (histogram_name, phase), histogram in sorted(
+                    self._histograms.items()
+                ):
+                    if histogram_name == name:
+                        lines += histogram.exposition(name, f'phase="{phase}"')
+            name = "stackable_resource_duration_seconds"
+            lines.append(f"# TYPE {name} histogram")
+            for (phase, resource_type, action), histogram in sorted(
+                self._resource_histograms.items()
+            ):
+                lines += histogram.exposition(
+                    name,
+                    f'phase="{phase}",resource_type="{resource_type}",action="{action}"',
+                )
+            lines.append("# TYPE stackable_phase_total counter")
+            for (phase, success), count in sorted(self._results.items()):
+                lines.append(
+                    f'stackable_phase_total{{phase="{phase}",success="{success}"}} {count}'
+                )
+            lines.append("# TYPE stackable_phase_output_bytes_total counter")
+            for (phase, stream), count in sorted(self._output_bytes.items()):
+                lines.append(
+                    "stackable_phase_output_bytes_total"
+                    f'{{phase="{phase}",stream="{stream}"}} {count}'
+                )
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = 9464, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        sink = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = sink.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def _percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class CriticalPathSink(MetricsSink):
+    """
+    Finds the resources that dominate apply latency across jobs.
+
+    Keeps the applied resources of the last max_jobs jobs and, on summary(),
+    rebuilds each job's critical path to rank resources by the time they
+    spent on it.
+    """
+
+    def __init__(self, max_jobs: int = 1000):
+        self.max_jobs = max_jobs
+        self._lock = threading.Lock()
+        self._jobs: OrderedDict[str, list[ResourceTiming]] = OrderedDict()
+
+    def emit(self, metrics: PhaseMetrics):
+        pass
+
+    def emit_resource(self, timing: ResourceTiming):
+        if timing.phase != "apply":
+            return
+        with self._lock:
+            self._jobs.setdefault(timing.job_id, []).append(timing)
+            self._jobs.move_to_end(timing.job_id)
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+
+    def summary(self) -> list[ResourceLatency]:
+        """Resources ordered by the total time they spent on critical paths."""
+        with self._lock:
+            jobs = [list(timings) for timings in self._jobs.values()]
+        durations = defaultdict(list)
+        latencies = {}
+        for timings in jobs:
+            for name in {resource_name(timing.address) for timing in timings}:
+                latencies.setdefault(name, ResourceLatency(resource=name)).jobs += 1
+            for timing in timings:
+                durations[resource_name(timing.address)].append(timing.duration_seconds)
+            on_path = defaultdict(float)
+            for timing in critical_path(timings):
+                on_path[resource_name(timing.address)] += timing.duration_seconds
+            for name, seconds in on_path.items():
+                latencies[name].critical_jobs += 1
+                latencies[name].critical_seconds += seconds
+        for name, latency in latencies.items():
+            latency.p50_seconds = _percentile(durations[name], 0.5)
+            latency.p95_seconds = _percentile(durations[name], 0.95)
+        return sorted(
+            latencies.values(),
+            key=lambda latency: (-latency.critical_seconds, -latency.p95_seconds),
+        )
+
+
+# Sinks every Instrumentation reports to unless given its own list
+default_sinks: list[MetricsSink] = []
+
+
+class Instrumentation:
+    """Collects the phase metrics of one job and forwards them to sinks."""
+
+    def __init__(self, job_id: str, sinks: list[MetricsSink] = None):
+        self.job_id = job_id
+        self.sinks = default_sinks if sinks is None else sinks
+        self.phases: list[PhaseMetrics] = []
+        self.resources: list[ResourceTiming] = []
+
+    def emit(self, metrics: PhaseMetrics):
+        self.phases.append(metrics)
+        for sink in self.sinks:
+            sink.emit(metrics)
+
+    def record_resource(self, timing: ResourceTiming):
+        self.resources.append(timing)
+        for sink in self.sinks:
+            sink.emit_resource(timing)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time an in-process phase such as rendering or writing files."""
+        started_at, started = time.time(), time.monotonic()
+        try:
+            yield
+        finally:
+            self.emit(
+                PhaseMetrics(
+                    job_id=self.job_id,
+                    phase=name,
+                    started_at=started_at,
+                    duration_seconds=time.monotonic() - started,
+                )
+            )
+
+    def record_command(self, name: str, result: CommandResult):
+        self.emit(
+            PhaseMetrics(
+                job_id=self.job_id,
+                phase=name,
+                started_at=time.time() - result.duration_seconds,
+                duration_seconds=result.duration_seconds,
+                returncode=result.returncode,
+                cpu_seconds=result.cpu_seconds,
+                peak_rss_bytes=result.peak_rss_bytes,
+                stdout_bytes=result.stdout_bytes,
+                stderr_bytes=result.stderr_bytes,
+            )
+        )
@@ -0,0 +1,198 @@
+import gzip
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from app.models.log_chunk import LogChunk
+from app.utils.execute_command import OutputSink
+
+DEFAULT_LOG_DIR = Path(__file__).parents[2] / ".job_logs"
+CHUNK_BYTES = 256 * 1024
+# Logs not written to for this long are removed by remove_old_logs()
+DEFAULT_RETENTION_DAYS = 14
+
+
+def log_root(root: Path = None) -> Path:
+    return Path(root or os.environ.get("STACKABLE_LOG_DIR", DEFAULT_LOG_DIR))
+
+
+def remove_old_logs(max_age: float = None, root: Path = None) -> int:
+    """
+    Delete job logs last written more than max_age seconds ago.
+
+    Catches the logs of jobs whose records are gone, e.g. after a restart.
+
+    Args:
+        max_age (Optional[float]): Default: STACKABLE_LOG_RETENTION_DAYS days
+
+    Returns:
+        int: Number of logs deleted
+    """
+    if max_age is None:
+        days = float(
+            os.environ.get("STACKABLE_LOG_RETENTION_DAYS", DEFAULT_RETENTION_DAYS)
+        )
+        max_age = days * 86400
+    cutoff = time.time() - max_age
+    removed = 0
+    for path in log_root(root).glob("*.log.gz"):
+        try:
+            if path.stat().st_mtime >= cutoff:
+                continue
+        except OSError:
+            continue
+        JobLog(path.name.removesuffix(".log.gz"), path.parent).delete()
+        removed += 1
+    return removed
+
+
+class JobLog:
+    """
+    The complete terraform output of one job, gzip-compressed on disk.
+
+    Output is buffered per phase and written as a separate gzip member every
+    chunk_bytes and at the end of each phase, so the file is one valid gzip
+    stream. An index of chunks maps uncompressed offsets to members, which
+    lets read() return any byte range by decompressing only the members it
+    overlaps.
+    """
+
+    def __init__(self, job_id: str, root: Path = None, chunk_bytes: int = CHUNK_BYTES):
+        root = log_root(root)
+        self.path = root / f"{job_id}.log.gz"
+        self.index_path = root / f"{job_id}.log.index.json"
+        self.chunk_bytes = chunk_bytes
+        self.chunks: list[LogChunk] = []
+        self._buffer = bytearray()
+        self._phase = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, job_id: str, root: Path = None) -> Optional["JobLog"]:
+        """A finished job's log, read back from its index; None if there is none."""
+        log = cls(job_id, root)
+        try:
+            chunks = json.loads(log.index_path.read_text())
+        except (OSError, ValueError):
+            return None
+        log.chunks = [LogChunk(**chunk) for chunk in chunks]
+        return log
+
+    def delete(self):
+        """Remove the log and its index, e.g. once its job is forgotten."""
+        with self._lock:
+            self.chunks, self._buffer = [], bytearray()
+            self.path.unlink(missing_ok=True)
+            self.index_path.unlink(missing_ok=True)
+
+    @property
+    def size(self) -> int:
+        """Uncompressed bytes written so far, including unflushed output."""
+        with self._lock:
+            return self._written() + len(self._buffer)
+
+    def _written(self) -> int:
+        last = self.chunks[-1] if self.chunks else None
+        return last.offset + last.length if last else 0
+
+    def sink(self, phase: str) -> "JobLogSink":
+        return JobLogSink(self, phase)
+
+    def write(self, phase: str, line: str):
+        with self._lock:
+            if phase != self._phase:
+                self._flush()
+                self._phase = phase
+            self._buffer += line.encode() + b"\n"
+            if len(self._buffer) >= self.chunk_bytes:
+                self._flush()
+
+    def flush(self):
+        """Write buffered output to disk, e.g. at the end of a phase."""
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        member = gzip.compress(bytes(self._buffer), compresslevel=6)
+        with open(self.path, "ab") as f:
+            compressed_offset = f.tell()
+            f.write(member)
+        self.chunks.append(
+            LogChunk(
+                phase=self._phase,
+                offset=self._written(),
+                length=len(self._buffer),
+                compressed_offset=compressed_offset,
+                compressed_length=len(member),
+            )
+        )
+        self._buffer.clear()
+        temporary = self.index_path.with_suffix(".tmp")
+        temporary.write_text(json.dumps([chunk.model_dump() for chunk in self.chunks]))
+        os.replace(temporary, self.index_path)
+
+    def phases(self) -> list[tuple[str, int, int]]:
+        """
+        Where each phase's output is in the log, in order.
+
+        Returns:
+            list[tuple[str, int, int]]: (phase, start, end) byte ranges; a
+            retried phase appears once per attempt
+        """
+        with self._lock:
+            chunks = [(c.phase, c.offset, c.offset + c.length) for c in self.chunks]
+            if self._buffer:
+                written = self._written()
+                chunks.append((self._phase, written, written + len(self._buffer)))
+        ranges = []
+        for phase, start, end in chunks:
+            if ranges and ranges[-1][0] == phase and ranges[-1][2] == start:
+                ranges[-1] = (phase, ranges[-1][1], end)
+            else:
+                ranges.append((phase, start, end))
+        return ranges
+
+    def read(self, start: int = 0, end: int = None) -> bytes:
+        """Uncompressed bytes [start, end) of the log."""
+        with self._lock:
+            chunks = list(self.chunks)
+            pending = bytes(self._buffer)
+            written = self._written()
+        end = written + len(pending) if end is None else end
+        overlapping = [
+            chunk
+            for chunk in chunks
+            if chunk.offset + chunk.length > start and chunk.offset < end
+        ]
+        parts = []
+        if overlapping:
+            with open(self.path, "rb") as f:
+                for chunk in overlapping:
+                    f.seek(chunk.compressed_offset)
+                    text = gzip.decompress(f.read(chunk.compressed_length))
+                    parts.append(
+                        text[max(start - chunk.offset, 0) : end - chunk.offset]
+                    )
+        if end > written:
+            parts.append(pending[max(start - written, 0) : end - written])
+        return b"".join(parts)
+
+
+class JobLogSink(OutputSink):
+    """Feeds one phase's command output into a JobLog."""
+
+    def __init__(self, log: JobLog, phase: str):
+        self.log = log
+        self.phase = phase
+
+    async def write(self, stream: str, line: str):
+        self.log.write(self.phase, line)
+
+    async def close(self):
+        self.log.flush()
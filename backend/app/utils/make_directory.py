@@ -1,10 +1,134 @@
-from pathlib import Path
+import json
+import os
+import shutil
+import socket
+import threading
+import time
 import uuid
+from pathlib import Path
+
+WORKSPACE_ROOT = Path(__file__).parents[2] / "temp_templates"
+MARKER_FILE = ".workspace.json"
 
+# Claim id of each workspace this process is using; the reaper never touches them
+_live: dict[str, str] = {}
+_live_lock = threading.Lock()
 
-def make_directory() -> Path:
+
+def make_directory(job_id: str = None, root: Path = None) -> Path:
     directory_uuid = uuid.uuid4()
-    parent_dir = Path(__file__).parents[2]
-    temp_dir = parent_dir / "temp_templates" / f"tfjob-{directory_uuid}"
+    temp_dir = Path(root or WORKSPACE_ROOT) / f"tfjob-{directory_uuid}"
     temp_dir.mkdir(parents=True, exist_ok=True)
+    claim_workspace(temp_dir, job_id)
     return temp_dir
+
+
+def owner_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _write_marker(directory: Path, marker: dict):
+    path = Path(directory) / MARKER_FILE
+    temporary = path.with_suffix(".tmp")
+    temporary.write_text(json.dumps(marker))
+    os.replace(temporary, path)
+
+
+def read_marker(directory: Path) -> dict:
+    """The workspace's owner record, or {} for workspaces without one."""
+    try:
+        return json.loads((Path(directory) / MARKER_FILE).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def claim_workspace(directory: Path, job_id: str = None):
+    """Record this process as the workspace's owner and mark it live."""
+    claim = uuid.uuid4().hex
+    with _live_lock:
+        _live[str(directory)] = claim
+    _write_marker(
+        directory,
+        {
+            "job_id": job_id,
+            "owner": owner_id(),
+            "claim": claim,
+            "claimed_at": time.time(),
+        },
+    )
+
+
+def release_workspace(directory: Path, keep_for: float = None):
+    """
+    Stop using a workspace and leave it to the reaper.
+
+    Args:
+        directory (Path): The workspace
+        keep_for (Optional[float]): Seconds the reaper keeps it, e.g. for
+            inspection (default: the reaper's TTL)
+    """
+    with _live_lock:
+        claim = _live.pop(str(directory), None)
+    marker = read_marker(directory)
+    # Someone else may have claimed it since, e.g. after a lost lease
+    if claim is None or marker.get("claim") != claim:
+        return
+    marker["released_at"] = time.time()
+    if keep_for is not None:
+        marker["keep_until"] = marker["released_at"] + keep_for
+    _write_marker(directory, marker)
+
+
+def forget_workspace(directory: Path):
+    """Stop tracking a workspace the caller is about to delete itself."""
+    with _live_lock:
+        _live.pop(str(directory), None)
+
+
+def remove_workspace(directory: Path):
+    """Release a workspace and delete it straight away."""
+    forget_workspace(directory)
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def last_activity(directory: Path, marker: dict) -> float:
+    """When the workspace was claimed, or it or a file directly in it last changed."""
+    times = [marker.get("claimed_at", 0)]
+    try:
+        times.append(os.stat(directory).st_mtime)
+        with os.scandir(directory) as entries:
+            times.extend(
+                entry.stat(follow_symlinks=False).st_mtime for entry in entries
+            )
+    except OSError:
+        pass
+    return max(times)
+
+
+def is_live(directory: Path, marker: dict, ttl: float = None) -> bool:
+    """
+    Whether a job may still be using the workspace.
+
+    A workspace is live until it is released, while the owning process is
+    running. In this process, only workspaces claimed and not yet released
+    are live, so ones leaked by a failed job are not. Whether a process on
+    another host is running cannot be checked, so its workspaces are only
+    live until ttl seconds after their last activity.
+    """
+    if "released_at" in marker or "owner" not in marker:
+        return False
+    host, pid = marker["owner"].rsplit(":", 1)
+    if host != socket.gethostname():
+        if ttl is None:
+            return True
+        return time.time() - last_activity(directory, marker) < ttl
+    if int(pid) == os.getpid():
+        with _live_lock:
+            return _live.get(str(directory)) == marker.get("claim")
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
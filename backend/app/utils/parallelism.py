@@ -0,0 +1,155 @@
+import os
+import re
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache
+
+# What terraform uses without -parallelism
+DEFAULT_PARALLELISM = 10
+RESOURCE_PATTERN = re.compile(r'^\s*resource\s+"', re.MULTILINE)
+
+
+def declared_resources(text: str) -> int:
+    """Resource blocks in terraform source, a bound on what a plan can touch."""
+    return len(RESOURCE_PATTERN.findall(text))
+
+
+class ParallelismController:
+    """
+    Chooses terraform's -parallelism for each plan, apply and destroy.
+
+    A command gets one walker per resource it can touch, up to max_width.
+    The host's budget of walkers is split evenly between the commands
+    running at once, so a busy worker does not oversubscribe its CPU, while
+    a quiet one runs wider than terraform's default of 10.
+
+    Provider API quotas are per cloud account, so each account also learns
+    a limit on the walkers of all its running commands, split between
+    them. Output that shows rate limiting halves the limit from the number
+    of walkers that were running when the throttled command started, once
+    per round of commands. Each clean command raises it by one again, but
+    not back to the throttled number until probe_after clean commands have
+    gone by.
+    """
+
+    def __init__(
+        self, budget: int = None, max_width: int = None, probe_after: int = 50
+    ):
+        self.budget = (
+            int(os.environ.get("STACKABLE_PARALLELISM_BUDGET", 4 * DEFAULT_PARALLELISM))
+            if budget is None
+            else budget
+        )
+        self.max_width = (
+            int(os.environ.get("STACKABLE_MAX_PARALLELISM", 32))
+            if max_width is None
+            else max_width
+        )
+        self.probe_after = probe_after
+        self.active = 0
+        self._commands: dict[str, int] = defaultdict(int)
+        self._walkers: dict[str, int] = defaultdict(int)
+        self._limits: dict[str, int] = {}
+        # Walkers that were throttled, and clean commands since
+        self._throttled_at: dict[str, tuple[int, int]] = {}
+        self._epochs: dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def limit(self, account: str) -> int:
+        """Walkers the account's running commands may use together; None if unknown."""
+        with self._lock:
+            return self._limits.get(account)
+
+    def choose(self, resources: int, account: str = None) -> int:
+        """Walkers for a command touching resources, among the running commands."""
+        with self._lock:
+            width = min(
+                resources or 1, self.max_width, self.budget // max(1, self.active)
+            )
+            limit = self._limits.get(account)
+            if limit is not None:
+                room = limit - self._walkers[account]
+                width = min(width, max(room, limit // (self._commands[account] + 1)))
+        return max(1, width)
+
+    @contextmanager
+    def slot(self, resources: int, account: str = None, override: int = None):
+        """
+        Hold a share of the budget while a command runs.
+
+        Yields:
+            ParallelismSlot: The -parallelism to run with (override when one
+            is set); mark it throttled if the command's output shows rate
+            limiting
+        """
+        with self._lock:
+            self.active += 1
+        width = override or self.choose(resources, account)
+        with self._lock:
+            self._commands[account] += 1
+            self._walkers[account] += width
+            slot = ParallelismSlot(
+                width, account, self._walkers[account], self._epochs[account]
+            )
+        try:
+            yield slot
+        finally:
+            with self._lock:
+                self.active -= 1
+                self._commands[account] -= 1
+                self._walkers[account] -= width
+                self._observe(slot)
+
+    def _observe(self, slot: "ParallelismSlot"):
+        account = slot.account
+        if slot.throttled:
+            # Commands that started before the last decrease saw the old limit
+            if slot.epoch == self._epochs[account]:
+                self._limits[account] = max(1, slot.walkers // 2)
+                self._throttled_at[account] = (slot.walkers, 0)
+                self._epochs[account] += 1
+            return
+        limit = self._limits.get(account)
+        if limit is None:
+            return
+        ceiling = None
+        if account in self._throttled_at:
+            walkers, clean = self._throttled_at[account]
+            if clean + 1 < self.probe_after:
+                self._throttled_at[account] = (walkers, clean + 1)
+                ceiling = walkers - 1
+            else:
+                del self._throttled_at[account]
+        if ceiling is None or limit < ceiling:
+            self._limits[account] = limit + 1
+        if self._limits[account] >= self.budget:
+            # As good as no limit; unlearned until throttled again
+            del self._limits[account]
+            self._throttled_at.pop(account, None)
+
+
+class ParallelismSlot:
+    """
+    One command's share of the walkers.
+
+    Attributes:
+        width: The -parallelism to run with
+        account: Cloud account the command deploys into
+        walkers: The account's walkers when the command started, its own included
+        epoch: How often the account's limit had been lowered when it started
+        throttled: Set when the command's output shows rate limiting
+    """
+
+    def __init__(self, width: int, account: str, walkers: int, epoch: int):
+        self.width = width
+        self.account = account
+        self.walkers = walkers
+        self.epoch = epoch
+        self.throttled = False
+
+
+@lru_cache(maxsize=None)
+def shared_controller() -> ParallelismController:
+    """The controller shared by every job in this process."""
+    return ParallelismController()
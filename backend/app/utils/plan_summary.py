@@ -0,0 +1,31 @@
+import json
+from app.models.plan_summary import PlanSummary, ResourceChange
+
+
+def summarize_plan(plan_json: str) -> PlanSummary:
+    """
+    Count the changes in the output of terraform show -json <planfile>.
+
+    Replacements are counted as one add and one destroy, as terraform does.
+    """
+    plan = json.loads(plan_json)
+    summary = PlanSummary()
+
+    for resource in plan.get("resource_changes", []):
+        actions = resource.get("change", {}).get("actions", [])
+        if "create" in actions:
+            summary.add += 1
+        if "delete" in actions:
+            summary.destroy += 1
+        if "update" in actions:
+            summary.change += 1
+        if {"create", "delete", "update"} & set(actions):
+            summary.resource_changes.append(
+                ResourceChange(address=resource["address"], actions=actions)
+            )
+
+    summary.outputs_changed = any(
+        change.get("actions") not in (["no-op"], None)
+        for change in plan.get("output_changes", {}).values()
+    )
+    return summary
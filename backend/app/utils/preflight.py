@@ -0,0 +1,77 @@
+import json
+
+from jinja2 import TemplateNotFound, UndefinedError
+
+from app.models.command_result import CommandResult
+from app.utils.build_template import build_template, template_name, undeclared_variables
+
+
+class PreflightError(ValueError):
+    """A payload or its templates would fail terraform; lists every problem."""
+
+    def __init__(self, problems: list[str]):
+        self.problems = problems
+        super().__init__(
+            f"Preflight found {len(problems)} problem(s):\n"
+            + "\n".join(f"- {problem}" for problem in problems)
+        )
+
+
+def template_problems(context: dict, provider: str = None) -> list[str]:
+    """
+    Render the main and provider templates strictly against a context.
+
+    Every variable missing from the context is reported, not only the first
+    one a render would trip over.
+
+    Returns:
+        list[str]: Problems as "template: message"
+    """
+    problems = []
+    for provider_name in dict.fromkeys([None, provider]):
+        name = template_name(provider_name)
+        try:
+            missing = undeclared_variables(provider_name) - context.keys()
+        except TemplateNotFound:
+            problems.append(f"provider: no template for {provider_name!r}")
+            continue
+        if missing:
+            problems.extend(
+                f"{name}: undefined variable {variable!r}"
+                for variable in sorted(missing)
+            )
+            continue
+        try:
+            build_template(provider_name, strict=True).render(**context)
+        except UndefinedError as e:
+            problems.append(f"{name}: {e.message}")
+    return problems
+
+
+def validate_problems(result: CommandResult) -> list[str]:
+    """
+    Turn `terraform validate -json` output into problems.
+
+    Returns:
+        list[str]: Error diagnostics as "file:line: summary: detail"
+    """
+    try:
+        diagnostics = json.loads(result.stdout)["diagnostics"]
+    except (ValueError, KeyError, TypeError):
+        if result.returncode == 0:
+            return []
+        return [f"terraform validate failed: {result.stderr.strip()}"]
+
+    problems = []
+    for diagnostic in diagnostics:
+        if diagnostic.get("severity") != "error":
+            continue
+        location = diagnostic.get("range")
+        where = (
+            f"{location['filename']}:{location['start']['line']}: " if location else ""
+        )
+        detail = diagnostic.get("detail")
+        problems.append(
+            f"{where}{diagnostic['summary']}" + (f": {detail}" if detail else "")
+        )
+    return problems
@@ -0,0 +1,212 @@
+import fcntl
+import hashlib
+import os
+import re
+import shutil
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = Path(__file__).parents[2] / ".terraform_cache"
+LOCK_FILE = ".terraform.lock.hcl"
+# Provider key of a workspace initialized ahead of its job
+INITIALIZED_FILE = ".stackable-providers"
+PROVIDER_ENTRY = re.compile(
+    r'(\w[\w-]*)\s*=\s*\{[^{}]*?source\s*=\s*"([^"]+)"[^{}]*?version\s*=\s*"([^"]+)"',
+    re.S,
+)
+
+
+def required_providers(tf_content: str) -> dict[str, str]:
+    """
+    Extract the required_providers block from rendered Terraform.
+
+    Returns:
+        dict[str, str]: Provider source address mapped to its version constraint
+    """
+    providers = {}
+    for match in re.finditer(r"required_providers\s*\{", tf_content):
+        depth, start = 1, match.end()
+        end = start
+        while depth and end < len(tf_content):
+            depth += {"{": 1, "}": -1}.get(tf_content[end], 0)
+            end += 1
+        for _, source, version in PROVIDER_ENTRY.findall(tf_content[start:end]):
+            if source.count("/") == 1:
+                source = f"registry.terraform.io/{source}"
+            providers[source.lower()] = version
+    return providers
+
+
+def _link_tree(source: Path, destination: Path, symlink: bool = False):
+    """Copy a directory tree using hard links (or symlinks), keeping symlinks as symlinks."""
+
+    def link(src, dst):
+        if symlink:
+            os.symlink(os.path.abspath(src), dst)
+            return
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+    shutil.copytree(source, destination, symlinks=True, copy_function=link)
+
+
+class ProviderCache:
+    """
+    Shared provider installation for all job workspaces on a host.
+
+    Terraform downloads providers into plugins/ (TF_PLUGIN_CACHE_DIR) and,
+    once mirrored, installs them from mirror/ without network access. For each
+    distinct set of required providers the pinned lock file and a snapshot of
+    the initialized .terraform directory are kept, so a workspace with a known
+    provider set can be hard-linked into place instead of running init.
+
+    Terraform does not support concurrent writes to the plugin cache, so
+    commands that install into it (a cold init and the mirror) hold
+    install_lock() while they run.
+    """
+
+    def __init__(self, root: Path = None):
+        self.root = Path(
+            root or os.environ.get("STACKABLE_PROVIDER_CACHE") or DEFAULT_CACHE_DIR
+        )
+        self.plugin_dir = self.root / "plugins"
+        self.mirror_dir = self.root / "mirror"
+        self.locks_dir = self.root / "locks"
+        self.snapshots_dir = self.root / "snapshots"
+        self.cli_config = self.root / "terraformrc"
+        self.install_lock_file = self.root / "install.lock"
+
+    def provider_key(self, providers: dict[str, str]) -> str:
+        """Stable key for a set of required providers."""
+        spec = "\n".join(f"{src}={ver}" for src, ver in sorted(providers.items()))
+        return hashlib.sha256(spec.encode()).hexdigest()[:16]
+
+    def mirrored_providers(self) -> list[str]:
+        """Provider addresses (host/namespace/type) present in the mirror."""
+        if not self.mirror_dir.is_dir():
+            return []
+        return sorted(
+            "/".join(path.relative_to(self.mirror_dir).parts)
+            for path in self.mirror_dir.glob("*/*/*")
+            if path.is_dir()
+        )
+
+    def is_mirrored(self, providers: dict[str, str]) -> bool:
+        return set(providers) <= set(self.mirrored_providers())
+
+    def write_cli_config(self) -> Path:
+        """Write the Terraform CLI config pointing at the cache and mirror."""
+        self.plugin_dir.mkdir(parents=True, exist_ok=True)
+        mirrored = self.mirrored_providers()
+        lines = [f'plugin_cache_dir = "{self.plugin_dir}"', "provider_installation {"]
+        if mirrored:
+            include = ", ".join(f'"{address}"' for address in mirrored)
+            lines += [
+                "  filesystem_mirror {",
+                f'    path    = "{self.mirror_dir}"',
+                f"    include = [{include}]",
+                "  }",
+                "  direct {",
+                f"    exclude = [{include}]",
+                "  }",
+            ]
+        else:
+            lines += ["  direct {}"]
+        lines += ["}"]
+        content = "\n".join(lines) + "\n"
+        try:
+            if self.cli_config.read_text() == content:
+                return self.cli_config
+        except OSError:
+            pass
+        # Running terraform commands read the config; never show them half of it
+        staged = self.root / f".terraformrc.{uuid.uuid4().hex}"
+        staged.write_text(content)
+        os.replace(staged, self.cli_config)
+        return self.cli_config
+
+    def env(self) -> dict[str, str]:
+        """Environment variables that make terraform use the shared cache."""
+        return {
+            "TF_CLI_CONFIG_FILE": str(self.write_cli_config()),
+            "TF_PLUGIN_CACHE_DIR": str(self.plugin_dir),
+            "TF_IN_AUTOMATION": "1",
+        }
+
+    @contextmanager
+    def install_lock(self):
+        """Hold the host-wide lock on installing providers into the cache."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.install_lock_file, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def lock_file(self, key: str) -> Path:
+        """Pinned lock file for a provider set (may not exist yet)."""
+        return self.locks_dir / f"{key}.hcl"
+
+    def restore(self, directory: Path, key: str, symlink: bool = False) -> bool:
+        """
+        Prepare a workspace from the cache.
+
+        Copies the pinned lock file for the provider set and, when an
+        initialized .terraform snapshot exists, hard-links it into the
+        workspace. With symlink set, its files are symlinked instead, e.g.
+        for a workspace in memory that should not hold copies of providers.
+
+        Returns:
+            bool: True if the workspace is fully initialized and init can be skipped
+        """
+        lock_file = self.lock_file(key)
+        if not lock_file.exists():
+            return False
+        shutil.copy2(lock_file, directory / LOCK_FILE)
+
+        snapshot = self.snapshots_dir / key
+        if not snapshot.is_dir() or (directory / ".terraform").exists():
+            return False
+        _link_tree(snapshot, directory / ".terraform", symlink)
+        return True
+
+    def mark_initialized(self, directory: Path, key: str):
+        """Record that the workspace has the providers of key installed."""
+        (directory / INITIALIZED_FILE).write_text(key)
+
+    def is_initialized(self, directory: Path, key: str) -> bool:
+        """Whether the workspace was initialized for key, e.g. by the workspace pool."""
+        try:
+            marked = (directory / INITIALIZED_FILE).read_text()
+        except OSError:
+            return False
+        return (
+            marked == key
+            and (directory / LOCK_FILE).exists()
+            and (directory / ".terraform").is_dir()
+        )
+
+    def store(self, directory: Path, key: str):
+        """Save the lock file and .terraform directory of an initialized workspace."""
+        lock_file = directory / LOCK_FILE
+        if lock_file.exists():
+            self.locks_dir.mkdir(parents=True, exist_ok=True)
+            staged = self.locks_dir / f".{key}.{uuid.uuid4().hex}"
+            shutil.copy2(lock_file, staged)
+            os.replace(staged, self.lock_file(key))
+
+        snapshot = self.snapshots_dir / key
+        if snapshot.exists() or not (directory / ".terraform").is_dir():
+            return
+        self.snapshots_dir.mkdir(parents=True, exist_ok=True)
+        staged = self.snapshots_dir / f".{key}.{uuid.uuid4().hex}"
+        _link_tree(directory / ".terraform", staged)
+        try:
+            staged.rename(snapshot)
+        except OSError:
+            # Another job stored the same provider set first
+            shutil.rmtree(staged, ignore_errors=True)
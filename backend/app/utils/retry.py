@@ -0,0 +1,103 @@
+import os
+import random
+import re
+import time
+from typing import Optional
+
+from app.models.command_result import CommandResult
+
+# Checked first: an auth or validation error is never worth retrying, even
+# when the same output also mentions a 5xx from another call
+PERMANENT_PATTERN = re.compile(
+    r"\b40[13]\b|unauthori[sz]ed|forbidden|invalid (api )?token|authentication",
+    re.IGNORECASE,
+)
+TRANSIENT_PATTERNS = {
+    "rate_limit": re.compile(
+        r"\b429\b|too many requests|rate limit|throttl", re.IGNORECASE
+    ),
+    "server_error": re.compile(
+        r"\b50[0234]\b|bad gateway|service unavailable|gateway time-?out"
+        r"|internal server error",
+        re.IGNORECASE,
+    ),
+    "lock": re.compile(
+        r"error acquiring the state lock|resource temporarily unavailable",
+        re.IGNORECASE,
+    ),
+    "network": re.compile(
+        r"connection reset|connection refused|i/o timeout|tls handshake timeout"
+        r"|timeout awaiting response|unexpected eof"
+        r"|temporary failure in name resolution",
+        re.IGNORECASE,
+    ),
+}
+
+
+class TerraformError(RuntimeError):
+    """A terraform command exited non-zero; keeps the phase and its output."""
+
+    def __init__(self, message: str, phase: str, result: CommandResult):
+        super().__init__(message)
+        self.phase = phase
+        self.result = result
+
+    @property
+    def category(self) -> Optional[str]:
+        if self.result.timed_out or self.result.cancelled:
+            return None
+        return classify_failure(f"{self.result.stderr}\n{self.result.stdout}")
+
+
+def classify_failure(output: str) -> Optional[str]:
+    """
+    Name the kind of transient failure in terraform output.
+
+    Returns:
+        Optional[str]: rate_limit, server_error, lock or network, or None when
+        the failure is permanent (or unknown) and should not be retried
+    """
+    if PERMANENT_PATTERN.search(output):
+        return None
+    for category, pattern in TRANSIENT_PATTERNS.items():
+        if pattern.search(output):
+            return category
+    return None
+
+
+class RetryPolicy:
+    """
+    How often and how fast a job retries transient terraform failures.
+
+    A phase is attempted at most max_attempts times, and a job retries at
+    most budget times across all phases. Delays use full jitter: a uniform
+    draw between 0 and min(max_delay, base_delay * 2**retry), so jobs that
+    hit the same rate limit do not retry in lockstep.
+    """
+
+    def __init__(
+        self,
+        budget: int = None,
+        max_attempts: int = 3,
+        base_delay: float = None,
+        max_delay: float = 120.0,
+    ):
+        self.budget = (
+            int(os.environ.get("STACKABLE_RETRY_BUDGET", 5))
+            if budget is None
+            else budget
+        )
+        self.max_attempts = max_attempts
+        self.base_delay = (
+            float(os.environ.get("STACKABLE_RETRY_BASE_DELAY", 5.0))
+            if base_delay is None
+            else base_delay
+        )
+        self.max_delay = max_delay
+
+    def delay(self, retry: int) -> float:
+        """Seconds to wait before the given retry (0 for the first)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**retry))
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
@@ -0,0 +1,120 @@
+import json
+import re
+import time
+from datetime import datetime
+from typing import Optional
+
+from app.models.resource_timing import ResourceTiming
+from app.utils.execute_command import OutputSink
+
+START_EVENTS = {"apply_start", "refresh_start"}
+FINISH_EVENTS = {
+    "apply_complete": "complete",
+    "apply_errored": "errored",
+    "refresh_complete": "complete",
+}
+INDEX_PATTERN = re.compile(r"\[[^\]]*\]")
+
+
+def _timestamp(event: dict) -> float:
+    try:
+        return datetime.fromisoformat(event["@timestamp"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return time.time()
+
+
+class ResourceTimeline(OutputSink):
+    """
+    Parses a terraform -json event stream into per-resource timings as it arrives.
+
+    Each finished resource is reported to the instrumentation straight away,
+    with how many of the phase's resources are done, so progress can be
+    followed live. Error diagnostics are kept for the failure message, since
+    terraform writes them to stdout in -json mode.
+    """
+
+    def __init__(self, phase: str, instrumentation, total: Optional[int] = None):
+        self.phase = phase
+        self.instrumentation = instrumentation
+        self.total = total
+        self.resources: list[ResourceTiming] = []
+        self.errors: list[str] = []
+        self._started: dict[str, tuple[float, str]] = {}
+
+    async def write(self, stream: str, line: str):
+        if stream != "stdout" or not line.startswith("{"):
+            return
+        try:
+            event = json.loads(line)
+        except ValueError:
+            return
+        kind = event.get("type")
+        hook = event.get("hook") or {}
+        if kind == "diagnostic":
+            diagnostic = event.get("diagnostic") or {}
+            if diagnostic.get("severity") == "error":
+                detail = diagnostic.get("detail")
+                self.errors.append(
+                    f"Error: {diagnostic.get('summary')}"
+                    + (f": {detail}" if detail else "")
+                )
+        elif kind in START_EVENTS:
+            address = hook["resource"]["addr"]
+            self._started[address] = (_timestamp(event), hook.get("action", "refresh"))
+        elif kind in FINISH_EVENTS:
+            resource = hook["resource"]
+            finished = _timestamp(event)
+            started, action = self._started.pop(
+                resource["addr"],
+                (finished - hook.get("elapsed_seconds", 0), hook.get("action")),
+            )
+            timing = ResourceTiming(
+                job_id=self.instrumentation.job_id,
+                phase=self.phase,
+                address=resource["addr"],
+                resource_type=resource.get("resource_type", ""),
+                action=hook.get("action", action or "refresh"),
+                started_at=started,
+                duration_seconds=max(finished - started, 0.0),
+                status=FINISH_EVENTS[kind],
+                completed=len(self.resources) + 1,
+                total=self.total,
+            )
+            self.resources.append(timing)
+            self.instrumentation.record_resource(timing)
+
+
+def resource_name(address: str) -> str:
+    """A resource address without its count/for_each indexes."""
+    return INDEX_PATTERN.sub("", address)
+
+
+def critical_path(resources: list[ResourceTiming]) -> list[ResourceTiming]:
+    """
+    The chain of resources that determined how long an apply took.
+
+    Terraform's -json output does not include the dependency graph, so the
+    chain is rebuilt from timing alone: starting with the resource that
+    finished last, each step goes to the resource that finished latest
+    before the current one started, i.e. the one it most likely waited for.
+
+    Returns:
+        list[ResourceTiming]: The chain in the order the resources ran
+    """
+    if not resources:
+        return []
+    current = max(resources, key=lambda r: r.finished_at)
+    path = [current]
+    while True:
+        # Terraform starts a dependent within milliseconds of its dependency
+        waited_for = [
+            r
+            for r in resources
+            if r.finished_at <= current.started_at + 0.05
+            and r.finished_at < current.finished_at
+        ]
+        if not waited_for:
+            break
+        current = max(waited_for, key=lambda r: r.finished_at)
+        path.append(current)
+    return path[::-1]
@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Union
+
+from app.models.workspace_manifest import WorkspaceManifest
+
+MANIFEST_FILE = ".stackable-manifest.json"
+
+
+def _write_atomic(path: Path, data: bytes, mode: int):
+    """Write via a temp file in the same directory and rename it into place."""
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        # Set the mode before any content lands, so keys are never world-readable
+        os.fchmod(fd, mode)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def materialize_workspace(
+    directory: Path, artifacts: dict[str, tuple[Union[str, bytes], int]]
+) -> WorkspaceManifest:
+    """
+    Write all of a job's files into its workspace in one pass.
+
+    Each file is written atomically with its final mode. When the workspace
+    is reused, files whose content hash and size match the previous manifest
+    are left alone. Files are not fsynced: workspaces are scratch space that
+    is rebuilt from the payload if the host crashes.
+
+    Args:
+        directory (Path): The workspace directory (created if missing)
+        artifacts (dict[str, tuple[str | bytes, int]]): File name mapped to (content, mode)
+
+    Returns:
+        WorkspaceManifest: The files written and skipped, with their hashes
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest_path = directory / MANIFEST_FILE
+    try:
+        previous = json.loads(manifest_path.read_text())
+    except (OSError, ValueError):
+        previous = {}
+
+    manifest = WorkspaceManifest(directory=directory)
+    for name, (content, mode) in artifacts.items():
+        data = content.encode() if isinstance(content, str) else content
+        digest = hashlib.sha256(data).hexdigest()
+        manifest.hashes[name] = digest
+        path = directory / name
+        try:
+            unchanged = previous.get(name) == digest and path.stat().st_size == len(
+                data
+            )
+        except OSError:
+            unchanged = False
+
+        if unchanged:
+            manifest.unchanged.append(name)
+            continue
+        _write_atomic(path, data, mode)
+        manifest.written.append(name)
+        manifest.bytes_written += len(data)
+
+    if manifest.written:
+        _write_atomic(
+            manifest_path, json.dumps({**previous, **manifest.hashes}).encode(), 0o600
+        )
+    return manifest
@@ -0,0 +1,145 @@
+import os
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+from app.utils import make_directory as workspaces
+from app.utils.workspace_reaper import disk_usage
+
+DEFAULT_MEMORY_ROOT = Path("/dev/shm/stackable")
+# Assumed size of a job's workspace until one has been measured
+DEFAULT_JOB_BYTES = 4 * 2**20
+
+
+class WorkspaceBackend:
+    """
+    Where job workspaces are created.
+
+    The disk backend puts them under temp_templates/ and hard-links providers
+    from the cache into them.
+    """
+
+    name = "disk"
+
+    @property
+    def root(self) -> Path:
+        return workspaces.WORKSPACE_ROOT
+
+    def make_directory(self, job_id: str = None) -> Path:
+        return workspaces.make_directory(job_id, root=self.root)
+
+    def symlink_providers(self, directory: Path) -> bool:
+        """Whether providers should be symlinked into the workspace instead of linked."""
+        return False
+
+    def account(self, directory: Path) -> int:
+        """Record a job's workspace size once it is at its largest; returns the bytes."""
+        return disk_usage(directory)
+
+
+class MemoryBackend(WorkspaceBackend):
+    """
+    Workspaces on tmpfs, so the keys, rendered files and state in a job's
+    workspace are not written to the disk.
+
+    Provider binaries are symlinked from the disk cache instead of copied
+    into memory. A workspace is only created in memory while the memory
+    workspaces plus one more job stay within budget_bytes and the tmpfs has
+    room; otherwise the job falls back to a disk workspace. A job's size is
+    estimated from the workspaces measured by account().
+
+    The workspaces' sizes are kept as they are created and measured, so
+    only the first make_directory() walks root. Workspaces that other
+    processes create under root later are not counted.
+    """
+
+    name = "memory"
+
+    def __init__(
+        self,
+        root: Path = None,
+        budget_bytes: int = None,
+        fallback: WorkspaceBackend = None,
+    ):
+        self._root = Path(
+            root or os.environ.get("STACKABLE_MEMORY_ROOT") or DEFAULT_MEMORY_ROOT
+        )
+        self.budget_bytes = (
+            int(os.environ.get("STACKABLE_MEMORY_BUDGET_MB", 256)) * 2**20
+            if budget_bytes is None
+            else budget_bytes
+        )
+        self.fallback = fallback or WorkspaceBackend()
+        self.job_bytes = DEFAULT_JOB_BYTES
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+        # Last measured size of each memory workspace, 0 until account()
+        self._sizes: dict[Path, int] = None
+
+    @property
+    def root(self) -> Path:
+        return self._root
+
+    def used_bytes(self) -> int:
+        """
+        Memory held by the workspaces under root, or reserved for their jobs.
+
+        Must be called with the lock held.
+        """
+        if self._sizes is None:
+            self._sizes = {path: disk_usage(path) for path in self.root.glob("tfjob-*")}
+        # Workspaces are removed without the backend, e.g. by the reaper
+        for path in [path for path in self._sizes if not path.is_dir()]:
+            del self._sizes[path]
+        return sum(max(size, self.job_bytes) for size in self._sizes.values())
+
+    def _has_room(self) -> bool:
+        try:
+            self.root.mkdir(parents=True, exist_ok=True)
+            stats = os.statvfs(self.root)
+        except OSError:
+            return False
+        free = stats.f_bavail * stats.f_frsize
+        return (
+            self.used_bytes() + self.job_bytes <= self.budget_bytes
+            and self.job_bytes <= free
+        )
+
+    def make_directory(self, job_id: str = None) -> Path:
+        with self._lock:
+            if self._has_room():
+                directory = workspaces.make_directory(job_id, root=self.root)
+                self._sizes[directory] = 0
+                return directory
+            self.fallbacks += 1
+        print(
+            f"Memory workspaces are over their {self.budget_bytes / 2**20:.0f} MiB "
+            "budget, using a disk workspace"
+        )
+        return self.fallback.make_directory(job_id)
+
+    def symlink_providers(self, directory: Path) -> bool:
+        return Path(directory).is_relative_to(self.root)
+
+    def account(self, directory: Path) -> int:
+        size = disk_usage(directory)
+        if self.symlink_providers(directory):
+            with self._lock:
+                self.job_bytes = max(size, int(0.8 * self.job_bytes + 0.2 * size))
+                if self._sizes is not None:
+                    self._sizes[Path(directory)] = size
+        return size
+
+
+@lru_cache(maxsize=None)
+def _backend(name: str) -> WorkspaceBackend:
+    if name == "memory":
+        return MemoryBackend()
+    if name == "disk":
+        return WorkspaceBackend()
+    raise ValueError(f"Unknown workspace backend {name!r}")
+
+
+def get_backend(name: str = None) -> WorkspaceBackend:
+    """The process-wide backend by name; STACKABLE_WORKSPACE_BACKEND by default."""
+    return _backend(name or os.environ.get("STACKABLE_WORKSPACE_BACKEND", "disk"))
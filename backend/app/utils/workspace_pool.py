@@ -0,0 +1,286 @@
+import os
+import shutil
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Optional, Sequence
+
+from app.models.pool_stats import PoolStats
+from app.utils.build_template import template_source
+from app.utils.deadline import PHASE_TIMEOUTS
+from app.utils.execute_command import execute, last_lines
+from app.utils.make_directory import MARKER_FILE, claim_workspace, remove_workspace
+from app.utils.provider_cache import (
+    INITIALIZED_FILE,
+    LOCK_FILE,
+    ProviderCache,
+    required_providers,
+)
+from app.utils.workspace_backend import WorkspaceBackend, get_backend
+
+# Written only while warming; the job's own main.tf declares the same providers
+WARM_FILE = "versions.tf"
+# Everything else is the job's and is deleted before a workspace is reused
+POOLED_FILES = {".terraform", LOCK_FILE, INITIALIZED_FILE, MARKER_FILE}
+
+
+def template_providers(provider: str) -> dict[str, str]:
+    """Providers required by the main template together with a provider template."""
+    return required_providers(template_source() + template_source(provider))
+
+
+def versions_tf(providers: dict[str, str]) -> str:
+    """A terraform block requiring exactly these providers."""
+    lines = ["terraform {", "  required_providers {"]
+    for source, version in sorted(providers.items()):
+        lines += [
+            f"    {source.rsplit('/', 1)[1]} = {{",
+            f'      source  = "{source}"',
+            f'      version = "{version}"',
+            "    }",
+        ]
+    return "\n".join([*lines, "  }", "}", ""])
+
+
+class WorkspacePool:
+    """
+    Keeps job workspaces initialized ahead of time, per provider template.
+
+    A warm workspace has its providers installed and the lock file in place,
+    so a job that checks one out only writes its payload's files and skips
+    terraform init. A daemon thread refills the pool whenever a workspace is
+    taken. Each provider's target size follows Little's law: the checkouts
+    expected while one workspace warms, at the arrival rate of the last
+    window seconds, rounded and added to min_size, capped at max_size.
+
+    Pooled workspaces are claimed by this process, so the reaper leaves them
+    alone while it runs.
+    """
+
+    def __init__(
+        self,
+        providers: Sequence[str] = ("oracle",),
+        provider_cache: ProviderCache = None,
+        min_size: int = None,
+        max_size: int = None,
+        window: float = 300,
+        interval: float = 30,
+        backend: WorkspaceBackend = None,
+    ):
+        self.providers = list(providers)
+        self.provider_cache = provider_cache or ProviderCache()
+        self.backend = backend or get_backend()
+        self.min_size = (
+            int(os.environ.get("STACKABLE_POOL_MIN", 1))
+            if min_size is None
+            else min_size
+        )
+        self.max_size = (
+            int(os.environ.get("STACKABLE_POOL_MAX", 8))
+            if max_size is None
+            else max_size
+        )
+        self.window = window
+        self.interval = interval
+        self._ready: dict[str, deque] = defaultdict(deque)
+        self._arrivals: dict[str, deque] = defaultdict(deque)
+        self._warm_seconds: dict[str, float] = {}
+        self._counts = defaultdict(lambda: {"hits": 0, "misses": 0, "reused": 0})
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def arrival_rate(self, provider: str) -> float:
+        """Checkouts per second over the last window seconds."""
+        with self._lock:
+            arrivals = self._arrivals[provider]
+            while arrivals and arrivals[0] < time.monotonic() - self.window:
+                arrivals.popleft()
+            return len(arrivals) / self.window
+
+    def target(self, provider: str) -> int:
+        """Warm workspaces to keep ready for provider."""
+        expected = self.arrival_rate(provider) * self._warm_seconds.get(provider, 0)
+        return max(self.min_size, min(self.max_size, self.min_size + round(expected)))
+
+    def checkout(self, provider: str, job_id: str = None) -> Optional[Path]:
+        """
+        Take a warm workspace for a job.
+
+        Returns:
+            Optional[Path]: The workspace, now claimed for job_id, or None
+            when none is ready and the job should make its own
+        """
+        with self._lock:
+            self._arrivals[provider].append(time.monotonic())
+            ready = self._ready[provider]
+            directory = ready.popleft() if ready else None
+            self._counts[provider]["hits" if directory else "misses"] += 1
+        self._wake.set()
+        if directory:
+            claim_workspace(directory, job_id)
+        return directory
+
+    def checkin(self, directory: Path, provider: str, reuse: bool = True):
+        """
+        Give a workspace back after its job.
+
+        With reuse set and room in the pool, the job's files (keys, rendered
+        terraform, state and plan) are deleted and the initialized workspace
+        goes back into the pool; otherwise it is removed.
+        """
+        directory = Path(directory)
+        key = self.provider_cache.provider_key(template_providers(provider))
+        with self._lock:
+            room = len(self._ready[provider]) < self.max_size
+        if not (
+            reuse
+            and room
+            and not self._stop.is_set()
+            and self.provider_cache.is_initialized(directory, key)
+        ):
+            remove_workspace(directory)
+            return
+        try:
+            self._scrub(directory)
+        except OSError:
+            remove_workspace(directory)
+            return
+        claim_workspace(directory, f"pool:{provider}")
+        with self._lock:
+            self._ready[provider].append(directory)
+            self._counts[provider]["reused"] += 1
+
+    def _scrub(self, directory: Path):
+        # Only the installed providers carry over; backend and module state do not
+        doomed = [p for p in directory.iterdir() if p.name not in POOLED_FILES]
+        doomed += [
+            p for p in (directory / ".terraform").iterdir() if p.name != "providers"
+        ]
+        for path in doomed:
+            if path.is_dir() and not path.is_symlink():
+                shutil.rmtree(path)
+            else:
+                path.unlink()
+
+    def warm(self, provider: str) -> Path:
+        """
+        Make a workspace with provider's providers installed.
+
+        Links them from the provider cache when it has the set, and runs
+        terraform init (and stores the result in the cache) when it does not.
+        """
+        started = time.monotonic()
+        providers = template_providers(provider)
+        key = self.provider_cache.provider_key(providers)
+        directory = self.backend.make_directory(f"pool:{provider}")
+        try:
+            (directory / WARM_FILE).write_text(versions_tf(providers))
+            symlink = self.backend.symlink_providers(directory)
+            if not self.provider_cache.restore(directory, key, symlink=symlink):
+                with self.provider_cache.install_lock():
+                    self.install(directory, key, providers, symlink)
+            (directory / WARM_FILE).unlink()
+            self.provider_cache.mark_initialized(directory, key)
+        except BaseException:
+            remove_workspace(directory)
+            raise
+
+        elapsed = time.monotonic() - started
+        previous = self._warm_seconds.get(provider)
+        self._warm_seconds[provider] = (
+            elapsed if previous is None else 0.8 * previous + 0.2 * elapsed
+        )
+        return directory
+
+    def install(self, directory: Path, key: str, providers: dict, symlink: bool):
+        """Install providers into a warming workspace; the caller holds the install lock."""
+        # Another process may have stored the set while this one waited
+        if self.provider_cache.restore(directory, key, symlink=symlink):
+            return
+        env = self.provider_cache.env()
+        result = execute(
+            ["terraform", "init", "-input=false"],
+            directory,
+            timeout=PHASE_TIMEOUTS["init"],
+            env=env,
+            tail_lines=20,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"terraform init failed: {last_lines(result.stderr)}")
+        self.provider_cache.store(directory, key)
+        if not self.provider_cache.is_mirrored(providers):
+            execute(
+                ["terraform", "providers", "mirror", self.provider_cache.mirror_dir],
+                directory,
+                timeout=PHASE_TIMEOUTS["mirror"],
+                env=env,
+                tail_lines=20,
+            )
+
+    def refill(self) -> int:
+        """Warm workspaces until every provider is at its target; returns how many."""
+        warmed = 0
+        for provider in self.providers:
+            while not self._stop.is_set():
+                with self._lock:
+                    ready = len(self._ready[provider])
+                if ready >= self.target(provider):
+                    break
+                try:
+                    directory = self.warm(provider)
+                except Exception as e:
+                    print(f"Could not warm a {provider} workspace: {e}")
+                    break
+                with self._lock:
+                    self._ready[provider].append(directory)
+                warmed += 1
+        return warmed
+
+    def stats(self) -> list[PoolStats]:
+        stats = []
+        for provider in self.providers:
+            rate = self.arrival_rate(provider)
+            with self._lock:
+                ready = len(self._ready[provider])
+                counts = dict(self._counts[provider])
+            stats.append(
+                PoolStats(
+                    provider=provider,
+                    ready=ready,
+                    target=self.target(provider),
+                    arrivals_per_minute=rate * 60,
+                    warm_seconds=self._warm_seconds.get(provider, 0.0),
+                    **counts,
+                )
+            )
+        return stats
+
+    def run(self):
+        while not self._stop.is_set():
+            self.refill()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def start(self) -> "WorkspacePool":
+        """Refill on a daemon thread after each checkout, or every interval seconds."""
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.run, name="workspace-pool", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop refilling and remove the workspaces still in the pool."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+        with self._lock:
+            directories = [d for ready in self._ready.values() for d in ready]
+            self._ready.clear()
+        for directory in directories:
+            remove_workspace(directory)
@@ -0,0 +1,164 @@
+import argparse
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from app.models.reap_report import ReapReport
+from app.utils.make_directory import WORKSPACE_ROOT, is_live, read_marker
+
+# A directory just created by make_directory() may not have its marker yet
+CLAIM_GRACE_SECONDS = 60
+
+
+def disk_usage(directory: Path) -> int:
+    """
+    Bytes that deleting a directory would free.
+
+    Files with other hard links, such as providers linked from the shared
+    cache, free nothing and are not counted.
+    """
+    total = 0
+    pending = [str(directory)]
+    while pending:
+        try:
+            entries = list(os.scandir(pending.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                stat = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                pending.append(entry.path)
+            elif stat.st_nlink > 1:
+                continue
+            total += stat.st_blocks * 512
+    return total
+
+
+class WorkspaceReaper:
+    """
+    Deletes abandoned job workspaces in the background.
+
+    A workspace is kept while its job is live. Once released, it is deleted
+    after the keep_for its job asked for; otherwise, and when its owner died
+    without releasing it, ttl seconds after it was last modified. Workspaces
+    of processes on other hosts, on shared storage, count as abandoned once
+    they have not changed for ttl seconds.
+    When workspaces use more than quota_bytes, the oldest ones that are not
+    live are evicted early until usage is under the quota.
+    """
+
+    def __init__(
+        self,
+        root: Path = None,
+        ttl: float = None,
+        quota_bytes: int = None,
+        interval: float = 60,
+    ):
+        self.root = Path(root or WORKSPACE_ROOT)
+        self.ttl = (
+            float(os.environ.get("STACKABLE_WORKSPACE_TTL", 3600))
+            if ttl is None
+            else ttl
+        )
+        if quota_bytes is None and os.environ.get("STACKABLE_WORKSPACE_QUOTA_MB"):
+            quota_bytes = int(os.environ["STACKABLE_WORKSPACE_QUOTA_MB"]) * 2**20
+        self.quota_bytes = quota_bytes
+        self.interval = interval
+        self.reclaimed_bytes = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _delete(self, directory: Path):
+        # Move it out of the way first, so nothing sees a half-deleted workspace
+        doomed = directory.with_name(f".reaping-{uuid.uuid4().hex}")
+        os.rename(directory, doomed)
+        shutil.rmtree(doomed, ignore_errors=True)
+
+    def sweep(self) -> ReapReport:
+        """Delete expired workspaces, then evict until under the quota."""
+        report = ReapReport()
+        now = time.time()
+        candidates = []
+        for leftover in self.root.glob(".reaping-*"):
+            shutil.rmtree(leftover, ignore_errors=True)
+        for directory in self.root.glob("tfjob-*"):
+            try:
+                marker = read_marker(directory)
+                size = disk_usage(directory)
+                modified = directory.stat().st_mtime
+                expires_at = marker.get("keep_until", modified + self.ttl)
+            except OSError:
+                continue
+            report.scanned += 1
+            report.remaining_bytes += size
+            if is_live(directory, marker, self.ttl):
+                report.live += 1
+            elif not marker and modified > now - CLAIM_GRACE_SECONDS:
+                continue
+            else:
+                candidates.append((expires_at, size, directory))
+
+        candidates.sort(key=lambda candidate: candidate[0])
+        for expires_at, size, directory in candidates:
+            expired = expires_at <= now
+            over_quota = (
+                self.quota_bytes is not None
+                and report.remaining_bytes > self.quota_bytes
+            )
+            if not expired and not over_quota:
+                continue
+            try:
+                self._delete(directory)
+            except OSError:
+                continue
+            report.deleted += 1
+            report.evicted += not expired
+            report.reclaimed_bytes += size
+            report.remaining_bytes -= size
+        self.reclaimed_bytes += report.reclaimed_bytes
+        return report
+
+    def run(self):
+        while not self._stop.is_set():
+            report = self.sweep()
+            if report.deleted:
+                print(
+                    f"Workspace reaper deleted {report.deleted} workspaces "
+                    f"({report.evicted} over quota), reclaimed "
+                    f"{report.reclaimed_bytes / 2**20:.1f} MiB"
+                )
+            self._stop.wait(self.interval)
+
+    def start(self) -> "WorkspaceReaper":
+        """Sweep every interval seconds on a daemon thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.run, name="workspace-reaper", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+
+# cd backend && python -m app.utils.workspace_reaper --quota-mb 2048
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Delete abandoned job workspaces")
+    parser.add_argument("--ttl", type=float, help="Seconds to keep abandoned ones")
+    parser.add_argument("--quota-mb", type=int, help="Evict oldest first above this")
+    args = parser.parse_args()
+
+    report = WorkspaceReaper(
+        ttl=args.ttl,
+        quota_bytes=args.quota_mb * 2**20 if args.quota_mb else None,
+    ).sweep()
+    print(report.model_dump_json(indent=2))
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the terraform binary used by the benchmarks.
+
+Behaviour per subcommand is read from the JSON file named by
+FAKE_TERRAFORM_CONFIG, for example:
+
+    {"init": {"latency": 0.5, "output_bytes": 4096},
+     "plan": {"latency": 1.0}, "apply": {"latency": 2.0},
+     "resources": 25}
+
+Each command sleeps for its latency, writes output_bytes of log output and
+(for apply -json) one start and completion event per resource, and leaves
+behind the files the real command would (.terraform, the lock file,
+the saved plan, terraform.tfstate), so DeploymentService runs unchanged.
+
+A command with a resource_latency also walks the resources -parallelism
+at a time, taking resource_latency per round. With a top-level quota, a
+command that starts while the fake terraforms of the same tenancy run
+more walkers than the quota prints a 429 warning and takes
+throttle_penalty seconds longer, as the provider's backoff would.
+"""
+
+import json
+import math
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+DEFAULTS = {"latency": 0.05, "output_bytes": 1024, "exit_code": 0}
+
+
+def load_config() -> dict:
+    path = os.environ.get("FAKE_TERRAFORM_CONFIG")
+    return json.loads(Path(path).read_text()) if path else {}
+
+
+def emit_output(size: int, label: str):
+    line = f"{label}: fake terraform output line\n"
+    written = 0
+    while written < size:
+        sys.stdout.write(line)
+        written += len(line)
+
+
+def emit_apply_events(resources: int, latency: float):
+    """Events as if the resources had been applied one after another."""
+    started = time.time() - latency
+    for i in range(resources):
+        resource = {"addr": f"null_resource.r{i}", "resource_type": "null_resource"}
+        for kind, offset in (("apply_start", i), ("apply_complete", i + 1)):
+            timestamp = started + latency * offset / resources
+            event = {
+                "@timestamp": datetime.fromtimestamp(
+                    timestamp, timezone.utc
+                ).isoformat(),
+                "type": kind,
+                "hook": {"resource": resource, "action": "create"},
+            }
+            print(json.dumps(event))
+
+
+def walk(argv: list[str], settings: dict, config: dict, resources: int):
+    """Sleep as long as walking the resources -parallelism at a time takes."""
+    width = next(
+        (int(a.split("=", 1)[1]) for a in argv if a.startswith("-parallelism=")), 10
+    )
+    source = "".join(path.read_text() for path in Path.cwd().glob("*.tf"))
+    tenancy = re.search(r'tenancy_ocid\s*=\s*"([^"]*)"', source)
+    inflight = (
+        Path(os.environ["FAKE_TERRAFORM_CONFIG"]).parent
+        / "inflight"
+        / (tenancy.group(1) if tenancy else "default")
+    )
+    inflight.mkdir(parents=True, exist_ok=True)
+    mine = inflight / str(os.getpid())
+    mine.write_text(str(width))
+    try:
+        walkers = 0
+        for path in inflight.iterdir():
+            try:
+                walkers += int(path.read_text() or 0)
+            except (OSError, ValueError):
+                pass
+        delay = settings["resource_latency"] * math.ceil(resources / width)
+        if config.get("quota") and walkers > config["quota"]:
+            print("Warning: 429 Too Many Requests, retrying", file=sys.stderr)
+            delay += config.get("throttle_penalty", 1.0)
+        time.sleep(delay)
+    finally:
+        mine.unlink()
+
+
+def plan_json(resources: int) -> str:
+    return json.dumps(
+        {
+            "resource_changes": [
+                {"address": f"null_resource.r{i}", "change": {"actions": ["create"]}}
+                for i in range(resources)
+            ]
+        }
+    )
+
+
+def main(argv: list[str]) -> int:
+    config = load_config()
+    command = argv[0] if argv else "version"
+    if command == "providers" and argv[1:2] == ["mirror"]:
+        command = "mirror"
+    settings = {**DEFAULTS, **config.get(command, {})}
+    resources = config.get("resources", 10)
+    time.sleep(settings["latency"])
+    cwd = Path.cwd()
+    if settings.get("resource_latency"):
+        walk(argv, settings, config, resources)
+
+    if command == "init":
+        (cwd / ".terraform" / "providers").mkdir(parents=True, exist_ok=True)
+        (cwd / ".terraform.lock.hcl").write_text("# fake lock file\n")
+    elif command == "mirror":
+        sources = re.findall(
+            r'source\s*=\s*"([\w-]+/[\w-]+)"',
+            "".join(path.read_text() for path in cwd.glob("*.tf")),
+        )
+        for source in sources:
+            (Path(argv[-1]) / "registry.terraform.io" / source).mkdir(
+                parents=True, exist_ok=True
+            )
+    elif command == "plan":
+        out = next((a.split("=", 1)[1] for a in argv if a.startswith("-out=")), None)
+        if out:
+            (cwd / out).write_text(plan_json(resources))
+    elif command == "show":
+        print(plan_json(resources))
+        return settings["exit_code"]
+    elif command == "apply":
+        (cwd / "terraform.tfstate").write_text(json.dumps({"serial": 1}))
+        if "-json" in argv and resources:
+            emit_apply_events(resources, settings["latency"])
+    elif command == "output":
+        print(json.dumps({"public_ip": {"value": "203.0.113.10"}}))
+        return settings["exit_code"]
+
+    emit_output(settings["output_bytes"], command)
+    return settings["exit_code"]
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,314 @@
+"""
+End-to-end benchmarks for the deployment pipeline.
+
+Runs render, workspace creation, run_job, the concurrent scheduler and
+fixed vs adaptive -parallelism, using benchmarks/fake_terraform.py as
+terraform on PATH, with scripted latencies and output sizes. Results are
+compared with benchmarks/baseline.json so regressions in DeploymentService,
+build_template or execute_command show up as numbers.
+
+    python -m benchmarks.run                  # run and compare with the baseline
+    python -m benchmarks.run --save           # run and store a new baseline
+    python -m benchmarks.run --workers 1 4 8 --jobs 16 --check
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import resource
+import shlex
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCHMARK_DIR = Path(__file__).parent
+BASELINE = BENCHMARK_DIR / "baseline.json"
+FAKE_TERRAFORM = BENCHMARK_DIR / "fake_terraform.py"
+
+DEFAULT_PROFILE = {
+    "init": {"latency": 0.2, "output_bytes": 4096},
+    "mirror": {"latency": 0.1, "output_bytes": 1024},
+    "plan": {"latency": 0.3, "output_bytes": 16384},
+    "show": {"latency": 0.05},
+    "apply": {"latency": 0.5, "output_bytes": 65536},
+    "output": {"latency": 0.05},
+    "resources": 25,
+}
+# Many resources behind a per-tenancy quota of 24 walkers: plan and apply
+# take a round per -parallelism resources, and a throttled command 1s more
+PARALLELISM_PROFILE = {
+    **DEFAULT_PROFILE,
+    "plan": {"latency": 0.1, "resource_latency": 0.05, "output_bytes": 16384},
+    "apply": {"latency": 0.1, "resource_latency": 0.1, "output_bytes": 65536},
+    "resources": 30,
+    "quota": 24,
+    "throttle_penalty": 1.0,
+}
+# Metrics where a larger value is better; every other metric is a cost
+HIGHER_IS_BETTER = ("jobs_per_hour",)
+
+
+@contextlib.contextmanager
+def fake_environment(root: Path, profile: dict):
+    """Put the fake terraform first on PATH and isolate caches, state and logs."""
+    bin_dir = root / "bin"
+    bin_dir.mkdir(parents=True)
+    terraform = bin_dir / "terraform"
+    terraform.write_text(
+        "#!/bin/sh\n"
+        f'exec {shlex.quote(sys.executable)} {shlex.quote(str(FAKE_TERRAFORM))} "$@"\n'
+    )
+    terraform.chmod(0o755)
+    config = root / "fake_terraform.json"
+    config.write_text(json.dumps(profile))
+
+    overrides = {
+        "PATH": f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}",
+        "FAKE_TERRAFORM_CONFIG": str(config),
+        "STACKABLE_PROVIDER_CACHE": str(root / "provider_cache"),
+        "STACKABLE_STATE_DIR": str(root / "state"),
+        "STACKABLE_LOG_DIR": str(root / "job_logs"),
+    }
+    saved = {name: os.environ.get(name) for name in overrides}
+    os.environ.update(overrides)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def make_key(root: Path) -> Path:
+    key = root / "id_ed25519"
+    subprocess.run(
+        ["ssh-keygen", "-q", "-t", "ed25519", "-N", "", "-f", str(key)], check=True
+    )
+    return key
+
+
+def make_payload(index: int, accounts: int = 4):
+    from app.models.payload import Payload
+
+    return Payload(
+        oracle_cloud={
+            "tenancy_ocid": f"ocid1.tenancy.oc1..bench{index % accounts}",
+            "user_ocid": "ocid1.user.oc1..bench",
+            "fingerprint": "aa:bb:cc:dd",
+            "region": "us-phoenix-1",
+            "compartment_ocid": "ocid1.compartment.oc1..bench",
+        },
+        cloudflare={"cf_api_token": "token", "cf_account_id": "account"},
+        github={
+            "github_token": "token",
+            "github_owner": "owner",
+            "repo_name": "repo",
+            "docker_image": "ghcr.io/owner/repo:latest",
+        },
+        instance_name=f"bench-{index}-{time.monotonic_ns()}",
+    )
+
+
+def percentiles(samples: list[float], scale: float = 1.0) -> tuple[float, float]:
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))]
+    return statistics.median(ordered) * scale, p95 * scale
+
+
+def bench_render(key: Path, iterations: int) -> dict:
+    from app.service import DeploymentService
+
+    service = DeploymentService(directory=Path(tempfile.gettempdir()))
+    payload = make_payload(0)
+    service.set_payload(payload, key, key.with_suffix(".pub"), "oracle")
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        service.set_payload(payload, key, key.with_suffix(".pub"), "oracle")
+        samples.append(time.perf_counter() - started)
+    p50, p95 = percentiles(samples, 1000)
+    return {"render_ms_p50": p50, "render_ms_p95": p95}
+
+
+def bench_workspace(key: Path, iterations: int) -> dict:
+    from app.service import DeploymentService
+    from app.utils.make_directory import make_directory
+
+    payload = make_payload(0)
+    templates = None
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        service = DeploymentService(directory=make_directory())
+        if templates is None:
+            templates = service.set_payload(
+                payload, key, key.with_suffix(".pub"), "oracle"
+            )
+        service.payload = payload
+        service.write_workspace(
+            {"main.tf": templates[0], "provider.tf": templates[1]}, key
+        )
+        samples.append(time.perf_counter() - started)
+        service.cleanup()
+    p50, p95 = percentiles(samples, 1000)
+    return {"workspace_ms_p50": p50, "workspace_ms_p95": p95}
+
+
+def bench_run_job(key: Path, jobs: int) -> dict:
+    from app.handler import deploy_payload
+
+    samples, cached = [], []
+    for index in range(jobs):
+        payload = make_payload(index)
+        for timings in (samples, cached):
+            started = time.perf_counter()
+            service = deploy_payload(payload, key, key.with_suffix(".pub"), "oracle")
+            timings.append(time.perf_counter() - started)
+            service.cleanup()
+    p50, p95 = percentiles(samples)
+    return {
+        "run_job_s_p50": p50,
+        "run_job_s_p95": p95,
+        "cached_redeploy_ms_p50": statistics.median(cached) * 1000,
+    }
+
+
+def jobs_per_hour(
+    key: Path, jobs: int, workers: int, accounts: int = 4, parallelism: int = None
+) -> float:
+    from app.models.deployment_job import DeploymentJob
+    from app.scheduler import JobScheduler
+
+    scheduler = JobScheduler(max_concurrency=workers)
+    batch = [
+        DeploymentJob(
+            payload=make_payload(index, accounts),
+            private_key_path=key,
+            public_key_path=key.with_suffix(".pub"),
+            tenant=f"tenant{index % 3}",
+            parallelism=parallelism,
+        )
+        for index in range(jobs)
+    ]
+    started = time.perf_counter()
+    results = asyncio.run(scheduler.run_all(batch))
+    elapsed = time.perf_counter() - started
+    scheduler.shutdown()
+
+    failures = [r for r in results if isinstance(r, Exception)]
+    if failures:
+        raise failures[0]
+    return jobs * 3600 / elapsed
+
+
+def bench_throughput(key: Path, jobs: int, workers: int) -> dict:
+    return {f"jobs_per_hour_{workers}_workers": jobs_per_hour(key, jobs, workers)}
+
+
+def bench_parallelism(key: Path, jobs: int, workers: int) -> dict:
+    """
+    Throughput of terraform's fixed -parallelism=10 and of the adaptive one.
+
+    Runs the PARALLELISM_PROFILE with every job in one tenancy, so the jobs
+    running at once share its quota.
+    """
+    from app.utils.parallelism import DEFAULT_PARALLELISM, shared_controller
+
+    config = Path(os.environ["FAKE_TERRAFORM_CONFIG"])
+    profile = config.read_text()
+    config.write_text(json.dumps(PARALLELISM_PROFILE))
+    results = {}
+    try:
+        for mode, parallelism in (("fixed", DEFAULT_PARALLELISM), ("adaptive", None)):
+            # Start without throttling learned by earlier runs
+            shared_controller.cache_clear()
+            results[f"jobs_per_hour_parallelism_{mode}_{workers}_workers"] = (
+                jobs_per_hour(key, jobs, workers, accounts=1, parallelism=parallelism)
+            )
+    finally:
+        config.write_text(profile)
+    return results
+
+
+def run_benchmarks(
+    iterations: int = 50,
+    jobs: int = 8,
+    workers: list[int] = (1, 4),
+    profile: dict = None,
+) -> dict:
+    """Run every benchmark in an isolated fake-terraform environment."""
+    with tempfile.TemporaryDirectory(prefix="stackable-bench-") as scratch:
+        root = Path(scratch)
+        with fake_environment(root, profile or DEFAULT_PROFILE):
+            key = make_key(root)
+            results = {}
+            with contextlib.redirect_stdout(io.StringIO()):
+                results.update(bench_render(key, iterations))
+                results.update(bench_workspace(key, iterations))
+                results.update(bench_run_job(key, max(1, jobs // 4)))
+                for count in workers:
+                    results.update(bench_throughput(key, jobs, count))
+                for count in workers:
+                    results.update(bench_parallelism(key, jobs, count))
+    results["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Describe every metric that got worse than the baseline by more than tolerance."""
+    regressions = []
+    for name, value in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        change = (value - base) / base
+        if name.startswith(HIGHER_IS_BETTER):
+            change = -change
+        if change > tolerance:
+            regressions.append(f"{name}: {base:.2f} -> {value:.2f} ({change:+.0%})")
+    return regressions
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--jobs", type=int, default=8)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--profile", type=Path, help="JSON fake terraform profile")
+    parser.add_argument("--save", action="store_true", help="Store as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument(
+        "--check", action="store_true", help="Exit non-zero on regressions"
+    )
+    args = parser.parse_args(argv)
+
+    profile = json.loads(args.profile.read_text()) if args.profile else None
+    results = run_benchmarks(args.iterations, args.jobs, args.workers, profile)
+    baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+
+    for name, value in results.items():
+        base = baseline.get(name)
+        reference = f"  (baseline {base:.2f})" if base else ""
+        print(f"{name:32} {value:12.2f}{reference}")
+
+    if args.save:
+        BASELINE.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+        print(f"Saved baseline to {BASELINE}")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions and args.check else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
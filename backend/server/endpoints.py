@@ -0,0 +1,199 @@
+import asyncio
+import re
+
+from pydantic import ValidationError
+
+from app.components import components_for
+from app.fan_out import check_targets
+from app.models.job_request import JobRequest
+from app.utils.instrumentation import CriticalPathSink, PrometheusSink, default_sinks
+from server.jobs import JobManager, JobRecord
+from server.protocol import EventStream, HTTPError, Request, Response
+
+
+def _record(manager: JobManager, job_id: str) -> JobRecord:
+    record = manager.jobs.get(job_id)
+    if record is None:
+        raise HTTPError(404, f"Unknown job {job_id}")
+    return record
+
+
+async def submit_job(manager: JobManager, request: Request) -> Response:
+    """Queue a deployment and return its id without waiting for it."""
+    try:
+        job_request = JobRequest.model_validate(request.json())
+    except ValidationError as e:
+        raise HTTPError(
+            422, e.errors(include_url=False, include_context=False, include_input=False)
+        )
+    problems = job_request.payload.preflight()
+    if problems:
+        raise HTTPError(422, problems)
+    if job_request.targets:
+        try:
+            check_targets(job_request.payload, job_request.targets)
+        except ValueError as e:
+            raise HTTPError(422, str(e))
+    if job_request.components:
+        if job_request.targets:
+            raise HTTPError(422, "Componentized deployments cannot have targets")
+        try:
+            components_for(job_request.provider)
+        except ValueError as e:
+            raise HTTPError(422, str(e))
+    try:
+        record = manager.submit(job_request)
+    except RuntimeError as e:
+        raise HTTPError(422, str(e))
+
+    job_id = record.job.job_id
+    return Response(
+        {
+            "job_id": job_id,
+            "status_url": f"/jobs/{job_id}",
+            "events_url": f"/jobs/{job_id}/events",
+            "result_url": f"/jobs/{job_id}/result",
+        },
+        status=202,
+        headers={"Location": f"/jobs/{job_id}"},
+    )
+
+
+async def list_jobs(manager: JobManager, request: Request) -> Response:
+    records = manager.jobs.values()
+    if "state" in request.query:
+        records = [r for r in records if r.state == request.query["state"]]
+    return Response([record.status().model_dump() for record in records])
+
+
+async def job_status(manager: JobManager, request: Request, job_id: str) -> Response:
+    return Response(_record(manager, job_id).status().model_dump())
+
+
+async def job_result(manager: JobManager, request: Request, job_id: str) -> Response:
+    """The deployment result once the job succeeded; 409 until then."""
+    record = _record(manager, job_id)
+    if record.state == "succeeded":
+        return Response(record.result)
+    if record.finished:
+        raise HTTPError(409, f"Job {record.state}: {record.error}")
+    raise HTTPError(409, f"Job is {record.state}")
+
+
+async def job_log(manager: JobManager, request: Request, job_id: str) -> Response:
+    """
+    The job's terraform output as text, or part of it.
+
+    Supports a single Range: bytes=start-end (also start- and -suffix) for
+    paging through large logs, and ?phase= for the latest run of one phase.
+    """
+    log = _record(manager, job_id).log
+    start, end = 0, log.size
+    if "phase" in request.query:
+        runs = [run for run in log.phases() if run[0] == request.query["phase"]]
+        if not runs:
+            raise HTTPError(404, f"No output for phase {request.query['phase']}")
+        _, start, end = runs[-1]
+
+    status, headers = 200, {"Content-Type": "text/plain; charset=utf-8"}
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", request.headers.get("range", ""))
+    if match and any(match.groups()):
+        first, last = match.groups()
+        length = end - start
+        if not first:
+            first, last = max(length - int(last), 0), length - 1
+        first, last = int(first), min(int(last) if last else length - 1, length - 1)
+        if first >= length or first > last:
+            raise HTTPError(416, f"Log has {length} bytes")
+        status = 206
+        headers["Content-Range"] = f"bytes {first}-{last}/{length}"
+        start, end = start + first, start + last + 1
+    headers["Accept-Ranges"] = "bytes"
+    # Decompressing is blocking work; keep it off the event loop
+    body = await asyncio.to_thread(log.read, start, end)
+    return Response(body, status=status, headers=headers)
+
+
+async def job_events(manager: JobManager, request: Request, job_id: str):
+    """
+    Stream the job's state changes, phases and terraform output as SSE.
+
+    Clients resume after a dropped connection by sending the last id they
+    received in Last-Event-ID (or ?after=).
+    """
+    record = _record(manager, job_id)
+    after = request.headers.get("last-event-id", request.query.get("after", -1))
+    try:
+        after = int(after)
+    except ValueError:
+        raise HTTPError(400, "Last-Event-ID must be an integer")
+    return EventStream(record.events(after))
+
+
+async def cancel_job(manager: JobManager, request: Request, job_id: str) -> Response:
+    _record(manager, job_id)
+    record = manager.cancel(job_id)
+    return Response(record.status().model_dump(), status=202)
+
+
+async def scheduler_stats(manager: JobManager, request: Request) -> Response:
+    return Response(manager.scheduler.stats().model_dump())
+
+
+async def pool_stats(manager: JobManager, request: Request) -> Response:
+    """Ready, target and hit counts of the pre-warmed workspace pool."""
+    if manager.pool is None:
+        raise HTTPError(404, "The workspace pool is not enabled")
+    return Response([stats.model_dump() for stats in manager.pool.stats()])
+
+
+async def health(manager: JobManager, request: Request) -> Response:
+    return Response({"status": "ok"})
+
+
+async def metrics(manager: JobManager, request: Request) -> Response:
+    for sink in default_sinks:
+        if isinstance(sink, PrometheusSink):
+            return Response(
+                sink.render(), headers={"Content-Type": "text/plain; version=0.0.4"}
+            )
+    raise HTTPError(404, "Metrics are not enabled")
+
+
+async def resource_latency(manager: JobManager, request: Request) -> Response:
+    """Resources ranked by their share of apply critical paths across jobs."""
+    for sink in default_sinks:
+        if isinstance(sink, CriticalPathSink):
+            return Response([latency.model_dump() for latency in sink.summary()])
+    raise HTTPError(404, "Metrics are not enabled")
+
+
+ROUTES = [
+    ("POST", r"/jobs", submit_job),
+    ("GET", r"/jobs", list_jobs),
+    ("GET", r"/jobs/(?P<job_id>\w+)", job_status),
+    ("GET", r"/jobs/(?P<job_id>\w+)/result", job_result),
+    ("GET", r"/jobs/(?P<job_id>\w+)/events", job_events),
+    ("GET", r"/jobs/(?P<job_id>\w+)/log", job_log),
+    ("POST", r"/jobs/(?P<job_id>\w+)/cancel", cancel_job),
+    ("GET", r"/stats", scheduler_stats),
+    ("GET", r"/stats/pool", pool_stats),
+    ("GET", r"/health", health),
+    ("GET", r"/metrics", metrics),
+    ("GET", r"/metrics/resources", resource_latency),
+]
+_COMPILED = [(method, re.compile(path), handler) for method, path, handler in ROUTES]
+
+
+async def dispatch(manager: JobManager, request: Request):
+    """Route a request to its handler; returns a Response or an EventStream."""
+    allowed = []
+    for method, pattern, handler in _COMPILED:
+        match = pattern.fullmatch(request.path.rstrip("/") or "/")
+        if match:
+            if method == request.method:
+                return await handler(manager, request, **match.groupdict())
+            allowed.append(method)
+    if allowed:
+        raise HTTPError(405, f"Use {', '.join(allowed)} for {request.path}")
+    raise HTTPError(404, f"No route for {request.path}")
@@ -0,0 +1,263 @@
+import asyncio
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from app.models.deployment_job import DeploymentJob
+from app.models.job_request import JobRequest
+from app.models.job_status import JobStatus
+from app.models.phase_metrics import PhaseMetrics
+from app.models.resource_timing import ResourceTiming
+from app.scheduler import JobScheduler, run_deployment
+from app.service import DeploymentCancelled
+from app.utils.execute_command import CallbackSink
+from app.utils.file_extraction import decode_file
+from app.utils.instrumentation import Instrumentation, MetricsSink, default_sinks
+from app.utils.job_log import JobLog
+from app.utils.workspace_backend import get_backend
+from app.utils.workspace_pool import WorkspacePool
+
+EVENT_HISTORY = 2000
+FINAL_STATES = ("succeeded", "failed", "cancelled")
+
+
+def make_key_dir() -> str:
+    """A private directory for submitted keys, on tmpfs with the memory backend."""
+    backend = get_backend()
+    parent = None
+    if backend.name == "memory":
+        backend.root.mkdir(parents=True, exist_ok=True)
+        parent = backend.root
+    return tempfile.mkdtemp(prefix="stackable-keys-", dir=parent)
+
+
+class JobRecord:
+    """
+    A submitted job, its outcome and the event log streamed to clients.
+
+    Events are (id, event, data) tuples with consecutive ids. Only the last
+    EVENT_HISTORY or so are kept, so a client reconnecting with an old
+    Last-Event-ID resumes from the oldest retained event. All methods must
+    be called on the event loop; worker threads go through publish_threadsafe.
+    """
+
+    def __init__(self, job: DeploymentJob, loop: asyncio.AbstractEventLoop):
+        self.job = job
+        self.loop = loop
+        self.state = "queued"
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.phases = []
+        self.log = JobLog(job.job_id)
+        self.cancel_event = threading.Event()
+        self._events = []
+        self._first_event_id = 0
+        self._wakeup = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINAL_STATES
+
+    def status(self) -> JobStatus:
+        return JobStatus(
+            job_id=self.job.job_id,
+            state=self.state,
+            tenant=self.job.tenant,
+            provider=self.job.provider,
+            submitted_at=self.submitted_at,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            error=self.error,
+            phases=self.phases,
+        )
+
+    def publish(self, event: str, data: dict):
+        self._events.append((self._first_event_id + len(self._events), event, data))
+        if len(self._events) > 2 * EVENT_HISTORY:
+            self._first_event_id += len(self._events) - EVENT_HISTORY
+            del self._events[:-EVENT_HISTORY]
+        # Wake every stream waiting on the current event, then start a new one
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+
+    def publish_threadsafe(self, event: str, data: dict):
+        self.loop.call_soon_threadsafe(self.publish, event, data)
+
+    def set_state(self, state: str, error: str = None):
+        self.state = state
+        self.error = error
+        if state == "running":
+            self.started_at = time.time()
+        elif state in FINAL_STATES:
+            self.finished_at = time.time()
+        self.publish("state", {"state": state, "error": error})
+
+    async def events(self, after: int = -1):
+        """Yield events with ids above after, live, until the job finishes."""
+        while True:
+            wakeup = self._wakeup
+            while after + 1 < self._first_event_id + len(self._events):
+                event = self._events[max(0, after + 1 - self._first_event_id)]
+                after = event[0]
+                yield event
+            if self.finished:
+                return
+            await wakeup.wait()
+
+
+class PhaseEventSink(MetricsSink):
+    """
+    Publishes finished phases and resources to a job's event stream.
+
+    Called from the worker thread. Resource events carry completed / total,
+    so clients can show how far an apply has got.
+    """
+
+    def __init__(self, record: JobRecord):
+        self.record = record
+
+    def emit(self, metrics: PhaseMetrics):
+        self.record.loop.call_soon_threadsafe(self._publish, metrics)
+
+    def _publish(self, metrics: PhaseMetrics):
+        self.record.phases.append(metrics.phase)
+        self.record.publish("phase", metrics.model_dump())
+
+    def emit_resource(self, timing: ResourceTiming):
+        self.record.publish_threadsafe("resource", timing.model_dump())
+
+
+class JobManager:
+    """
+    Accepts jobs from the API, runs them on a JobScheduler and tracks them.
+
+    Terraform output and phase timings are forwarded from the worker threads
+    to each job's event log, where any number of SSE streams can follow them
+    without a thread per stream. Finished jobs are kept until there are more
+    than retention of them; a job's log is deleted with its record.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = None,
+        key_dir: Path = None,
+        retention: int = 1000,
+        pool: WorkspacePool = None,
+    ):
+        self.scheduler = JobScheduler(max_concurrency, runner=self._run)
+        # Pre-warmed workspaces, when the server keeps some
+        self.pool = pool
+        self.key_dir = Path(key_dir or make_key_dir())
+        self.retention = retention
+        self.jobs: dict[str, JobRecord] = {}
+
+    def submit(self, request: JobRequest) -> JobRecord:
+        """Queue a job; must be called on the event loop."""
+        job_id = uuid.uuid4().hex
+        job = DeploymentJob(
+            job_id=job_id,
+            payload=request.payload,
+            private_key_path=self.key_dir / f"{job_id}.pem",
+            public_key_path=self.key_dir / f"{job_id}.pub",
+            provider=request.provider,
+            tenant=request.tenant,
+            priority=request.priority,
+            force=request.force,
+            deadline_seconds=request.deadline_seconds,
+            targets=request.targets,
+            parallelism=request.parallelism,
+            components=request.components,
+        )
+        self.key_dir.mkdir(parents=True, exist_ok=True)
+        job.private_key_path.touch(mode=0o600)
+        job.private_key_path.write_text(request.private_key)
+        try:
+            job.public_key_path.write_text(decode_file(job.private_key_path))
+        except RuntimeError:
+            self._remove_keys(job)
+            raise
+
+        record = JobRecord(job, asyncio.get_running_loop())
+        self.jobs[job.job_id] = record
+        record.publish("state", {"state": "queued", "error": None})
+        future = self.scheduler.submit(job)
+        future.add_done_callback(lambda future: self._finished(record, future))
+        return record
+
+    def cancel(self, job_id: str) -> JobRecord:
+        """
+        Cancel a job.
+
+        A queued job is dropped at once. A running job's terraform command is
+        interrupted, and the job stops once it has released its state lock
+        and workspace.
+        """
+        record = self.jobs[job_id]
+        if record.finished:
+            return record
+        if self.scheduler.cancel(job_id):
+            record.set_state("cancelled", "Cancelled before it started")
+            return record
+        record.cancel_event.set()
+        record.publish("cancelling", {})
+        return record
+
+    def _run(self, job: DeploymentJob) -> dict:
+        """Runs on a scheduler worker thread."""
+        record = self.jobs[job.job_id]
+        record.loop.call_soon_threadsafe(record.set_state, "running")
+        if record.cancel_event.is_set():
+            raise DeploymentCancelled("Deployment cancelled before it started")
+        return run_deployment(
+            job,
+            sinks=[
+                CallbackSink(
+                    lambda stream, line: record.publish_threadsafe(
+                        "log", {"stream": stream, "line": line}
+                    )
+                )
+            ],
+            instrumentation=Instrumentation(
+                job.job_id, sinks=[*default_sinks, PhaseEventSink(record)]
+            ),
+            cancel_event=record.cancel_event,
+            job_log=record.log,
+            pool=self.pool,
+            on_target=lambda result: record.publish_threadsafe(
+                "target", result.model_dump()
+            ),
+        )
+
+    def _finished(self, record: JobRecord, future: asyncio.Future):
+        self._remove_keys(record.job)
+        if record.finished:
+            # Queued jobs are marked cancelled by cancel() itself
+            pass
+        elif isinstance(future.exception(), DeploymentCancelled):
+            record.set_state("cancelled", str(future.exception()))
+        elif future.exception():
+            record.set_state("failed", str(future.exception()))
+        else:
+            record.result = future.result()
+            record.set_state("succeeded")
+        self._prune()
+
+    def _remove_keys(self, job: DeploymentJob):
+        job.private_key_path.unlink(missing_ok=True)
+        job.public_key_path.unlink(missing_ok=True)
+
+    def _prune(self):
+        finished = [record for record in self.jobs.values() if record.finished]
+        for record in finished[: max(0, len(finished) - self.retention)]:
+            del self.jobs[record.job.job_id]
+            record.log.delete()
+
+    def shutdown(self):
+        self.scheduler.shutdown()
+        if self.pool:
+            self.pool.stop()
@@ -0,0 +1,188 @@
+import argparse
+import asyncio
+import hmac
+import ipaddress
+import logging
+import os
+
+from app.utils.instrumentation import CriticalPathSink, PrometheusSink, default_sinks
+from app.utils.job_log import remove_old_logs
+from app.utils.workspace_backend import get_backend
+from app.utils.workspace_pool import WorkspacePool
+from app.utils.workspace_reaper import WorkspaceReaper
+from server.endpoints import dispatch
+from server.jobs import JobManager
+from server.protocol import (
+    MAX_HEADER_BYTES,
+    EventStream,
+    HTTPError,
+    Request,
+    Response,
+    read_request,
+    write_response,
+)
+
+# cd backend && python -m server.main --port 8000
+DEFAULT_PORT = 8000
+DEFAULT_HOST = "127.0.0.1"
+
+# Answered without a token, for load balancer health checks
+PUBLIC_PATHS = {"/health"}
+
+
+def is_loopback(host: str) -> bool:
+    """Whether binding to host only accepts connections from this machine."""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+class APIServer:
+    """
+    HTTP API for submitting deployments and following them.
+
+    Every connection is a coroutine on one event loop, so hundreds of open
+    SSE streams cost a socket and a small task each. Deployments run on the
+    JobManager's scheduler threads.
+
+    Jobs carry cloud credentials and private keys, so with a token every
+    request but the health check needs "Authorization: Bearer <token>",
+    and without one the server only listens on a loopback address.
+    """
+
+    def __init__(self, manager: JobManager = None, token: str = None):
+        self.manager = manager or JobManager()
+        self.token = token
+        self._server = None
+
+    async def start(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        """
+        Raises:
+            ValueError: When host is not a loopback address and there is no token
+        """
+        if not self.token and not is_loopback(host):
+            raise ValueError(
+                f"Set STACKABLE_API_TOKEN before listening on {host}; "
+                "without a token the API only listens on a loopback address"
+            )
+        self._server = await asyncio.start_server(
+            self.handle_connection, host, port, limit=MAX_HEADER_BYTES, backlog=1024
+        )
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+        self.manager.shutdown()
+
+    def authorize(self, request: Request):
+        """
+        Raises:
+            HTTPError: 401 when the server has a token and the request does not
+        """
+        if not self.token or request.path.rstrip("/") in PUBLIC_PATHS:
+            return
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(
+            token.strip().encode(), self.token.encode()
+        ):
+            raise HTTPError(
+                401, "Missing or invalid bearer token", {"WWW-Authenticate": "Bearer"}
+            )
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                    if request is None:
+                        return
+                    self.authorize(request)
+                    response = await dispatch(self.manager, request)
+                except HTTPError as e:
+                    request, response = None, Response(
+                        {"detail": e.detail}, status=e.status, headers=e.headers
+                    )
+                except Exception:
+                    logging.exception("Unhandled error in API request")
+                    request, response = None, Response(
+                        {"detail": "Internal server error"}, status=500
+                    )
+
+                if isinstance(response, EventStream):
+                    await response.send(writer)
+                    return
+                keep_alive = (
+                    request is not None
+                    and request.headers.get("connection", "").lower() != "close"
+                )
+                await write_response(writer, response, keep_alive)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stackable deployment API")
+    parser.add_argument(
+        "--host",
+        default=os.environ.get("STACKABLE_API_HOST", DEFAULT_HOST),
+        help="Other than loopback only with STACKABLE_API_TOKEN set",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=int(os.environ.get("STACKABLE_API_PORT", DEFAULT_PORT)),
+    )
+    parser.add_argument("--max-concurrency", type=int, default=None)
+    parser.add_argument(
+        "--metrics", action="store_true", help="Expose Prometheus metrics on /metrics"
+    )
+    parser.add_argument(
+        "--no-pool", action="store_true", help="Do not keep pre-warmed workspaces"
+    )
+    args = parser.parse_args()
+    token = os.environ.get("STACKABLE_API_TOKEN")
+    if not token and not is_loopback(args.host):
+        parser.error(f"set STACKABLE_API_TOKEN to listen on {args.host}")
+
+    if args.metrics:
+        default_sinks.extend([PrometheusSink(), CriticalPathSink()])
+
+    WorkspaceReaper().start()
+    remove_old_logs()
+    if get_backend().name == "memory":
+        WorkspaceReaper(get_backend().root).start()
+    pool = None if args.no_pool else WorkspacePool().start()
+
+    async def run():
+        server = APIServer(
+            JobManager(max_concurrency=args.max_concurrency, pool=pool), token=token
+        )
+        host, port = await server.start(args.host, args.port)
+        print(f"Stackable API listening on http://{host}:{port}")
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import asyncio
+import json
+from typing import AsyncIterator, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+REASONS = {
+    200: "OK",
+    202: "Accepted",
+    206: "Partial Content",
+    400: "Bad Request",
+    401: "Unauthorized",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    413: "Payload Too Large",
+    416: "Range Not Satisfiable",
+    422: "Unprocessable Entity",
+    500: "Internal Server Error",
+}
+
+
+class HTTPError(Exception):
+    """Ends a request with an error status and a JSON {"detail": ...} body."""
+
+    def __init__(self, status: int, detail, headers: dict[str, str] = None):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.headers = headers
+
+
+class Request:
+    def __init__(self, method: str, target: str, headers: dict[str, str], body: bytes):
+        url = urlsplit(target)
+        self.method = method
+        self.path = url.path
+        self.query = dict(parse_qsl(url.query))
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        try:
+            return json.loads(self.body or b"null")
+        except ValueError as e:
+            raise HTTPError(400, f"Invalid JSON body: {e}")
+
+
+class Response:
+    def __init__(self, body=None, status: int = 200, headers: dict[str, str] = None):
+        self.status = status
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        if isinstance(body, (bytes, str)):
+            self.body = body.encode() if isinstance(body, str) else body
+        else:
+            self.body = json.dumps(body).encode()
+
+
+class EventStream:
+    """
+    A Server-Sent Events response fed by an async iterator of (id, event, data).
+
+    A comment line is sent after heartbeat idle seconds so proxies keep the
+    connection open while terraform is quiet.
+    """
+
+    def __init__(
+        self, events: AsyncIterator[tuple[int, str, dict]], heartbeat: float = 15
+    ):
+        self.events = events
+        self.heartbeat = heartbeat
+
+    async def send(self, writer: asyncio.StreamWriter):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        await writer.drain()
+        pending = None
+        try:
+            while True:
+                pending = pending or asyncio.ensure_future(anext(self.events))
+                done, _ = await asyncio.wait({pending}, timeout=self.heartbeat)
+                if not done:
+                    writer.write(b": keep-alive\n\n")
+                    await writer.drain()
+                    continue
+                try:
+                    event_id, event, data = pending.result()
+                except StopAsyncIteration:
+                    return
+                pending = None
+                writer.write(
+                    f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n".encode()
+                )
+                # Waits here for slow clients instead of buffering their backlog
+                await writer.drain()
+        finally:
+            if pending:
+                pending.cancel()
+                await asyncio.wait({pending})
+            await self.events.aclose()
+
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+    """Read one HTTP/1.1 request; returns None when the client closed the connection."""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise HTTPError(400, "Request headers too large")
+
+    request_line, *header_lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = request_line.split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+    headers = {}
+    for line in header_lines:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, f"Request body exceeds {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return Request(method.upper(), target, headers, body)
+
+
+async def write_response(writer: asyncio.StreamWriter, response: Response, keep_alive):
+    reason = REASONS.get(response.status, "")
+    headers = {
+        **response.headers,
+        "Content-Length": str(len(response.body)),
+        "Connection": "keep-alive" if keep_alive else "close",
+    }
+    head = f"HTTP/1.1 {response.status} {reason}\r\n" + "".join(
+        f"{name}: {value}\r\n" for name, value in headers.items()
+    )
+    writer.write(head.encode("latin-1") + b"\r\n" + response.body)
+    await writer.drain()